@@ -12,6 +12,9 @@ function disableButton (elementId) {
 */
 function enableButton (elementId) {
     e = document.getElementById(elementId);
+    if (e == null)
+        // the spectator page has no button
+        return;
     e.classList.remove('disabled');
     e.disabled = false;
 }
@@ -132,6 +135,7 @@ function startConnection() {
         obj.num_player          = sessionStorage.num_player;
         obj.password            = sessionStorage.password;
         obj.no_visualizer       = sessionStorage.no_visualizer;
+        obj.features            = ["batch", "stat"];  // several events in one frame, running statistics
 
         updateInfo ("Performing Handshake, new connection");
 
@@ -139,68 +143,7 @@ function startConnection() {
         ws.send(JSON.stringify(obj));
     };
 
-    ws.onmessage = function (evt) {
-        try {
-            var data = JSON.parse(evt.data);
-        } catch (e) {
-            updateInfoError ("Invalid Json from Server: "+evt.data)
-            return console.error(e); // error in the above string (in this case, yes)!
-        }
-
-        switch (data.type) {
-            case "info":
-                updateInfo (data.message);
-                break;
-            case "info_y":
-                updateInfo (data.message, type="yellow");
-                break;
-            case "info_wobr":
-                updateInfo (data.message, newline=false);
-                break;
-            case "error":
-                updateInfo (data.message, type="error");
-                break;
-            case "num_move":
-                changeText ("num_move", data.message);
-                break;
-            case "position":
-                // activate the button sleep for some time to see the result
-                sleep(2000).then(() => {
-                    enableButton("button_next");
-                    //reset the colour of the position box
-                    changePlayerState("p1", 2)
-                    if (sessionStorage.num_player != 1)
-                        changePlayerState("p2", 2)
-                    if (sessionStorage.num_player == 1) {
-                        // we do not have to display the position unless it is disconnect event
-                        if (data.pos_1 == 0)
-                            changeText ("p1", data.pos_1);
-                    } else {
-                        changeText ("p1", data.pos_1);
-                        changeText ("p2", data.pos_2);
-                    }
-                });
-
-                break;
-            case "action":
-                changeText ("p1", data.pos_1);
-                if (sessionStorage.num_player != 1)
-                    changeText ("p2", data.pos_2);
-
-                break;
-            case "action_match":
-                if (data.player_id == 1)
-                    player_id = "p1"
-                else
-                    player_id = "p2"
-                changePlayerState(player_id, data.action_match)
-                updateInfo (data.message);
-                break;
-            default:
-                updateInfoError ("Invalid datatype received: "+data.type);
-        }
-
-    };
+    ws.onmessage = handleMessage;
 
     ws.onclose = function() {
       // websocket is closed.
@@ -214,6 +157,122 @@ function startConnection() {
     window.ws = ws
 }
 
+/*
+    function to watch the sessions of a group without taking part (watch.html)
+*/
+function startWatching() {
+    if (sessionStorage.getItem("group_name") == null) {
+        location.assign("index.html");
+        return;
+    }
+
+    const server_address = "ws://".concat(sessionStorage.getItem("server_ip"), ":8001/")
+    if (!("WebSocket" in window)) {
+       alert("WebSocket NOT supported by your Browser. \nKindly use a supporting browser!");
+       return;
+    }
+    const ws = new WebSocket(server_address);
+    ws.addEventListener("error", (event) => {
+        updateInfoError("WebSocket connection Failed: ");
+    });
+
+    ws.onopen = function() {
+        // read-only, the server sends the events of the group and ignores the messages of this page
+        ws.send(JSON.stringify({"watch": true, "group_name": sessionStorage.group_name,
+                                "password": sessionStorage.password}));
+    };
+
+    ws.onmessage = handleMessage;
+
+    ws.onclose = function() {
+        updateInfoError("Connection is closed by the server");
+    };
+
+    window.ws = ws
+}
+
+/*
+    apply a frame sent by the eval server: one event or a batch of events
+*/
+function handleMessage(evt) {
+    try {
+        var data = JSON.parse(evt.data);
+    } catch (e) {
+        updateInfoError ("Invalid Json from Server: "+evt.data)
+        return console.error(e); // error in the above string (in this case, yes)!
+    }
+
+    if (data.type == "batch") {
+        // all the events of a move in a single frame, apply them in order
+        for (const event of data.events)
+            handleEvent (event);
+    } else {
+        handleEvent (data);
+    }
+}
+
+/*
+    apply one event sent by the eval server
+*/
+function handleEvent(data) {
+    switch (data.type) {
+        case "info":
+            updateInfo (data.message);
+            break;
+        case "info_y":
+            updateInfo (data.message, type="yellow");
+            break;
+        case "info_wobr":
+            updateInfo (data.message, newline=false);
+            break;
+        case "error":
+            updateInfo (data.message, type="error");
+            break;
+        case "num_move":
+            changeText ("num_move", data.message);
+            break;
+        case "stat":
+            // running accuracy and response times, replaced after every move
+            changeText ("stat", data.message);
+            break;
+        case "position":
+            // activate the button sleep for some time to see the result
+            sleep(2000).then(() => {
+                enableButton("button_next");
+                //reset the colour of the position box
+                changePlayerState("p1", 2)
+                if (sessionStorage.num_player != 1)
+                    changePlayerState("p2", 2)
+                if (sessionStorage.num_player == 1) {
+                    // we do not have to display the position unless it is disconnect event
+                    if (data.pos_1 == 0)
+                        changeText ("p1", data.pos_1);
+                } else {
+                    changeText ("p1", data.pos_1);
+                    changeText ("p2", data.pos_2);
+                }
+            });
+
+            break;
+        case "action":
+            changeText ("p1", data.pos_1);
+            if (sessionStorage.num_player != 1)
+                changeText ("p2", data.pos_2);
+
+            break;
+        case "action_match":
+            if (data.player_id == 1)
+                player_id = "p1"
+            else
+                player_id = "p2"
+            changePlayerState(player_id, data.action_match)
+            updateInfo (data.message);
+            break;
+        default:
+            updateInfoError ("Invalid datatype received: "+data.type);
+    }
+}
+
 function sleep(ms) {
     // check out the code here
     // https://www.sitepoint.com/delay-sleep-pause-wait/
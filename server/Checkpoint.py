@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+"""
+Checkpoints of the evaluation sessions, so that a session interrupted by a restart of the eval server, a refresh
+of the page or a disconnection of the eval_client resumes at the same move instead of starting over.
+
+One file per group, <directory>/<group_name>.ckpt, appended after every move:
+
+file    := FILE_HEADER frame(session) frame(move)*
+frame   := body length (uint32), crc32 of the body (uint32), body
+session := seed (uint32), random_id (uint32), num_players (uint8), no_visualizer (uint8), log format (uint8),
+           key digest (8 bytes)
+move    := timestamp (f64), move_index (uint16), game state (12 x int16), fires (2 x 5 x uint8),
+           number of matched actions (uint8), (component (uint8), response_time (f64))*,
+           number of timeouts of the session (uint32, absent from the checkpoints written before it), log size (uint64)
+
+The moves are regenerated from the seed, a move record holds the game state at the beginning of move_index and
+the actions matched during the previous move: the statistics of the session are the matches of all the records
+and the number of timeouts of the last one.
+A frame which is truncated or does not match its crc32 (the eval server died while writing it) ends the file.
+
+The records are written by the writer thread of the Logger after the log records of the move, with the size of the
+segment of the session in the evaluation logs at that point (LogStore.py). A resumed session keeps the random_id
+and the segment of the session, which is not sealed before the last move, and cuts the segment back to that size,
+so the records of an interrupted move are not logged twice and the log can be replayed (ReplayEngine.py).
+The checkpoint is deleted when the last move was played.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import struct
+import time
+import zlib
+
+from GameState import Player
+from Helper import ice_print, ice_print_group_name
+from Logger import Logger
+from SessionStats import SessionStats
+
+FILE_HEADER = b'CG4C\x01\x00\x00\x00'
+
+_frame      = struct.Struct('<II')
+_session    = struct.Struct('<IIBBB8s')
+_move       = struct.Struct('<dH12h10B')
+_count      = struct.Struct('<B')
+_match      = struct.Struct('<Bd')
+_timeouts   = struct.Struct('<I')
+_log_size   = struct.Struct('<Q')
+
+LOG_FORMATS = ("json", "compact")
+
+
+def key_digest(group_name, secret_key):
+    """ identifies the credentials of a session without storing the key """
+    return hashlib.sha256("{}\0{}".format(group_name, secret_key).encode("utf-8")).digest()[:8]
+
+
+def _frame_of(body):
+    return _frame.pack(len(body), zlib.crc32(body)) + body
+
+
+class Checkpoint:
+    """ the state of a session at the beginning of a move """
+
+    def __init__(self, group_name, seed, random_id, num_players, no_visualizer, log_format, digest):
+        self.group_name     = group_name
+        self.seed           = seed
+        self.random_id      = random_id
+        self.num_players    = num_players
+        self.no_visualizer  = no_visualizer
+        self.log_format     = log_format    # index in LOG_FORMATS
+        self.digest         = digest
+
+        self.timestamp      = time.time()
+        self.move_index     = 0
+        self.values         = None  # the 12 counters of the players, None for the initial state
+        self.fires          = None  # the fires of the players in every quadrant
+        self.matches        = []    # (component, response time) of the session
+        self.num_timeouts   = 0     # players without a packet before the deadline, in the whole session
+        self.log_size       = None  # size of the evaluation log at the beginning of move_index, set by the writer
+        self.in_all_groups  = True  # the matches are counted in SessionStats.all_groups of this process
+
+    def matches_session(self, secret_key, num_players, no_visualizer):
+        """ whether a new session of the group has the same credentials and settings """
+        return self.matches_key(secret_key) and \
+            self.num_players == num_players and self.no_visualizer == no_visualizer
+
+    def matches_key(self, secret_key):
+        """ whether a session of the group has the credentials of the checkpoint """
+        return self.digest == key_digest(self.group_name, secret_key)
+
+    def restore(self, simulator):
+        """ bring the simulator of a new Client, created with the seed of the checkpoint, to the move of the checkpoint """
+        simulator.move_index = self.move_index
+        if self.values is not None:
+            players = (simulator.game_state.player_1, simulator.game_state.player_2)
+            for i, player in enumerate(players):
+                player.set_values(self.values[6*i:6*i+6])
+                player.fires = list(self.fires[Player.num_quadrants*i:Player.num_quadrants*(i+1)])
+
+    def resume(self, client):
+        """ the verified Client takes over the log and the statistics of the session """
+        client.logger.random_id = self.random_id
+        client.logger.resumed   = True
+        client.stats.restore(self.matches, self.num_timeouts, not self.in_all_groups)
+        self.in_all_groups = True
+
+    def session_record(self):
+        return _frame_of(_session.pack(self.seed, self.random_id, self.num_players, self.no_visualizer,
+                                       self.log_format, self.digest))
+
+    def update(self, client):
+        """ take the state of the client, returns the body of the move record without the log size """
+        game_state  = client.simulator.game_state
+        players     = (game_state.player_1, game_state.player_2)
+        matches     = client.stats.take_new_matches()
+
+        self.timestamp  = time.time()
+        self.move_index = client.simulator.move_index
+        self.values     = players[0].get_values() + players[1].get_values()
+        self.fires      = tuple(players[0].fires) + tuple(players[1].fires)
+        self.matches.extend(matches)
+        self.num_timeouts = client.stats.num_timeouts
+
+        body = [_move.pack(self.timestamp, self.move_index, *self.values, *self.fires), _count.pack(len(matches))]
+        for component, response_time in matches:
+            body.append(_match.pack(SessionStats.components.index(component), response_time))
+        body.append(_timeouts.pack(self.num_timeouts))
+        return b''.join(body)
+
+    @classmethod
+    def read(cls, filepath, group_name):
+        """ the last complete state of a checkpoint file, None if it has no session """
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        if not data.startswith(FILE_HEADER):
+            return None
+
+        checkpoint  = None
+        offset      = len(FILE_HEADER)
+        while offset + _frame.size <= len(data):
+            length, crc = _frame.unpack_from(data, offset)
+            body = data[offset + _frame.size:offset + _frame.size + length]
+            if len(body) < length or zlib.crc32(body) != crc:
+                break
+            offset += _frame.size + length
+
+            if checkpoint is None:
+                checkpoint = cls(group_name, *_session.unpack(body))
+                checkpoint.in_all_groups = False
+                continue
+            timestamp, move_index, *values = _move.unpack_from(body)
+            checkpoint.timestamp    = timestamp
+            checkpoint.move_index   = move_index
+            checkpoint.values       = tuple(values[:12])
+            checkpoint.fires        = tuple(values[12:])
+            count, = _count.unpack_from(body, _move.size)
+            for i in range(count):
+                component, response_time = _match.unpack_from(body, _move.size + _count.size + i * _match.size)
+                checkpoint.matches.append((SessionStats.components[component], response_time))
+            offset_timeouts = _move.size + _count.size + count * _match.size
+            if len(body) - _log_size.size >= offset_timeouts + _timeouts.size:
+                checkpoint.num_timeouts, = _timeouts.unpack_from(body, offset_timeouts)
+            checkpoint.log_size, = _log_size.unpack_from(body, len(body) - _log_size.size)
+        return checkpoint
+
+    def __str__(self):
+        return "{} players={} seed={} move={} matched={} timeouts={} age={:.0f}s".format(
+            self.group_name, self.num_players, self.seed, self.move_index + 1, len(self.matches), self.num_timeouts,
+            time.time() - self.timestamp)
+
+
+class CheckpointStore:
+    """
+    The checkpoints of the sessions of this process, kept in memory and written to directory.
+    Disabled while directory is None.
+    """
+    directory   = None
+    max_age     = 3600      # seconds, older checkpoints are not resumed
+
+    def __init__(self):
+        self.checkpoints = dict()   # group_name -> Checkpoint of the sessions of this process
+
+    def filepath(self, group_name):
+        return os.path.join(self.directory, group_name + ".ckpt")
+
+    def load(self, group_name):
+        """ the checkpoint of an interrupted session of the group, None if there is none to resume """
+        if self.directory is None:
+            return None
+        checkpoint = self.checkpoints.get(group_name)
+        if checkpoint is None:
+            try:
+                checkpoint = Checkpoint.read(self.filepath(group_name), group_name)
+            except FileNotFoundError:
+                return None
+            except (OSError, struct.error) as e:
+                ice_print_group_name(group_name, "Checkpoint: cannot read", self.filepath(group_name), e)
+                return None
+            if checkpoint is not None:
+                self.checkpoints[group_name] = checkpoint
+        if checkpoint is None or time.time() - checkpoint.timestamp > self.max_age:
+            return None
+        return checkpoint
+
+    def begin(self, client, checkpoint=None):
+        """
+        a verified session starts, from checkpoint if it resumes
+        returns False if the session is not checkpointed: the interrupted session of the group has other credentials,
+        it is neither replaced nor resumed and stays resumable for its owner until max_age
+        """
+        if self.directory is None:
+            return True
+        logger = client.logger
+        if checkpoint is None:
+            interrupted = self.load(client.group_name)
+            if interrupted is not None and not interrupted.matches_key(client.secret_key):
+                ice_print_group_name(client.group_name, "Checkpoint: not replaced, the interrupted session has "
+                                                        "another password")
+                return False
+            simulator   = client.simulator
+            checkpoint  = Checkpoint(client.group_name, simulator.seed, logger.random_id, client.num_players,
+                                     int(simulator.does_not_have_visualizer), LOG_FORMATS.index(logger.log_format),
+                                     key_digest(client.group_name, client.secret_key))
+            header = FILE_HEADER + checkpoint.session_record()
+            logger.write_after(self._write, checkpoint, header, checkpoint.update(client), logger, 'wb')
+        else:
+            checkpoint.resume(client)
+            if LOG_FORMATS[checkpoint.log_format] == logger.log_format:
+                logger.write_after(self._cut_log, checkpoint, logger)
+            else:
+                ice_print_group_name(client.group_name, "Checkpoint: the session was logged as",
+                                     LOG_FORMATS[checkpoint.log_format], "the interrupted move is logged twice")
+        logger.resumable = True
+        self.checkpoints[client.group_name] = checkpoint
+        return True
+
+    def session_of(self, client):
+        """ the checkpoint of the session of client, None if it is not checkpointed """
+        checkpoint = self.checkpoints.get(client.group_name)
+        if checkpoint is None or checkpoint.random_id != client.logger.random_id:
+            return None
+        return checkpoint
+
+    def save(self, client):
+        """ after move_forward, the state at the beginning of the next move """
+        checkpoint = self.session_of(client)
+        if checkpoint is None or not client.is_running:
+            return
+        logger = client.logger
+        logger.write_after(self._write, checkpoint, b'', checkpoint.update(client), logger, 'ab')
+
+    def end(self, client):
+        """ the session is over, its checkpoint is kept for a resume unless all the moves were played """
+        checkpoint = self.session_of(client)
+        if checkpoint is None:
+            return
+        simulator = client.simulator
+        if simulator.move_index >= simulator.num_moves:
+            self.checkpoints.pop(client.group_name)
+            client.logger.resumable = False
+            client.logger.write_after(self._remove, self.filepath(checkpoint.group_name))
+
+    def _write(self, checkpoint, header, body, logger, mode):
+        """ runs on the writer thread of the Logger, the log records of the move are written """
+        try:
+            checkpoint.log_size = os.path.getsize(logger.segment_path())
+        except FileNotFoundError:
+            checkpoint.log_size = 0
+        data = header + _frame_of(body + _log_size.pack(checkpoint.log_size))
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.filepath(checkpoint.group_name), mode) as f:
+            f.write(data)
+            f.flush()
+            if Logger.fsync_policy != "none":
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def _cut_log(checkpoint, logger):
+        """ runs on the writer thread of the Logger, drops the records of the move which was interrupted """
+        log_filepath = logger.segment_path()
+        try:
+            if checkpoint.log_size is not None and os.path.getsize(log_filepath) > checkpoint.log_size:
+                os.truncate(log_filepath, checkpoint.log_size)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove(filepath):
+        """ runs on the writer thread of the Logger """
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+
+checkpoints = CheckpointStore()     # the checkpoints of this process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="print the sessions which can be resumed")
+    parser.add_argument("paths", nargs="+", help="checkpoint files or directories")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        files = sorted(glob.glob(os.path.join(path, "*.ckpt"))) if os.path.isdir(path) else [path]
+        for filepath in files:
+            group_name = os.path.basename(filepath)[:-len(".ckpt")]
+            checkpoint = Checkpoint.read(filepath, group_name)
+            if checkpoint is None:
+                ice_print(filepath, "has no session", color=1)
+            else:
+                print(checkpoint)
+
+
+if __name__ == "__main__":
+    main()
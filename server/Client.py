@@ -1,67 +1,122 @@
 import asyncio
-import json
 import socket
 from _socket import SHUT_RDWR
-import base64
 from time import perf_counter
 
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import unpad
-
+import Codec
+from Framing import FrameDecoder, encode_frame
 from GameSimulator import GameSimulator
 from Helper import ice_print_group_name
 from Logger import Logger
+from Metrics import metrics
+from SchedulePool import schedule_pool
+from SessionCrypto import SessionCrypto
+from SessionStats import SessionStats
 
 
 class Client:
     """
     class for coordinating all the TCP communication and gameplay with one team.
     """
+    decrypt_executor = None     # when set, messages are decrypted on this executor instead of the event loop
+    shared_listener  = None     # when set, the eval_client connects to this SharedListener instead of a port per Client
 
-    def __init__(self, group_name, secret_key, num_players, does_not_have_visualizer):
+    def __init__(self, group_name, secret_key, num_players, does_not_have_visualizer, checkpoint=None):
+        """
+        checkpoint: the Checkpoint of an interrupted session of the group to resume
+        """
         self.group_name     = group_name
         self.secret_key     = secret_key
+        self.crypto         = SessionCrypto(secret_key)    # key prepared once for the whole session
 
         self.is_running     = True
+        self.is_stopped     = False     # stop() has released the sockets
         self.num_players    = num_players
 
         self.timeout = 60   # the timeout for receiving any data
 
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # TCP socket connecting to the eval client
-        self.socket.bind(("", 0))
-        self.port_number = self.socket.getsockname()[1]
+        if self.shared_listener is None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # TCP socket connecting to the eval client
+            self.socket.bind(("", 0))
+            self.port_number = self.socket.getsockname()[1]
+            self._accept_future = None
+        else:
+            self.socket = None
+            self.port_number = self.shared_listener.port
+            self._accept_future = self.shared_listener.expect(group_name, self.crypto)
 
         self.addr   = None  # address of the client
         self.conn   = None  # address of the client socket
-
-        self.simulator = GameSimulator(num_players, does_not_have_visualizer)  # the game simulator
-        self.logger    = Logger(group_name, num_players)
+        self.verified   = False     # the hello of the eval_client was already checked (shared_listener)
+
+        self.decoder    = FrameDecoder()    # buffers the bytes received from the eval client
+        self.recv_size  = 4096              # max bytes read from the socket at once
+        self.packets    = asyncio.Queue()   # (message, arrival time, framing time) read from the eval client
+        self.reader     = None              # task reading the packets for the whole session, see handle_players
+        self.end_marker = object()          # queued by the reader when the client disconnects
+        self.framing_time   = 0.0   # time spent decoding the last frame
+        self.stage_metrics  = metrics.group(group_name)    # stage -> Histogram
+        self.stats          = SessionStats()                # accuracy and response times of the session
+
+        if checkpoint is None:
+            schedule = schedule_pool.take(num_players)     # moves generated in advance
+            self.simulator = GameSimulator(num_players, does_not_have_visualizer,
+                                           schedule.seed, schedule.moves())   # the game simulator
+        else:
+            # the moves of the interrupted session
+            self.simulator = GameSimulator(num_players, does_not_have_visualizer, checkpoint.seed)
+        self.logger    = Logger(group_name, num_players, self.simulator.seed)
+        if checkpoint is not None:
+            # the log and the statistics are only taken over once the password is verified (CheckpointStore.begin)
+            checkpoint.restore(self.simulator)
 
     async def accept (self):
         """
         Asynchronously wait for a single client to connect
+        returns False if the session was stopped or superseded by a newer session of the group meanwhile
         """
         if not self.is_running:
-            return
+            return False
+        if self.shared_listener is not None:
+            accepted = await self._accept_future
+            if accepted is None:
+                return False
+            conn, self.addr, self.decoder = accepted
+            if self.is_stopped:
+                conn.close()
+                return False
+            self.conn = conn
+            self.verified = True
+            return True
         self.socket.listen(1)
         self.socket.setblocking(False)
 
         loop = asyncio.get_event_loop()
         self.conn, self.addr = await loop.sock_accept(self.socket)
+        return True
 
     def stop (self):
         """
         The cleanup function
         """
-        if not self.is_running:
+        if self.is_stopped:
             return
+        self.is_stopped = True
         self.is_running = False
+        ice_print_group_name(self.group_name, 'client.stop:', self.crypto.stat())
+        self.logger.close()
+        metrics.release(self.group_name)
+        if self.reader is not None:
+            self.reader.cancel()
+        if self.shared_listener is not None:
+            self.shared_listener.withdraw(self.group_name, self._accept_future)
         try:
             if self.conn is not None:
                 self.conn.shutdown(SHUT_RDWR)
                 self.conn.close()
                 self.conn = None
-            self.socket.close()
+            if self.socket is not None:
+                self.socket.close()
         except Exception as e:
             # this is an inconsequential error
             ice_print_group_name(self.group_name, 'client.stop: (NO PROBLEM)', e)
@@ -69,7 +124,10 @@ class Client:
     async def verify_password(self):
         """
         We verify to see if the student supplied password matches
+        the hello of an eval_client handed over by the shared_listener was checked before
         """
+        if self.verified:
+            return True, self.timeout
         success = False
         _, timeout, text = await self.recv_text(self.timeout)
 
@@ -83,75 +141,84 @@ class Client:
         """
         receive and decrypt the message from client
         """
-        text_received   = ""
-        success         = False
+        success, timeout, data = await self.recv_frame(timeout)
+
+        text_received = ""
+        if success:
+            text_received = await self.decrypt(SessionCrypto.decode(data))
+
+        return success, timeout, text_received
+
+    async def recv_frame(self, timeout):
+        """
+        receive the next frame (base64, still encrypted) from the client, timeout None to wait without deadline
+        the frame is a memoryview of the receive buffer, valid until the next call
+        """
+        data    = b''
+        success = False
 
         if self.is_running:
-            loop = asyncio.get_event_loop()
             try:
-                while True:
-                    # recv length followed by '_' followed by cypher
-                    data = b''
-                    while not data.endswith(b'_'):
-                        start_time = perf_counter()
-                        task = loop.sock_recv(self.conn, 1)
-                        _d = await asyncio.wait_for(task, timeout=timeout)
-                        timeout -= (perf_counter() - start_time)
-                        if not _d:
-                            data = b''
-                            break
-                        data += _d
-                    if len(data) == 0:
-                        ice_print_group_name(self.group_name, 'recv_text: client disconnected')
-                        self.stop()
-                        break
-                    data = data.decode("utf-8")
-                    length = int(data[:-1])
-
-                    data = b''
-                    while len(data) < length:
-                        start_time = perf_counter()
-                        task = loop.sock_recv(self.conn, length - len(data))
-                        _d = await asyncio.wait_for(task, timeout=timeout)
-                        timeout -= (perf_counter() - start_time)
-                        if not _d:
-                            data = b''
-                            break
-                        data += _d
-                    if len(data) == 0:
-                        ice_print_group_name(self.group_name, 'recv_text: client disconnected')
-                        self.stop()
-                        break
-                    msg = data.decode("utf8")  # Decode raw bytes to UTF-8
-                    text_received = self.decrypt_message(msg)
+                # a single deadline for the length prefix and the cypher
+                start_time = perf_counter()
+                data = await asyncio.wait_for(self._recv_frame(), timeout=timeout)
+                if timeout is not None:
+                    timeout -= (perf_counter() - start_time)
+                if data is None:
+                    ice_print_group_name(self.group_name, 'recv_text: client disconnected')
+                    self.stop()
+                else:
                     success = True
-                    break
             except ConnectionResetError:
                 ice_print_group_name(self.group_name, 'recv_text: Connection Reset')
                 self.stop()
+            except ValueError as e:
+                # the length prefix is invalid or above the limit, the framing is broken
+                ice_print_group_name(self.group_name, 'recv_text: invalid frame', e)
+                self.stop()
             except asyncio.TimeoutError:
                 ice_print_group_name(self.group_name, 'recv_text: Timeout while receiving data')
                 timeout = -1
         else:
             timeout = -1
 
-        return success, timeout, text_received
+        return success, timeout, data
 
-    def decrypt_message(self, cipher_text):
+    async def _recv_frame(self):
+        """
+        recv length followed by '_' followed by cypher, returns None if the client disconnected
+        bytes received beyond the current frame are kept in the decoder for the next call
+        """
+        loop = asyncio.get_event_loop()
+        framing_time = 0.0
+        while True:
+            start_time = perf_counter()
+            frame = self.decoder.next_frame()
+            framing_time += perf_counter() - start_time
+            if frame is not None:
+                self.framing_time = framing_time
+                return frame
+            size = await loop.sock_recv_into(self.conn, self.decoder.writable(self.recv_size))
+            if not size:
+                return None
+            self.decoder.commit(size)
+
+    async def decrypt(self, message):
+        """
+        decrypt on the event loop or on the decrypt_executor
+        """
+        if self.decrypt_executor is None:
+            return self.decrypt_message(message)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.decrypt_executor, self.decrypt_message, message)
+
+    def decrypt_message(self, message):
         """
         This function decrypts the response message received from the Ultra96 using
         the secret encryption key/ password
         """
         try:
-            decoded_message = base64.b64decode(cipher_text)  # Decode message from base64 to bytes
-            iv = decoded_message[:AES.block_size]  # Get IV value
-            secret_key = bytes(str(self.secret_key), encoding="utf8")  # Convert secret key to bytes
-
-            cipher = AES.new(secret_key, AES.MODE_CBC, iv)  # Create new AES cipher object
-
-            decrypted_message = cipher.decrypt(decoded_message[AES.block_size:])  # Perform decryption
-            decrypted_message = unpad(decrypted_message, AES.block_size)
-            decrypted_message = decrypted_message.decode('utf8')  # Decode bytes into utf-8
+            decrypted_message = self.crypto.decrypt(message)
         except Exception as e:
             decrypted_message = ""
             ice_print_group_name(self.group_name, "exception in decrypt_message: ", e)
@@ -169,66 +236,155 @@ class Client:
         """ The positions the player is supposed to be in """
         return self.simulator.current_actions()
 
-    async def handle_a_player (self, player_processed, timeout_para):
+    async def handle_players (self, timeout):
+        """
+        Async generator handling all the players of the current move under a shared deadline.
+        The frames are read by a separate task as soon as they arrive and each one is handed over in the order of
+        arrival, hence the response time of every player is measured when its own packet arrived and not after
+        the packets received before it were processed.
+        Every packet uses up the slot of one player like a valid one, even if it is malformed or a duplicate.
+        yields (action_match, player_id, message, action, response_time) for every packet, followed by
+        a "Timeout" for every slot without a packet when the deadline expires.
         """
-        Function which will handle both the players one after another
+        start_time  = perf_counter()
+        deadline    = start_time + timeout
+        players_processed   = set()     # players who already sent a valid packet for this move
+        num_packets         = 0         # packets handled for this move, valid or not
+
+        if self.reader is None:
+            # a single reader for the whole session, it is never cancelled in the middle of a frame
+            self.reader = asyncio.ensure_future(self._read_packets())
+        while num_packets < self.num_players:
+            try:
+                packet = await asyncio.wait_for(self.packets.get(), timeout=deadline - perf_counter())
+            except asyncio.TimeoutError:
+                ice_print_group_name(self.group_name, 'recv_text: Timeout while receiving data')
+                break
+            if packet is self.end_marker:
+                # left in the queue, the session is over
+                self.packets.put_nowait(packet)
+                break
+            num_packets += 1
+            message, arrival_time, framing_time = packet
+            # packets received during the previous move are answered immediately
+            response_time = max(0.0, arrival_time - start_time)
+
+            stages = self.stage_metrics
+            stages["network"].observe(response_time)
+            stages["framing"].observe(framing_time)
+            stages["queue"].observe(perf_counter() - arrival_time)
+            yield await self.handle_a_player(message, response_time, players_processed)
+
+        for _ in range(self.num_players - num_packets):
+            self.stats.num_timeouts += 1
+            yield -1, -1, "Timeout", "", 0
+
+    async def _read_packets (self):
+        """
+        read the frames of the eval client until it disconnects or the session is stopped
+        frames received ahead of time stay in the queue for the next move
+        """
+        try:
+            while True:
+                success, _, frame = await self.recv_frame(None)
+                if not success:
+                    break
+                # base64 decoded before the next frame is received into the buffer, timed with the framing
+                arrival_time    = perf_counter()
+                message         = SessionCrypto.decode(frame)
+                framing_time    = self.framing_time + (perf_counter() - arrival_time)
+                self.packets.put_nowait((message, arrival_time, framing_time))
+        except ValueError as e:
+            # the framing is broken, we cannot find the next packet anymore
+            ice_print_group_name(self.group_name, 'recv_text: invalid frame', e)
+            self.stop()
+        self.packets.put_nowait(self.end_marker)
+
+    async def handle_a_player (self, message, response_time, players_processed):
         """
+        Function which will handle the packet of one player, response_time was taken on arrival
+        """
+        stages = self.stage_metrics
         start_time = perf_counter()
+        text_received = await self.decrypt(message)
+        stages["decrypt"].observe(perf_counter() - start_time)
+        result = self.apply_a_player(text_received, players_processed)
+        action_match, player_id, message, action, current_action, received_game_state = result
 
-        # wait for a json from eval_client with timeout
-        success, timeout, text_received = await self.recv_text(timeout_para)
+        if action_match == -1:
+            response_time = 0
+        else:
+            # log the result
+            stage_time = perf_counter()
+            position_1, position_2 = self.simulator.current_positions()
+            await self.logger.write_state(response_time=response_time, player_id=player_id,
+                                          correct_action=current_action,
+                                          predicted_action=action, action_matched=action_match,
+                                          game_state_received=received_game_state,
+                                          game_state_expected=self.simulator.get_game_state_dict(),
+                                          move=self.simulator.move_index,
+                                          position_1=position_1, position_2=position_2,
+                                          no_visualizer=self.simulator.does_not_have_visualizer,
+                                          seed=self.simulator.seed)
+            stages["log"].observe(perf_counter() - stage_time)
+
+        return action_match, player_id, message, action, response_time
+
+    def apply_a_player (self, text_received, players_processed):
+        """
+        apply the decrypted packet of one player to the game state
+        returns (action_match, player_id, message, action, correct action, received game state)
+        """
+        stages      = self.stage_metrics
+        stage_time  = perf_counter()
 
-        player_id       = -1
-        action          = ""
-        action_match    = -1  # -1 means error
-        response_time   = 0
+        player_id           = -1
+        action              = ""
+        action_match        = -1  # -1 means error
+        current_action      = ""
+        received_game_state = None
 
-        if success:
-            try:
-                data = json.loads (text_received)
-
-                # process the received game state
-                player_id           = int (data["player_id"])
-                action              = data["action"]
-                received_game_state = data["game_state"]
-
-                if player_id == player_processed:
-                    # we have received a duplicate json, hence discarding
-                    message = "player_id "+str(player_id)+" received twice, discarding the packet"
-                elif player_id > self.num_players or player_id < 1:
-                    message = "player_id " + str(player_id) + " INVALID, discarding the packet"
+        try:
+            data = Codec.stdlib_loads (text_received)
+            start_time, stage_time = stage_time, perf_counter()
+            stages["json"].observe(stage_time - start_time)
+
+            # process the received game state
+            player_id           = int (data["player_id"])
+            action              = data["action"]
+            received_game_state = data["game_state"]
+
+            if player_id in players_processed:
+                # we have received a duplicate json, hence discarding
+                message = "player_id "+str(player_id)+" received twice, discarding the packet"
+            elif player_id > self.num_players or player_id < 1:
+                message = "player_id " + str(player_id) + " INVALID, discarding the packet"
+            else:
+                players_processed.add(player_id)
+
+                # does the action match
+                current_action = self.simulator.current_action(player_id)
+                if action == current_action:
+                    # action matches
+                    action_match = 0
                 else:
-                    # does the action match
-                    current_action = self.simulator.current_action(player_id)
-                    if action == current_action:
-                        # action matches
-                        action_match = 0
-                    else:
-                        action_match = 1
-
-                    # use the user sent action to alter the game state
-                    self.simulator.perform_action (action, player_id)
-
-                    # find the difference between the game states
-                    message = self.simulator.get_game_state_difference (received_game_state)
-
-                    # log the result
-                    response_time = perf_counter() - start_time
-                    await self.logger.write_state(response_time=response_time, player_id=player_id,
-                                                  correct_action=current_action,
-                                                  predicted_action=action, action_matched=action_match,
-                                                  game_state_received=received_game_state,
-                                                  game_state_expected=self.simulator.get_game_state_dict())
-
-            except (ValueError, TypeError):  # includes simplejson.decoder.JSONDecodeError
-                message = 'Decoding JSON has failed'
-                ice_print_group_name(self.group_name, "handle_a_player: " + message)
-
-            # check if the action and game state match
-        else:
-            message = "Timeout"
+                    action_match = 1
+
+                # use the user sent action to alter the game state
+                self.simulator.perform_action (action, player_id)
+                start_time, stage_time = stage_time, perf_counter()
+                stages["game_step"].observe(stage_time - start_time)
 
-        return action_match, player_id, message, action, response_time, timeout
+                # find the difference between the game states
+                message = self.simulator.get_game_state_difference (received_game_state)
+                start_time, stage_time = stage_time, perf_counter()
+                stages["diff"].observe(stage_time - start_time)
+
+        except (ValueError, TypeError):  # includes simplejson.decoder.JSONDecodeError
+            message = 'Decoding JSON has failed'
+            ice_print_group_name(self.group_name, "handle_a_player: " + message)
+
+        return action_match, player_id, message, action, current_action, received_game_state
 
     def move_forward (self):
         """
@@ -244,13 +400,13 @@ class Client:
         if not self.is_running:
             return
         loop = asyncio.get_event_loop()
+        start_time = perf_counter()
 
-        game_state  = json.dumps(self.simulator.game_state.get_dict())
-        data        = str(len(game_state))+"_"+game_state
+        data = encode_frame(Codec.stdlib_dumps(self.simulator.game_state.get_dict()))
 
         # send the data to eval client
         try:
-            task = loop.sock_sendall(self.conn, data.encode("utf-8"))
+            task = loop.sock_sendall(self.conn, data)
             await asyncio.wait_for(task, timeout=self.timeout)
         except OSError:
             ice_print_group_name(self.group_name, 'send_game_state: Connection terminated')
@@ -261,6 +417,7 @@ class Client:
         except asyncio.TimeoutError:
             ice_print_group_name(self.group_name, 'send_game_state: Timeout while sending data')
 
+        self.stage_metrics["reply"].observe(perf_counter() - start_time)
         return
 
     def num_actions_gun (self):
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+JSON encoding and decoding of the eval server: the web client events, the eval_client packets, the game states
+sent back and the log records all go through this module.
+
+The backend encodes the events sent to the web pages, the spectators and the admin dashboard: orjson when it is
+installed (pip install orjson), the stdlib json module otherwise, use() selects another one.
+dumps() returns bytes, dumps_str() returns the str sent in websocket text frames.
+
+What is graded never depends on what is installed: the eval_client packets, the game states sent back, the
+handshake and the evaluation logs are written with stdlib_dumps() and read with stdlib_loads(), so the logs keep
+the bytes the eval server always wrote and are read back (replay, compaction, index) by the parser which wrote them.
+
+Differences between the backends:
+    orjson writes no spaces after ',' and ':', and non ASCII characters as UTF-8 instead of \\uXXXX
+    orjson reads integers wider than 64 bits as floats
+    NaN and Infinity, which orjson rejects, are read by the stdlib json module
+    values orjson cannot encode (e.g. integers wider than 64 bits) are written by the stdlib json module
+
+python3 CodecBenchmark.py compares the speed of the backends on the payloads of a game.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DecodeError = json.JSONDecodeError  # raised by loads, a subclass of ValueError
+
+
+def _json_dumps(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_dumps_str(obj):
+    return json.dumps(obj)
+
+
+def _json_loads(data):
+    return json.loads(data)
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj)
+    except orjson.JSONEncodeError:
+        return json.dumps(obj).encode('utf-8')
+
+
+def _orjson_dumps_str(obj):
+    try:
+        return orjson.dumps(obj).decode('utf-8')
+    except orjson.JSONEncodeError:
+        return json.dumps(obj)
+
+
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # NaN, Infinity, lone surrogates, ... or invalid json, in which case json raises the error
+        return json.loads(data)
+
+
+stdlib_dumps    = _json_dumps    # obj -> bytes, always the stdlib json module
+stdlib_loads    = _json_loads    # bytes or str -> obj, always the stdlib json module
+
+_backends = {"json": (_json_dumps, _json_dumps_str, _json_loads)}
+if orjson is not None:
+    _backends["orjson"] = (_orjson_dumps, _orjson_dumps_str, _orjson_loads)
+
+backend = None          # name of the backend in use
+dumps   = None          # obj -> bytes
+dumps_str = None        # obj -> str
+loads   = None          # bytes or str -> obj, raises DecodeError
+
+
+def available():
+    """ the names of the installed backends """
+    return list(_backends.keys())
+
+
+def use(name):
+    """ select a backend, raises ValueError if it is not installed """
+    global backend, dumps, dumps_str, loads
+    if name not in _backends:
+        raise ValueError("json backend {} is not installed, available: {}".format(name, ", ".join(available())))
+    backend = name
+    dumps, dumps_str, loads = _backends[name]
+
+
+use("orjson" if orjson is not None else "json")
+
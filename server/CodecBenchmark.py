@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+Speed of the json backends of Codec.py on the payloads of a game. Not used by the eval server.
+
+python3 CodecBenchmark.py
+"""
+
+import timeit
+
+import Codec
+from GameSimulator import GameSimulator
+
+
+def benchmark():
+    """ time every backend on the payloads of a game """
+    simulator = GameSimulator(2, False)
+    for i in range(10):
+        simulator.perform_action(simulator.current_action(1), 1)
+        simulator.perform_action(simulator.current_action(2), 2)
+        simulator.move_forward()
+    game_state  = simulator.get_game_state_dict()
+    packet      = {"player_id": 1, "action": "gun", "game_state": game_state}
+    record      = {'id': 1234, 'timestamp': 1700000000.123456, 'response_time': 0.5234, 'player_id': 1,
+                   'correct_action': 'gun', 'predicted_action': 'gun', 'action_matched': 0,
+                   'game_state_received': game_state, 'game_state_expected': game_state,
+                   'move': 10, 'position_1': 1, 'position_2': 3, 'no_visualizer': False, 'seed': 123456789}
+    event       = {"type": "action_match", "message": "Game state difference : {'p1': {}, 'p2': {}}",
+                   "pos_1": -1, "pos_2": -1, "action_match": 0, "player_id": 1}
+    batch       = {"type": "batch", "events": [event] * 6}
+
+    cases = [
+        ("loads eval_client packet",    "loads",        packet),
+        ("dumps game state (reply)",    "dumps",        game_state),
+        ("dumps log record",            "dumps",        record),
+        ("dumps_str UI batch frame",    "dumps_str",    batch),
+    ]
+    number = 20000
+    print("{:28}".format("us per call") + "".join("{:>10}".format(name) for name in Codec.available()))
+    for title, function, payload in cases:
+        times = []
+        for name in Codec.available():
+            Codec.use(name)
+            if function == "loads":
+                data = Codec.dumps(payload)
+                t = timeit.timeit(lambda: Codec.loads(data), number=number)
+            elif function == "dumps":
+                t = timeit.timeit(lambda: Codec.dumps(payload), number=number)
+            else:
+                t = timeit.timeit(lambda: Codec.dumps_str(payload), number=number)
+            times.append(t / number * 1e6)
+        print("{:28}".format(title) + "".join("{:10.2f}".format(t) for t in times))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+"""
+Compact binary format of the evaluation logs.
+
+file   := FILE_HEADER record*
+record := header body
+header := record length (uint32, header included), id (uint64)
+body   := timestamp (f64), response_time (f64), player_id (int8), correct_action (uint8),
+          predicted_action (uint8), action_matched (int8), flags (uint8),
+          game_state_expected (12 x int16),
+          game_state_received (12 x int16 if flags & FLAG_RECV_COMPACT else uint32 length + json),
+          predicted_action (uint32 length + json, only if its code is ACTION_JSON),
+          move (uint16), position_1 (uint8), position_2 (uint8), no_visualizer (uint8)
+              (only if flags & FLAG_MOVE_CONTEXT, older logs do not have these fields),
+          seed (uint32, only if flags & FLAG_SEED)
+
+The game states are stored as hp, bullets, bombs, shield_hp, deaths, shields of p1 followed by p2.
+Anything the eval client sent that does not fit this layout (unknown action, extra keys, non int values)
+is kept as json, so converting back to json lines gives the exact same text (the stdlib json module of Codec.py).
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+import Codec
+
+FILE_HEADER = b'CG4L\x01\x00\x00\x00'
+
+ACTIONS         = ["none", "gun", "shield", "bomb", "reload", "ironMan", "hulk", "captAmerica", "shangChi", "logout"]
+ACTION_CODES    = {a: i for i, a in enumerate(ACTIONS)}
+ACTION_JSON     = 255
+
+PLAYER_KEYS = ('hp', 'bullets', 'bombs', 'shield_hp', 'deaths', 'shields')
+
+FLAG_RECV_COMPACT = 1
+FLAG_MOVE_CONTEXT = 2
+FLAG_SEED         = 4
+
+CONTEXT_KEYS = ('move', 'position_1', 'position_2', 'no_visualizer')
+
+_header = struct.Struct('<IQ')
+_fixed  = struct.Struct('<ddbBBbB')
+_state  = struct.Struct('<12h')
+_length = struct.Struct('<I')
+_context = struct.Struct('<HBBB')
+_seed    = struct.Struct('<I')
+
+
+def _state_to_ints(game_state):
+    """
+    the 12 counters of a game state dict or None if it does not have exactly the layout of GameState.get_dict
+    """
+    if type(game_state) is not dict or list(game_state.keys()) != ['p1', 'p2']:
+        return None
+    values = []
+    for p in ('p1', 'p2'):
+        player = game_state[p]
+        if type(player) is not dict or tuple(player.keys()) != PLAYER_KEYS:
+            return None
+        for key in PLAYER_KEYS:
+            v = player[key]
+            if type(v) is not int or not -32768 <= v <= 32767:
+                return None
+            values.append(v)
+    return values
+
+
+def _ints_to_state(values):
+    return {'p1': dict(zip(PLAYER_KEYS, values[:6])), 'p2': dict(zip(PLAYER_KEYS, values[6:]))}
+
+
+def _json_field(value):
+    text = Codec.stdlib_dumps(value)
+    return _length.pack(len(text)) + text
+
+
+def encode_record(data):
+    """
+    encode a log record (the dict written by Logger.write_state) as bytes
+    raises ValueError if a field cannot be represented
+    """
+    expected = _state_to_ints(data['game_state_expected'])
+    if expected is None:
+        raise ValueError("game_state_expected does not have the GameState layout")
+
+    predicted   = data['predicted_action']
+    code        = ACTION_CODES.get(predicted, ACTION_JSON) if type(predicted) is str else ACTION_JSON
+
+    received    = _state_to_ints(data['game_state_received'])
+    flags       = 0
+    if received is not None:
+        flags |= FLAG_RECV_COMPACT
+    if 'move' in data:
+        flags |= FLAG_MOVE_CONTEXT
+        if type(data['no_visualizer']) is not bool:
+            raise ValueError("no_visualizer is not a bool")
+    if 'seed' in data:
+        flags |= FLAG_SEED
+
+    try:
+        _header.pack(0, data['id'])    # validates the id
+        body = [_fixed.pack(data['timestamp'], data['response_time'], data['player_id'],
+                            ACTION_CODES[data['correct_action']], code, data['action_matched'], flags),
+                _state.pack(*expected)]
+    except (KeyError, struct.error) as e:
+        raise ValueError("record does not fit the compact format: " + str(e))
+
+    if received is not None:
+        body.append(_state.pack(*received))
+    else:
+        body.append(_json_field(data['game_state_received']))
+    if code == ACTION_JSON:
+        body.append(_json_field(predicted))
+    if flags & FLAG_MOVE_CONTEXT:
+        try:
+            body.append(_context.pack(*[data[key] for key in CONTEXT_KEYS]))
+        except (KeyError, struct.error) as e:
+            raise ValueError("move context does not fit the compact format: " + str(e))
+    if flags & FLAG_SEED:
+        try:
+            body.append(_seed.pack(data['seed']))
+        except struct.error as e:
+            raise ValueError("seed does not fit the compact format: " + str(e))
+
+    body = b''.join(body)
+    return _header.pack(_header.size + len(body), data['id']) + body
+
+
+def decode_record(buffer, offset=0):
+    """
+    decode the record starting at offset of buffer (bytes, mmap, ...) into the dict written by Logger
+    """
+    size, random_id = _header.unpack_from(buffer, offset)
+    pos = offset + _header.size
+    timestamp, response_time, player_id, correct, code, action_matched, flags = _fixed.unpack_from(buffer, pos)
+    pos += _fixed.size
+    expected = _state.unpack_from(buffer, pos)
+    pos += _state.size
+
+    if flags & FLAG_RECV_COMPACT:
+        received = _ints_to_state(_state.unpack_from(buffer, pos))
+        pos += _state.size
+    else:
+        received, pos = _read_json(buffer, pos)
+
+    if code == ACTION_JSON:
+        predicted, pos = _read_json(buffer, pos)
+    else:
+        predicted = ACTIONS[code]
+
+    context = None
+    if flags & FLAG_MOVE_CONTEXT:
+        context = _context.unpack_from(buffer, pos)
+        pos += _context.size
+    seed = None
+    if flags & FLAG_SEED:
+        (seed,) = _seed.unpack_from(buffer, pos)
+
+    data = dict()
+    data['id']                  = random_id
+    data['timestamp']           = timestamp
+    data['response_time']       = response_time
+    data['player_id']           = player_id
+    data['correct_action']      = ACTIONS[correct]
+    data['predicted_action']    = predicted
+    data['action_matched']      = action_matched
+    data['game_state_received'] = received
+    data['game_state_expected'] = _ints_to_state(expected)
+    if context is not None:
+        data['move'], data['position_1'], data['position_2'], no_visualizer = context
+        data['no_visualizer'] = bool(no_visualizer)
+    if seed is not None:
+        data['seed'] = seed
+    return data
+
+
+def _read_json(buffer, pos):
+    (n,) = _length.unpack_from(buffer, pos)
+    pos += _length.size
+    return Codec.stdlib_loads(bytes(buffer[pos:pos+n])), pos + n
+
+
+class CompactLogReader:
+    """
+    Memory maps a compact log and indexes the offset of every record by session (the random_id of the Logger).
+    Only the record headers are read to build the index, records are decoded on demand.
+    """
+
+    def __init__(self, filepath):
+        self.filepath   = filepath
+        self.offsets    = []      # offset of every record in the file
+        self.sessions   = dict()  # random_id -> list of indices into offsets, in the order they were logged
+
+        self._file  = open(filepath, 'rb')
+        self._mmap  = None
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            return
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(FILE_HEADER)] != FILE_HEADER:
+            self.close()
+            raise ValueError(filepath + " is not a compact evaluation log")
+
+        for offset, random_id in _record_offsets(self._mmap, size):
+            self.sessions.setdefault(random_id, []).append(len(self.offsets))
+            self.offsets.append(offset)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield decode_record(self._mmap, offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def record(self, index):
+        """ the index-th record of the file """
+        return decode_record(self._mmap, self.offsets[index])
+
+    def session_ids(self):
+        """ the random_id of all the sessions in the order they appear """
+        return list(self.sessions.keys())
+
+    def session(self, random_id):
+        """ all the records of one session """
+        return [self.record(i) for i in self.sessions.get(random_id, [])]
+
+    def move(self, random_id, n):
+        """ the n-th record logged for a session (moves which timed out are not logged) """
+        return self.record(self.sessions[random_id][n])
+
+
+def _record_offsets(buffer, size, offset=len(FILE_HEADER)):
+    """ the offset and random_id of every record of a compact log from offset """
+    while offset + _header.size <= size:
+        length, random_id = _header.unpack_from(buffer, offset)
+        if length < _header.size or offset + length > size:
+            # truncated record at the end of the file, e.g. the server was killed while writing
+            break
+        yield offset, random_id
+        offset += length
+
+
+def decode_records(data):
+    """
+    the records of a compact log held in memory, e.g. a decompressed segment (LogStore.py)
+    """
+    if data[:len(FILE_HEADER)] != FILE_HEADER:
+        raise ValueError("not a compact evaluation log")
+    return [decode_record(data, offset) for offset, _ in _record_offsets(data, len(data))]
+
+
+def decode_tail(data):
+    """
+    the complete records of a chunk of a compact log read from the beginning of a record and the number of bytes
+    they take, the rest is a record still being written (LogIndex.py)
+    """
+    records = []
+    end     = 0
+    for offset, _ in _record_offsets(data, len(data), 0):
+        records.append(decode_record(data, offset))
+        end = offset + _header.unpack_from(data, offset)[0]
+    return records, end
+
+
+def json_to_compact(src, dst):
+    """
+    convert a json lines evaluation log into the compact format, returns the number of records
+    """
+    count = 0
+    with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+        f_out.write(FILE_HEADER)
+        for line_num, line in enumerate(f_in, 1):
+            if not line.strip():
+                continue
+            try:
+                f_out.write(encode_record(Codec.stdlib_loads(line)))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError("{}:{}: {}".format(src, line_num, e))
+            count += 1
+    return count
+
+
+def compact_to_json(src, dst):
+    """
+    convert a compact evaluation log into json lines, returns the number of records
+    """
+    count = 0
+    with CompactLogReader(src) as reader, open(dst, 'wb') as f_out:
+        for data in reader:
+            f_out.write(Codec.stdlib_dumps(data) + b'\n')
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="convert and inspect compact evaluation logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("to-compact", help="convert a json lines log to the compact format")
+    p.add_argument("src")
+    p.add_argument("dst")
+
+    p = sub.add_parser("to-json", help="convert a compact log to json lines")
+    p.add_argument("src")
+    p.add_argument("dst")
+
+    p = sub.add_parser("show", help="print the records of a compact log as json lines")
+    p.add_argument("src")
+    p.add_argument("--session", type=int, help="only the records of this random_id")
+    p.add_argument("--move", type=int, help="only the n-th record of the session")
+
+    args = parser.parse_args()
+    if args.command == "to-compact":
+        print(json_to_compact(args.src, args.dst), "records converted")
+    elif args.command == "to-json":
+        print(compact_to_json(args.src, args.dst), "records converted")
+    else:
+        with CompactLogReader(args.src) as reader:
+            if args.session is None:
+                records = reader
+            elif args.move is None:
+                records = reader.session(args.session)
+            else:
+                records = [reader.move(args.session, args.move)]
+            for data in records:
+                print(Codec.dumps_str(data))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+
+import websockets
+
+import Codec
+from Helper import ice_print
+from WebChannel import Subscriber
+
+
+class Dashboard:
+    """
+    Admin websocket endpoint with the live state of every session of this process (html/admin.html).
+    A page first receives a "snapshot" of all the groups, then every interval seconds a "delta" holding only the
+    fields which changed and the groups which left; nothing is sent while nothing changes. The deltas are computed
+    and serialized once for all the pages, and every page is sent to by its own task (WebChannel.Subscriber), so a
+    slow page is disconnected instead of slowing down the sessions.
+    Fields of a group:
+        players, move ("5 / 22"), state (connected, disconnected, finished),
+        gun, ai ([matched, actions played so far]), timeouts,
+        gun_latency, ai_latency ([mean, median, p90, p99] of the response times in seconds, null if empty)
+    """
+    interval = 1.0  # seconds between two deltas
+
+    def __init__(self):
+        self.clients        = dict()    # group_name -> Client of the sessions, the client_dict of WebSocketServer
+        self.snapshot       = dict()    # group_name -> fields, as sent with the last delta
+        self.subscribers    = []        # the admin pages
+        self._cache         = dict()    # group_name -> (Client, key, fields), the fields are only computed on change
+
+    async def serve(self, host, port, clients):
+        """ start the admin endpoint and the deltas, returns the websocket server """
+        self.clients = clients
+        server = await websockets.serve(self.handler, host, port)
+        asyncio.ensure_future(self._run())
+        ice_print("Dashboard: admin websocket on ws://{}:{}/".format(host, port), color=2)
+        return server
+
+    async def handler(self, websocket):
+        """ serve an admin page until it is closed """
+        subscriber = Subscriber(websocket, None)
+        subscriber.push(Codec.dumps_str({"type": "snapshot", "interval": self.interval, "groups": self.snapshot}))
+        self.subscribers.append(subscriber)
+        try:
+            await subscriber.serve()
+        finally:
+            self.subscribers.remove(subscriber)
+        if subscriber.lagging:
+            ice_print("Dashboard: admin page disconnected, more than", Subscriber.max_lag, "frames behind", color=1)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            delta = self.update()
+            if delta is not None and self.subscribers:
+                text = Codec.dumps_str(delta)
+                for subscriber in self.subscribers:
+                    subscriber.push(text)
+
+    def update(self):
+        """ take the state of the sessions, returns the delta from the previous state or None if it is the same """
+        changed = dict()
+        current = dict()
+        for group_name, client in list(self.clients.items()):
+            fields = self._fields(group_name, client)
+            current[group_name] = fields
+            previous = self.snapshot.get(group_name)
+            if previous is None:
+                changed[group_name] = fields
+            elif previous is not fields:
+                diff = {key: value for key, value in fields.items() if previous.get(key) != value}
+                if diff:
+                    changed[group_name] = diff
+        removed = [group_name for group_name in self.snapshot if group_name not in current]
+        for group_name in removed:
+            self._cache.pop(group_name, None)
+        self.snapshot = current
+        if not changed and not removed:
+            return None
+        return {"type": "delta", "groups": changed, "removed": removed}
+
+    def _fields(self, group_name, client):
+        """ the fields of a session, the previous ones while the session did not change """
+        stats       = client.stats
+        simulator   = client.simulator
+        if client.is_stopped:
+            state = "disconnected"
+        elif simulator.move_index >= simulator.num_moves:
+            state = "finished"
+        else:
+            state = "connected"
+        key = (simulator.move_index, state, stats.num_timeouts) + tuple(stats.num_matched.values())
+
+        cached = self._cache.get(group_name)
+        if cached is not None and cached[0] is client and cached[1] == key:
+            return cached[2]
+
+        num_gun, num_ai = simulator.num_actions_played()
+        fields = {
+            "players":      client.num_players,
+            "move":         simulator.current_move(),
+            "state":        state,
+            "gun":          [stats.num_matched["GUN"], num_gun],
+            "ai":           [stats.num_matched["AI "], num_ai],
+            "timeouts":     stats.num_timeouts,
+            "gun_latency":  self._latency(stats.response_time["GUN"]),
+            "ai_latency":   self._latency(stats.response_time["AI "]),
+        }
+        self._cache[group_name] = (client, key, fields)
+        return fields
+
+    @staticmethod
+    def _latency(sketch):
+        if len(sketch) == 0:
+            return None
+        return [round(value, 4) for value in sketch.summary()]
+
+
+dashboard = Dashboard()     # the admin endpoint of this process
@@ -0,0 +1,92 @@
+class FrameDecoder:
+    """
+    Incremental decoder for the "<length>_<payload>" framing used between the eval_server and the eval_client.
+    The bytes are received directly into a buffer owned by the decoder (writable() then commit(), e.g. with
+    loop.sock_recv_into) or appended with feed(), leftover bytes are kept for the next frame.
+    The buffer is reused for the whole connection: frames are returned as memoryview slices of it, which stay
+    valid until the next call of writable() or feed().
+    The buffer only grows by what the receives need: a frame longer than max_frame_len is rejected when its
+    prefix is decoded, before any memory is allocated for it.
+    """
+    max_prefix_len  = 10        # number of digits we are willing to buffer while looking for the '_'
+    max_frame_len   = 8192      # longest payload accepted, an encrypted eval_client packet is a few hundred bytes
+    initial_size    = 8192      # bytes allocated when the decoder is created
+
+    def __init__(self, max_frame_len=None):
+        if max_frame_len is not None:
+            self.max_frame_len = max_frame_len
+        self.buffer = bytearray(self.initial_size)
+        self.view   = memoryview(self.buffer)
+        self.start  = 0     # the bytes not decoded yet are buffer[start:end]
+        self.end    = 0
+        self.length = -1    # length of the payload being decoded, -1 while the prefix is incomplete
+
+    def writable(self, size):
+        """
+        a memoryview of at least size free bytes at the end of the buffer, to receive into
+        the frames returned before are invalidated
+        """
+        if len(self.buffer) - self.end < size:
+            self._make_room(size)
+        return self.view[self.end:]
+
+    def commit(self, size):
+        """ size bytes were written at the beginning of the view returned by writable() """
+        self.end += size
+
+    def feed(self, data):
+        """ append the bytes received from the socket """
+        self.writable(len(data))[:len(data)] = data
+        self.end += len(data)
+
+    def _make_room(self, size):
+        """ move the pending bytes to the front of the buffer, or to a larger buffer """
+        pending = self.end - self.start
+        if len(self.buffer) - pending >= size:
+            buffer = self.buffer
+        else:
+            # a new buffer: the frames returned before may still be referenced, the old one is left to them
+            buffer = bytearray(max(2 * len(self.buffer), pending + size))
+        # only the bytes of an incomplete frame, usually none
+        buffer[:pending] = bytes(self.view[self.start:self.end])
+        if buffer is not self.buffer:
+            self.buffer = buffer
+            self.view   = memoryview(buffer)
+        self.start  = 0
+        self.end    = pending
+
+    def next_frame(self):
+        """
+        return the payload of the next complete frame as a memoryview of the buffer, None if more data is needed
+        raises ValueError if the length prefix is malformed or the length is above max_frame_len
+        """
+        if self.length < 0:
+            end = self.buffer.find(b'_', self.start, self.end)
+            if end < 0:
+                if self.end - self.start > self.max_prefix_len:
+                    raise ValueError("length prefix not terminated by '_'")
+                return None
+            length = int(self.buffer[self.start:end])
+            if length < 0:
+                raise ValueError("negative frame length")
+            if length > self.max_frame_len:
+                raise ValueError("frame length {} above the limit of {} bytes".format(length, self.max_frame_len))
+            self.length = length
+            self.start  = end + 1
+
+        if self.end - self.start < self.length:
+            return None
+
+        frame = self.view[self.start:self.start + self.length]
+        self.start += self.length
+        self.length = -1
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frame
+
+
+def encode_frame(payload):
+    """
+    frame the payload (bytes) as "<length>_<payload>"
+    """
+    return str(len(payload)).encode("utf-8") + b"_" + payload
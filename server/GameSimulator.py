@@ -10,40 +10,60 @@ class GameSimulator:
     Actions will be displayed on the evaluation server UI for the
     players to follow.
     """
-    def __init__(self, num_players, does_not_have_visualizer):
+    def __init__(self, num_players, does_not_have_visualizer, seed=None, moves=None):
+        """
+        seed: the moves are generated with random.Random(seed), a random seed if None
+        moves: the moves generated in advance from seed (SchedulePool)
+        """
         # create the players
         self.game_state     = GameState()
         self.num_players    = num_players
 
         # generate the list of action and moves to perform
+        if seed is None:
+            seed = random.getrandbits(32)
+        if moves is None:
+            moves = self.generate_moves(num_players, random.Random(seed))
+        self.seed       = seed  # regenerates the same moves
+        self.moves      = moves
+        self.move_index = 0  # move to be made
+        self.num_moves  = len(self.moves)
+
         self.num_moves_gun  = 0
         self.num_moves_ai   = 0
+        for actions in self._player_actions(moves, num_players):
+            _g = actions.count(Action.shoot)
+            self.num_moves_gun += _g
+            self.num_moves_ai  += len(actions)-_g
 
-        self.moves      = self._init_moves (num_players)
-        self.move_index = 0  # move to be made
-        self.num_moves  = len(self.moves)
+        # number of gun actions in the moves before index i
+        self._num_gun_before = [0]
+        for actions in zip(*self._player_actions(moves, num_players)):
+            self._num_gun_before.append(self._num_gun_before[-1] + actions.count(Action.shoot))
 
         self.does_not_have_visualizer = does_not_have_visualizer  # some teams do not have visualizer
 
-    def _init_moves(self, num_players):
+    @staticmethod
+    def _player_actions(moves, num_players):
+        """ the list of actions of every player """
+        ret = [[move.action_1 for move in moves]]
+        if num_players == 2:
+            ret.append([move.action_2 for move in moves])
+        return ret
+
+    @classmethod
+    def generate_moves(cls, num_players, rng):
         """
-        Create a random list of moves
+        Create a random list of moves, all the random numbers are drawn from rng (random.Random)
         """
         # randomize the size of the list
-        _r = random.randint(0, 1)
+        _r = rng.randint(0, 1)
 
-        actions_1 = Action.init_list(_r)
+        actions_1 = Action.init_list(_r, rng)
         n = len(actions_1)
 
-        _g = actions_1.count(Action.shoot)
-        self.num_moves_gun += _g
-        self.num_moves_ai  += n-_g
-
         if num_players == 2:
-            actions_2 = Action.init_list(_r)
-            _g = actions_2.count(Action.shoot)
-            self.num_moves_gun += _g
-            self.num_moves_ai  += n-_g
+            actions_2 = Action.init_list(_r, rng)
         else:
             actions_2 = [Action.none]*n
 
@@ -52,14 +72,14 @@ class GameSimulator:
             m = n//2
             positions_1 = [1]
             positions_2 = [3]
-            self._get_positions (m, positions_1)
-            self._get_positions (m, positions_2)
+            cls._get_positions (m, positions_1, rng)
+            cls._get_positions (m, positions_2, rng)
             # adding the disconnect move
             positions_1.extend([0, 2])
             positions_2.extend([3, 4])
             m = n-m
-            self._get_positions (m, positions_1)
-            self._get_positions (m, positions_2)
+            cls._get_positions (m, positions_1, rng)
+            cls._get_positions (m, positions_2, rng)
 
             # adding the disconnect move
             positions_1[n-3] = 0
@@ -79,13 +99,38 @@ class GameSimulator:
 
         return moves
 
+    @classmethod
+    def validate_moves(cls, moves, num_players):
+        """
+        check that a list of moves has the shape of generate_moves, raises ValueError
+        """
+        n = len(moves)
+        if n < 4:
+            raise ValueError("too few moves: " + str(n))
+        for actions in cls._player_actions(moves, num_players):
+            if actions[-1] != Action.logout:
+                raise ValueError("the last action is not logout")
+            _r = actions.count(Action.shoot) - Action.num_shoot_total
+            if _r not in (0, 1) or sorted(actions) != sorted(Action.init_list(_r, random.Random(0))):
+                raise ValueError("unexpected actions: " + str(sorted(actions)))
+        for move in moves:
+            if not (0 <= move.position_1 <= 4 and 0 <= move.position_2 <= 4):
+                raise ValueError("position out of range: " + str(move))
+        if num_players == 2:
+            if moves[n-3].position_1 != 0 or moves[n-3].position_2 != 0:
+                raise ValueError("no disconnect move")
+        elif moves[n-4].position_1 != 0:
+            raise ValueError("no disconnect move")
+        elif any(move.action_2 != Action.none or move.position_2 != 1 for move in moves):
+            raise ValueError("player 2 of a 1-player game moves")
+
     @staticmethod
-    def _get_positions(n, ret):
+    def _get_positions(n, ret, rng):
         """ Generates a list of moves """
         prev_pos = ret[-1]
 
         for _ in range(n):
-            r = random.random()
+            r = rng.random()
             if r < 0.49:
                 next_pos = prev_pos + 1
             elif r < 0.98:
@@ -154,6 +199,14 @@ class GameSimulator:
         """
         return self.num_moves_ai
 
+    def num_actions_played(self):
+        """
+        return the number of gun and AI actions in the moves played so far
+        """
+        move_index  = min(self.move_index, self.num_moves)
+        num_gun     = self._num_gun_before[move_index]
+        return num_gun, move_index * self.num_players - num_gun
+
     def get_game_state_dict(self):
         return self.game_state.get_dict()
 
@@ -3,8 +3,18 @@ import sys
 
 from Helper import Action
 
+# sanity check to see if GameState.perform_action handles all the actions
+if not Action.actions_match({"gun", "shield", "bomb", "reload", "ironMan", "hulk", "captAmerica", "shangChi"}):
+    print("All actions not handled by GameState.perform_action")
+    sys.exit(-1)
+
+_AI_ACTIONS         = frozenset({"ironMan", "hulk", "captAmerica", "shangChi"})
+_ALWAYS_VISIBLE     = _AI_ACTIONS | {"bomb"}   # actions which do not need line of sight without a visualizer
+
 
 class GameState:
+    __slots__ = ('player_1', 'player_2')
+
     def __init__(self):
         self.player_1 = Player()
         self.player_2 = Player()
@@ -22,12 +32,11 @@ class GameState:
             recv_p1_dict = received_game_state["p1"]
             recv_p2_dict = received_game_state["p2"]
 
-            p1 = self.player_1.get_difference(recv_p1_dict)
-            p2 = self.player_2.get_difference(recv_p2_dict)
-
-            diff = {'p1': p1, 'p2': p2}
+            p1 = self.player_1.format_difference(recv_p1_dict)
+            p2 = self.player_2.format_difference(recv_p2_dict)
 
-            message = "Game state difference : " + str(diff)
+            # same text as str() of {'p1': player_1.get_difference(), 'p2': ...}
+            message = "Game state difference : {'p1': {" + p1 + "}, 'p2': {" + p2 + "}}"
         except KeyError:
             message = "Key error in the received Json"
         return message
@@ -57,13 +66,6 @@ class GameState:
 
     def perform_action(self, action, player_id, position_1, position_2, does_not_have_visualizer):
         """use the user sent action to alter the game state"""
-
-        # perform sanity check to see if our function handles all the actions
-        all_actions = {"gun", "shield", "bomb", "reload", "ironMan", "hulk", "captAmerica", "shangChi"}
-        if not Action.actions_match(all_actions):
-            print("All actions not handled by GameState.perform_action")
-            sys.exit(-1)
-
         if player_id == 1:
             attacker            = self.player_1
             opponent            = self.player_2
@@ -88,7 +90,7 @@ class GameState:
 
         if does_not_have_visualizer:
             # for bomb and AI actions we assume the opponent is always visible
-            if action in {"ironMan", "hulk", "captAmerica", "shangChi", "bomb"}:
+            if action in _ALWAYS_VISIBLE:
                 can_see = True
 
         # perform the actual action
@@ -100,7 +102,7 @@ class GameState:
             attacker.reload()
         elif action == "bomb":
             attacker.bomb(opponent, opponent_position, can_see)
-        elif action in {"ironMan", "hulk", "captAmerica", "shangChi"}:
+        elif action in _AI_ACTIONS:
             # all these have the same behaviour
             attacker.harm_AI(opponent, can_see)
         elif action == "logout":
@@ -123,17 +125,27 @@ class GameState:
 
 
 class Player:
-    def __init__(self):
-        self.max_bombs          = 2
-        self.max_shields        = 3
-        self.hp_bullet          = 5     # the hp reduction for bullet
-        self.hp_AI              = 10    # the hp reduction for AI action
-        self.hp_bomb            = 5
-        self.hp_fire            = 5
-        self.max_shield_health  = 30
-        self.max_bullets        = 6
-        self.max_hp             = 100
+    """
+    The counters of a player are slots and the rules of the game are class constants.
+    The fires started by the bombs of the player are counted per quadrant.
+    """
+    __slots__ = ('hp', 'num_bullets', 'num_bombs', 'hp_shield', 'num_deaths', 'num_shield', 'fires')
+
+    max_bombs          = 2
+    max_shields        = 3
+    hp_bullet          = 5     # the hp reduction for bullet
+    hp_AI              = 10    # the hp reduction for AI action
+    hp_bomb            = 5
+    hp_fire            = 5
+    max_shield_health  = 30
+    max_bullets        = 6
+    max_hp             = 100
+
+    num_quadrants      = 5     # positions 1 to 4, and 0 for the disconnect move
+
+    keys = ('hp', 'bullets', 'bombs', 'shield_hp', 'deaths', 'shields')     # the keys of get_dict
 
+    def __init__(self):
         self.num_deaths         = 0
 
         self.hp             = self.max_hp
@@ -142,33 +154,51 @@ class Player:
         self.hp_shield      = 0
         self.num_shield     = self.max_shields
 
-        self.fire_list = []  # list of quadrants where fire has been started by the bomb of this player
+        # number of fires started by the bombs of this player in every quadrant
+        self.fires = [0] * self.num_quadrants
 
     def __str__(self):
         return str(self.get_dict())
 
+    def get_values(self):
+        """ the counters in the order of get_dict """
+        return self.hp, self.num_bullets, self.num_bombs, self.hp_shield, self.num_deaths, self.num_shield
+
+    def set_values(self, values):
+        """ restore the counters returned by get_values """
+        self.hp, self.num_bullets, self.num_bombs, self.hp_shield, self.num_deaths, self.num_shield = values
+
     def get_dict(self):
-        data = dict()
-        data['hp']              = self.hp
-        data['bullets']         = self.num_bullets
-        data['bombs']           = self.num_bombs
-        data['shield_hp']       = self.hp_shield
-        data['deaths']          = self.num_deaths
-        data['shields']         = self.num_shield
-        return data
+        return {'hp':           self.hp,
+                'bullets':      self.num_bullets,
+                'bombs':        self.num_bombs,
+                'shield_hp':    self.hp_shield,
+                'deaths':       self.num_deaths,
+                'shields':      self.num_shield}
 
     def get_difference(self, recv_dict):
         """get difference between the received player sate and our state"""
-        data = self.get_dict()
-        for key in list(data.keys()):
-            val = data[key] - recv_dict[key]
-            if val == 0:
-                # there is no difference so we delete the element
-                data.pop(key)
-            else:
+        data = dict()
+        for key, value in zip(self.keys, self.get_values()):
+            val = value - recv_dict[key]
+            if val != 0:
                 data[key] = val
         return data
 
+    def format_difference(self, recv_dict):
+        """
+        the text of get_difference without the braces, e.g. "'hp': -5, 'bullets': 1"
+        raises KeyError and TypeError like get_difference
+        """
+        text = ""
+        for key, value in zip(self.keys, self.get_values()):
+            val = value - recv_dict[key]
+            if val != 0:
+                if text:
+                    text += ", "
+                text += "'" + key + "': " + repr(val)
+        return text
+
     def set_state(self, bullets_remaining, bombs_remaining, hp, num_deaths, num_unused_shield, shield_health):
         self.hp             = hp
         self.num_bullets    = bullets_remaining
@@ -240,7 +270,7 @@ class Player:
 
             opponent.reduce_health(self.hp_bomb)
             # start a fire in the quadrant of the opponent
-            self.fire_list.append(opponent_position)
+            self.fires[opponent_position] += 1
             break
 
     def fire_damage(self, opponent, opponent_position):
@@ -248,9 +278,8 @@ class Player:
         whenever an opponent walks into a quadrant we need to reduce the health
         based on the number of fires
         """
-        for p in self.fire_list:
-            if p == opponent_position:
-                opponent.reduce_health(self.hp_fire)
+        for _ in range(self.fires[opponent_position]):
+            opponent.reduce_health(self.hp_fire)
 
     def harm_AI(self, opponent, can_see):
         """ We can harm am opponent based on our AI action if we can see them"""
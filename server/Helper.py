@@ -34,6 +34,8 @@ def ice_print(*arg, end='\n', color=0):
         for a in arg:
             print(a, end=' ')
     else:
+        # more groups than colours, the colours repeat
+        color = (color - 1) % (len(_c) - 1) + 1
         for a in arg:
             print(_c[color] + str(a) + _c[0], end=' ')
     print(end, end='')
@@ -69,7 +71,7 @@ class Action:
     num_AI_total = _num_AI * (len(all) - 1) + 1
 
     @classmethod
-    def init_list(cls, _r):
+    def init_list(cls, _r, rng=random):
         if _r > 0:
             ret = [cls.shoot]
         else:
@@ -82,7 +84,7 @@ class Action:
         ret.extend([cls.hulk]        * cls._num_AI)
         ret.extend([cls.captAmerica] * cls._num_AI)
         ret.extend([cls.shangChi]    * cls._num_AI)
-        random.shuffle(ret)
+        rng.shuffle(ret)
 
         ret.append(cls.logout)
         return ret
@@ -0,0 +1,69 @@
+import math
+
+
+class LatencySketch:
+    """
+    Streaming quantiles of response times with a bounded relative error (log-linear buckets, like an HDR
+    histogram). add() is a log and a dict update, the number of buckets is bounded by the range of values
+    (about 1000 buckets from min_value to max_value at 1% accuracy) whatever the number of samples.
+    Sketches with the same accuracy can be merged, e.g. the sketches of all the groups for a global view.
+    """
+    accuracy    = 0.01      # relative error of the quantiles
+    min_value   = 0.0001    # seconds, smaller values are counted in the bucket of min_value
+    max_value   = 10000.0   # seconds, larger values are counted in the bucket of max_value
+
+    def __init__(self):
+        self.gamma      = (1 + self.accuracy) / (1 - self.accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets    = dict()    # bucket index -> count, bucket i holds (gamma^(i-1), gamma^i]
+        self.count      = 0
+        self.sum        = 0.0
+        self.min        = math.inf
+        self.max        = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """ record one sample (seconds) """
+        index = math.ceil(math.log(min(max(value, self.min_value), self.max_value)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count  += 1
+        self.sum    += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """ add the samples of another sketch """
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches of different accuracy")
+        for index, c in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + c
+        self.count  += other.count
+        self.sum    += other.sum
+        self.min    = min(self.min, other.min)
+        self.max    = max(self.max, other.max)
+
+    def mean(self):
+        """ the exact mean, nan if empty """
+        return self.sum / self.count if self.count else math.nan
+
+    def quantile(self, q):
+        """ the q-quantile (0 <= q <= 1) within the relative accuracy, nan if empty """
+        if self.count == 0:
+            return math.nan
+        rank        = q * (self.count - 1)
+        cumulative  = 0
+        for index in sorted(self.buckets):
+            cumulative += self.buckets[index]
+            if cumulative > rank:
+                break
+        # the middle of the bucket in the relative sense
+        value = 2 * self.gamma ** index / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def summary(self):
+        """ mean, median, p90, p99 """
+        return self.mean(), self.quantile(0.5), self.quantile(0.9), self.quantile(0.99)
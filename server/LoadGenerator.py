@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+
+import websockets
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from Framing import FrameDecoder, encode_frame
+
+
+class _Stats:
+    """
+    measurements shared by all the simulated groups
+    """
+    def __init__(self):
+        self.reply_latency  = []    # packet sent -> game state received from the eval server
+        self.move_latency   = []    # "next" clicked -> game states of all the players received
+        self.num_moves      = 0
+        self.num_packets    = 0
+        self.num_sessions   = 0     # sessions which reached "Eval Terminated"
+        self.errors         = dict()  # kind -> count
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(sorted_values, p):
+    """ nearest-rank percentile of a sorted list """
+    if len(sorted_values) == 0:
+        return float('nan')
+    index = max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class SimulatedGroup:
+    """
+    One team: a web client performing the handshake of html/helper.js and clicking "next" as soon as
+    it is enabled, and an eval_client sending the expected action of every player, encrypted like the Ultra96.
+    """
+    default_player = {"hp": 100, "bullets": 6, "bombs": 2, "shield_hp": 0, "deaths": 0, "shields": 3}
+
+    def __init__(self, group_name, password, num_players, args, stats):
+        self.group_name     = group_name
+        self.password       = password
+        self.num_players    = num_players
+        self.args           = args
+        self.stats          = stats
+
+        self.key        = password.encode("utf-8")
+        self.game_state = {"p1": dict(self.default_player), "p2": dict(self.default_player)}
+        self.events     = []  # events received from the eval server, not yet consumed
+
+        self.websocket  = None
+        self.reader     = None
+        self.writer     = None
+        self.decoder    = FrameDecoder()
+
+    def encrypt(self, text):
+        """ the cypher text format expected by Client.decrypt_message, framed as <len>_<cypher> """
+        iv      = os.urandom(AES.block_size)
+        cipher  = AES.new(self.key, AES.MODE_CBC, iv)
+        cypher  = base64.b64encode(iv + cipher.encrypt(pad(text.encode("utf-8"), AES.block_size)))
+        return encode_frame(cypher)
+
+    async def next_event(self):
+        """ the next UI event, batch frames are unpacked """
+        while len(self.events) == 0:
+            data = json.loads(await self.websocket.recv())
+            if data["type"] == "batch":
+                self.events.extend(data["events"])
+            else:
+                self.events.append(data)
+        event = self.events.pop(0)
+        if event["type"] == "error":
+            self.stats.error("ui: " + str(event["message"]).split(":")[0])
+        return event
+
+    async def wait_event(self, m_type):
+        while True:
+            event = await self.next_event()
+            if event["type"] == m_type:
+                return event
+
+    async def recv_frame(self):
+        while True:
+            frame = self.decoder.next_frame()
+            if frame is not None:
+                return frame
+            data = await self.reader.read(4096)
+            if not data:
+                raise ConnectionResetError("eval server closed the TCP connection")
+            self.decoder.feed(data)
+
+    async def run(self):
+        try:
+            async with websockets.connect("ws://{}:{}/".format(self.args.host, self.args.port),
+                                          max_queue=None) as websocket:
+                self.websocket = websocket
+                await self.handshake()
+                await self.play()
+        except websockets.ConnectionClosed:
+            self.stats.error("websocket closed")
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self.stats.error(type(e).__name__)
+        except asyncio.TimeoutError:
+            self.stats.error("timeout")
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+    async def handshake(self):
+        data = {
+            "group_name":       self.group_name,
+            "num_player":       str(self.num_players),
+            "password":         self.password,
+            "no_visualizer":    "1" if self.args.no_visualizer else "0",
+            "features":         ["batch"],
+        }
+        await self.websocket.send(json.dumps(data))
+
+        port        = None
+        identify    = False     # the eval server has a single listener for all the groups
+        while port is None:
+            event = await self.next_event()
+            if "sends the group name" in str(event["message"]):
+                identify = True
+            match = re.search(r"port number (\d+)", str(event["message"]))
+            if match:
+                port = int(match.group(1))
+
+        # the port is announced just before the eval server starts listening
+        for _ in range(100):
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.args.host, port)
+                break
+            except ConnectionRefusedError:
+                await asyncio.sleep(0.01)
+        else:
+            raise ConnectionRefusedError("eval_client could not connect to port {}".format(port))
+
+        if identify:
+            self.writer.write(encode_frame(self.group_name.encode("utf-8")))
+        self.writer.write(self.encrypt("hello"))
+        await self.writer.drain()
+
+    async def play(self):
+        while True:
+            event = await self.next_event()
+            if event["type"] == "num_move" and event["message"] == "Eval Terminated":
+                self.stats.num_sessions += 1
+                return
+            if event["type"] != "position":
+                continue
+
+            await asyncio.sleep(self.args.think_time)
+            start_time = time.perf_counter()
+            await self.websocket.send("next")
+            actions = await self.wait_event("action")
+
+            packets = []
+            for player_id in range(1, self.num_players + 1):
+                action = actions["pos_{}".format(player_id)]
+                packets.append(self.encrypt(json.dumps({"player_id": player_id, "action": action,
+                                                        "game_state": self.game_state})))
+            send_time = time.perf_counter()
+            self.writer.write(b''.join(packets))
+            await self.writer.drain()
+
+            for _ in range(self.num_players):
+                frame = await asyncio.wait_for(self.recv_frame(), timeout=self.args.reply_timeout)
+                self.stats.reply_latency.append(time.perf_counter() - send_time)
+                self.stats.num_packets += 1
+                self.game_state = json.loads(bytes(frame))
+
+            self.stats.move_latency.append(time.perf_counter() - start_time)
+            self.stats.num_moves += 1
+
+
+def report(stats, elapsed):
+    print("sessions completed: {}, moves: {}, packets: {}, elapsed: {:.1f}s".format(
+        stats.num_sessions, stats.num_moves, stats.num_packets, elapsed))
+    print("throughput: {:.1f} moves/s, {:.1f} packets/s".format(stats.num_moves / elapsed,
+                                                                stats.num_packets / elapsed))
+    for name, values in (("reply latency", stats.reply_latency), ("move latency", stats.move_latency)):
+        values = sorted(values)
+        print("{:14}: p50={:.2f}ms p95={:.2f}ms p99={:.2f}ms max={:.2f}ms".format(
+            name, percentile(values, 50) * 1000, percentile(values, 95) * 1000,
+            percentile(values, 99) * 1000, (values[-1] if values else float('nan')) * 1000))
+    total = stats.num_packets + sum(stats.errors.values())
+    print("errors: {} ({:.2%})".format(sum(stats.errors.values()),
+                                       sum(stats.errors.values()) / total if total else 0))
+    for kind, count in sorted(stats.errors.items()):
+        print("    {}: {}".format(kind, count))
+
+
+async def main(args):
+    stats = _Stats()
+    groups = []
+    for i in range(args.groups):
+        group_name = "{}{:03d}".format(args.prefix, i + 1)
+        groups.append(SimulatedGroup(group_name, args.password, args.players, args, stats))
+
+    start_time = time.perf_counter()
+    tasks = []
+    for group in groups:
+        tasks.append(asyncio.ensure_future(group.run()))
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp / args.groups)
+    await asyncio.gather(*tasks)
+    report(stats, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="simulate N teams (web page + eval_client) against the eval server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001, help="websocket port of the eval server")
+    parser.add_argument("--groups", type=int, default=20, help="number of simulated groups")
+    parser.add_argument("--players", type=int, choices=[1, 2], default=2)
+    parser.add_argument("--prefix", default="L", help="group names are <prefix>001, <prefix>002, ...")
+    parser.add_argument("--password", default="0123456789abcdef", help="16 char AES key of all the groups")
+    parser.add_argument("--no-visualizer", action="store_true")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which the groups connect")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds before clicking next")
+    parser.add_argument("--reply-timeout", type=float, default=70.0,
+                        help="seconds to wait for the game state after sending a packet")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+
+"""
+SQLite index of the evaluation logs, kept up-to-date incrementally.
+
+Every pass of the ingestion reads only what was added to the logs since the previous one: the open segments are
+tailed from the offset reached so far (complete json lines or compact records only), a sealed segment or an
+archive (LogStore.py) is only decompressed for the sessions which were not fully ingested yet. The records of a
+segment are numbered, so a session is never indexed twice whether it was read from its segment, the compressed
+segment or the archive. A segment cut back by a resumed session (Checkpoint.py) is indexed again.
+
+The records keep what the queries need (no game states), indexed by group and timestamp, session, and action:
+
+    python3 LogIndex.py ingest [--follow S]
+    python3 LogIndex.py stats [--group B04] [--since 7d] [--action gun]    accuracy and response times per group
+    python3 LogIndex.py sessions [--group B04] [--since 2026-10-12]        accuracy of every session
+
+A query only reads the rows of its groups and time range, it does not depend on the size of the logs. The records
+of the archives deleted by --log-max-bytes stay in the index.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Codec
+import CompactLog
+import LogStore
+from Helper import ice_print
+from LatencySketch import LatencySketch
+from SessionStats import SessionStats
+
+_name = re.compile(r'^(?P<group>.+)_(?P<players>\d)_')
+
+_schema = """
+CREATE TABLE IF NOT EXISTS segments (
+    segment         TEXT PRIMARY KEY,       -- name of the segment without .gz, or of an old single log file
+    offset          INTEGER NOT NULL,       -- bytes of the uncompressed segment ingested
+    num_records     INTEGER NOT NULL,
+    sealed          INTEGER NOT NULL        -- read from the compressed segment or the archive, it is complete
+);
+CREATE TABLE IF NOT EXISTS records (
+    segment         TEXT NOT NULL,
+    n               INTEGER NOT NULL,       -- index of the record in its segment
+    group_name      TEXT NOT NULL,
+    num_players     INTEGER NOT NULL,
+    session_id      INTEGER NOT NULL,       -- random_id of the Logger
+    seed            INTEGER,
+    timestamp       REAL NOT NULL,
+    move            INTEGER,
+    player_id       INTEGER,
+    component       TEXT NOT NULL,          -- GUN or AI, as in SessionStats
+    correct_action  TEXT NOT NULL,
+    predicted_action TEXT,
+    action_matched  INTEGER NOT NULL,       -- 0 when the action matched, as logged by Client
+    response_time   REAL NOT NULL,
+    PRIMARY KEY (segment, n)
+);
+CREATE INDEX IF NOT EXISTS records_group ON records (group_name, timestamp);
+CREATE INDEX IF NOT EXISTS records_session ON records (session_id);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_action ON records (correct_action, timestamp);
+"""
+
+
+class LogIndex:
+    """
+    The index of the logs of directory in filepath. Several processes (--workers, the CLI) may ingest at the same
+    time, the passes are serialized by the lock of the database.
+    """
+    directory   = LogStore.LogStore.directory
+    filepath    = os.path.join(os.path.dirname(__file__), 'evaluation_logs.sqlite')
+    interval    = 0     # seconds between two ingestions in the eval server, 0 to disable
+
+    def __init__(self):
+        self._executor  = None      # the thread of the ingestion in the eval server
+        self._db        = None      # opened on the thread which uses it first
+
+    def connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.filepath, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_schema)
+        return self._db
+
+    async def run(self):
+        """ ingest every interval, runs forever """
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logindex")
+        loop = asyncio.get_event_loop()
+        while self.interval > 0:
+            try:
+                await loop.run_in_executor(self._executor, self.ingest)
+            except (OSError, sqlite3.Error) as e:
+                ice_print("LogIndex: ingestion failed", e, color=1)
+            await asyncio.sleep(self.interval)
+
+    def ingest(self):
+        """ index what was added to the logs since the previous pass, returns the number of records indexed """
+        if not os.path.isdir(self.directory):
+            return 0
+        db = self.connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            segments = {row[0]: list(row[1:]) for row in db.execute(
+                "SELECT segment, offset, num_records, sealed FROM segments")}
+            num_records = 0
+            for name in sorted(os.listdir(self.directory)):
+                if not LogStore.is_log(name):
+                    continue
+                filepath = os.path.join(self.directory, name)
+                try:
+                    if LogStore.is_archive(name):
+                        for entry in LogStore.read_index(filepath):
+                            if not segments.get(entry["segment"], (0, 0, 0))[2]:
+                                num_records += self._seal(db, segments, entry["segment"],
+                                                          LogStore.read_entry(filepath, entry))
+                    elif name.endswith(".gz"):
+                        if not segments.get(name[:-len(".gz")], (0, 0, 0))[2]:
+                            num_records += self._seal(db, segments, name[:-len(".gz")],
+                                                      LogStore.read_records(filepath))
+                    elif not segments.get(name, (0, 0, 0))[2]:
+                        num_records += self._tail(db, segments, name, filepath)
+                except FileNotFoundError:
+                    # compressed or merged meanwhile, read from where it went by the next pass
+                    pass
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return num_records
+
+    def _tail(self, db, segments, name, filepath):
+        """ the records appended to an uncompressed segment """
+        offset, num_records, _ = segments.get(name, (0, 0, 0))
+        with open(filepath, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < offset:
+                # cut back by a resumed session
+                db.execute("DELETE FROM records WHERE segment = ?", (name,))
+                offset = num_records = 0
+            compact = name.endswith(".bin")
+            if compact and offset == 0:
+                offset = len(CompactLog.FILE_HEADER)
+            f.seek(offset)
+            data = f.read()
+        if compact:
+            records, end = CompactLog.decode_tail(data)
+        else:
+            end = data.rfind(b"\n") + 1
+            records = [Codec.stdlib_loads(line) for line in data[:end].splitlines() if line.strip()]
+        self._insert(db, name, num_records, records)
+        self._update(db, segments, name, offset + end, num_records + len(records), 0)
+        return len(records)
+
+    def _seal(self, db, segments, name, records):
+        """ the records of a complete segment which were not indexed yet """
+        num_records = segments.get(name, (0, 0, 0))[1]
+        self._insert(db, name, num_records, records[num_records:])
+        self._update(db, segments, name, 0, max(num_records, len(records)), 1)
+        return max(0, len(records) - num_records)
+
+    @staticmethod
+    def _update(db, segments, name, offset, num_records, sealed):
+        db.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?)", (name, offset, num_records, sealed))
+        segments[name] = [offset, num_records, sealed]
+
+    @staticmethod
+    def _insert(db, name, first, records):
+        match = _name.match(name)
+        if match is None or not records:
+            return
+        group_name, num_players = match.group("group"), int(match.group("players"))
+        db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (name, first + i, group_name, num_players, data["id"], data.get("seed"), data["timestamp"],
+             data.get("move"), data["player_id"], SessionStats.component(data["correct_action"]).strip(),
+             data["correct_action"], data["predicted_action"], data["action_matched"], data["response_time"])
+            for i, data in enumerate(records)])
+
+    def stats(self, group_name=None, since=None, until=None, action=None):
+        """ (group_name, component, number of actions, matched, LatencySketch of the matched) """
+        where, args = _filter(group_name, since, until, action)
+        results = dict()    # (group_name, component) -> [number of actions, matched, LatencySketch]
+        # a single pass over the rows of the range
+        for group, component, action_matched, response_time in self.connect().execute(
+                "SELECT group_name, component, action_matched, response_time FROM records" + where, args):
+            result = results.get((group, component))
+            if result is None:
+                result = results[(group, component)] = [0, 0, LatencySketch()]
+            result[0] += 1
+            if action_matched == 0:
+                result[1] += 1
+                result[2].add(response_time)
+        return [key + tuple(value) for key, value in sorted(results.items())]
+
+    def sessions(self, group_name=None, since=None, until=None, action=None):
+        """ (group_name, session_id, started, moves, number of actions, matched) of every session """
+        where, args = _filter(group_name, since, until, action)
+        return self.connect().execute(
+            "SELECT group_name, session_id, MIN(timestamp), MAX(move) + 1, COUNT(*), SUM(action_matched = 0)"
+            " FROM records" + where + " GROUP BY segment, session_id ORDER BY MIN(timestamp)", args).fetchall()
+
+
+def _filter(group_name, since, until, action):
+    """ the WHERE clause of a query and its parameters """
+    clauses = ["1"]
+    args    = []
+    for clause, value in (("group_name = ?", group_name), ("timestamp >= ?", since), ("timestamp < ?", until),
+                          ("correct_action = ?", action)):
+        if value is not None:
+            clauses.append(clause)
+            args.append(value)
+    return " WHERE " + " AND ".join(clauses), args
+
+
+def parse_time(text):
+    """ a timestamp: 7d, 12h or 30m ago, or a date yyyy-mm-dd[Thh:mm] """
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([dhm])', text)
+    if match is not None:
+        return time.time() - float(match.group(1)) * {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+    for layout in ("%Y-%m-%d", "%Y-%m-%dT%H:%M"):
+        try:
+            return time.mktime(time.strptime(text, layout))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("expected 7d, 12h, 30m, yyyy-mm-dd or yyyy-mm-ddThh:mm: " + text)
+
+
+log_index = LogIndex()  # the index of the logs of this process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite index of the evaluation logs")
+    parser.add_argument("--directory", default=LogIndex.directory, help="the evaluation logs")
+    parser.add_argument("--db", default=LogIndex.filepath, help="the index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="index what was added to the logs")
+    p.add_argument("--follow", type=float, default=0, help="ingest again every S seconds until interrupted")
+    for command, description in (("stats", "accuracy and response times (mean, median, p90, p99) per group"),
+                                 ("sessions", "accuracy of every session")):
+        p = sub.add_parser(command, help=description)
+        p.add_argument("--group", help="only this group")
+        p.add_argument("--since", type=parse_time, help="7d, 12h, 30m ago or yyyy-mm-dd[Thh:mm]")
+        p.add_argument("--until", type=parse_time)
+        p.add_argument("--action", help="only the actions of this correct_action, e.g. gun")
+
+    args = parser.parse_args()
+    LogIndex.directory  = args.directory
+    LogIndex.filepath   = args.db
+    if args.command == "ingest":
+        while True:
+            start = time.perf_counter()
+            num_records = log_index.ingest()
+            print("{} records indexed in {:.3f}s".format(num_records, time.perf_counter() - start))
+            if args.follow <= 0:
+                break
+            time.sleep(args.follow)
+        return
+
+    start = time.perf_counter()
+    if args.command == "stats":
+        for group, component, num_actions, num_matched, sketch in log_index.stats(
+                args.group, args.since, args.until, args.action):
+            print("{} {:3} accuracy={}/{}; Response time {}".format(group, component, num_matched, num_actions,
+                                                                    SessionStats.format_sketch(sketch)))
+    else:
+        for group, session_id, started, num_moves, num_actions, num_matched in log_index.sessions(
+                args.group, args.since, args.until, args.action):
+            print("{} id={} {} moves={} accuracy={}/{}".format(
+                group, session_id, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)), num_moves,
+                num_matched, num_actions))
+    ice_print("query in {:.1f}ms".format((time.perf_counter() - start) * 1e3), color=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+"""
+Segments, compression, compaction and retention of the evaluation logs.
+
+Every session is logged to a segment of its own (Logger), named after the time the session started, the seed of
+its moves and the random_id of the Logger, so that the practice runs of a group are never mixed up:
+
+    <group>_<num_players>_<yyyymmdd-hhmmss>_<seed>-<random_id>_logs.json    (or .bin with --log-format compact)
+
+When the session is over the segment is sealed: it is compressed with gzip by the thread of the store and replaced
+by <segment>.gz. The segment of a session which can still be resumed (Checkpoint.py) stays open, it is sealed when
+the session is resumed and played to the end, or by the compaction once it was not written for unsealed_age.
+
+The compaction (every compact_interval and python3 LogStore.py compact) appends the sealed segments of a group to
+its current archive, without decompressing them since a gzip file can hold several members:
+
+    <group>_<num_players>_archive-<n>_logs.json.gz     the segments, one after the other
+    <group>_<num_players>_archive-<n>_logs.json.gz.idx one json line per segment: segment, offset, length, seed,
+                                                       id, time
+
+A new archive is started when the current one reaches archive_size bytes or archive_age seconds. When max_bytes is
+set the oldest archives are deleted as long as the logs take more than max_bytes. A session is read from its
+segment, or from its byte range in the archive found with the index, without decompressing the rest of the archive.
+
+The old single file per group (<group>_<num_players>_logs.json) is read as before and left untouched.
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import re
+import shutil
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import Codec
+import CompactLog
+from Helper import ice_print
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_segment = re.compile(r'^(?P<prefix>.+_\d)_(?P<time>\d{8}-\d{6})_(?P<seed>\d+)-(?P<id>\d+)_logs\.(?P<ext>json|bin)'
+                      r'(?P<gz>\.gz)?$')
+_archive = re.compile(r'^(?P<prefix>.+_\d)_archive-(?P<n>\d+)_logs\.(?P<ext>json|bin)\.gz$')
+_single  = re.compile(r'^(?P<prefix>.+_\d)_logs\.(?P<ext>json|bin)$')  # the old file of a group
+
+
+class LogStore:
+    """
+    The segments and archives of the evaluation logs in directory. Compression and compaction run on a thread
+    of their own, the compaction of several processes (--workers) is serialized by a lock file.
+    """
+    directory           = os.path.join(os.path.dirname(__file__), 'evaluation_logs')
+    compress_level      = 6
+    fsync               = True              # fsync the compressed segments and archives
+    compact_interval    = 600               # seconds between two compactions, 0 to disable
+    unsealed_age        = 24 * 3600         # seconds after which an unsealed segment is sealed by the compaction
+    archive_size        = 64 * 1024 * 1024  # bytes, a new archive is started beyond
+    archive_age         = 7 * 24 * 3600     # seconds, a new archive is started beyond
+    max_bytes           = 0                 # the oldest archives are deleted beyond, 0 for no limit
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logstore")
+
+        self.num_sealed     = 0     # segments compressed
+        self.num_merged     = 0     # segments appended to an archive
+        self.num_deleted    = 0     # archives deleted for max_bytes
+
+    def segment_name(self, group_name, num_players, seed, random_id, extension):
+        return "{}_{}_{}_{}-{}_logs.{}".format(group_name, num_players, time.strftime("%Y%m%d-%H%M%S"), seed,
+                                               random_id, extension)
+
+    def find_segment(self, group_name, num_players, seed, random_id, extension):
+        """ the unsealed segment of a session, None if there is none """
+        suffix = "_{}-{}_logs.{}".format(seed, random_id, extension)
+        prefix = "{}_{}_".format(group_name, num_players)
+        try:
+            names = [name for name in os.listdir(self.directory) if name.startswith(prefix) and name.endswith(suffix)]
+        except FileNotFoundError:
+            return None
+        return os.path.join(self.directory, max(names)) if names else None
+
+    def seal(self, filepath):
+        """ compress a segment in the background, from any thread """
+        future = self._executor.submit(self._compress, filepath)
+        future.add_done_callback(self._check_error)
+
+    async def run(self):
+        """ compact every compact_interval, runs forever """
+        loop = asyncio.get_event_loop()
+        while self.compact_interval > 0:
+            await loop.run_in_executor(self._executor, self.compact)
+            await asyncio.sleep(self.compact_interval)
+
+    def compact(self):
+        """ seal the stale segments, merge the sealed ones into the archives and apply max_bytes """
+        if not os.path.isdir(self.directory):
+            return
+        with open(os.path.join(self.directory, ".compact.lock"), "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # another process is compacting the same directory
+                    return
+            try:
+                self._seal_stale()
+                self._merge()
+                self._retain()
+            except OSError as e:
+                ice_print("LogStore: compaction failed", e, color=1)
+
+    def stat(self):
+        return "LogStore: sealed={} merged={} deleted={}".format(self.num_sealed, self.num_merged, self.num_deleted)
+
+    @staticmethod
+    def _check_error(future):
+        e = future.exception()
+        if e is not None:
+            ice_print("LogStore: compression failed", e, color=1)
+
+    def _compress(self, filepath):
+        """
+        runs on the thread of the store: filepath is compressed as a new gzip member of filepath.gz if it exists,
+        e.g. sealed by the compaction of another process meanwhile, and deleted
+        """
+        if not os.path.exists(filepath):
+            return
+        compressed  = filepath + ".gz"
+        temporary   = compressed + ".tmp"
+        with open(filepath, "rb") as src, open(temporary, "wb") as raw:
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=self.compress_level, fileobj=raw) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            self._sync(raw)
+        if os.path.exists(compressed):
+            with open(temporary, "rb") as src, open(compressed, "ab") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+                self._sync(dst)
+            os.remove(temporary)
+        else:
+            os.replace(temporary, compressed)
+        os.remove(filepath)
+        self.num_sealed += 1
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _seal_stale(self):
+        now = time.time()
+        for name in os.listdir(self.directory):
+            match = _segment.match(name)
+            filepath = os.path.join(self.directory, name)
+            if match is not None and not match.group("gz") and now - os.path.getmtime(filepath) > self.unsealed_age:
+                self._compress(filepath)
+
+    def _merge(self):
+        archives = dict()   # (prefix, extension) -> Archive being appended to
+        merged   = dict()   # (prefix, extension) -> (segment, length) of the entries of the archives
+        for name in sorted(os.listdir(self.directory)):
+            match = _segment.match(name)
+            if match is None or not match.group("gz"):
+                continue
+            key         = (match.group("prefix"), match.group("ext"))
+            filepath    = os.path.join(self.directory, name)
+            if key not in merged:
+                merged[key] = self._merged(*key)
+            if (name[:-len(".gz")], os.path.getsize(filepath)) in merged[key]:
+                # a merge interrupted after the index was written, the segment is in the archive already
+                os.remove(filepath)
+                continue
+            archive = archives.get(key)
+            if archive is None or archive.full():
+                archive = archives[key] = self._current_archive(*key)
+            archive.append(filepath, match, self._sync)
+            self.num_merged += 1
+
+    def _merged(self, prefix, extension):
+        """ the segment and length of every entry of the archives of the group """
+        merged = set()
+        for name in os.listdir(self.directory):
+            match = _archive.match(name)
+            if match is not None and match.group("prefix") == prefix and match.group("ext") == extension:
+                merged.update((entry["segment"], entry["length"])
+                              for entry in read_index(os.path.join(self.directory, name)))
+        return merged
+
+    def _current_archive(self, prefix, extension):
+        """ the archive of the group to append to, a new one if the last one is full """
+        numbers = [int(match.group("n")) for match in map(_archive.match, os.listdir(self.directory))
+                   if match is not None and match.group("prefix") == prefix and match.group("ext") == extension]
+        number = max(numbers, default=0)
+        if number > 0:
+            archive = Archive(self.archive_path(prefix, number, extension))
+            if not archive.full():
+                return archive
+        return Archive(self.archive_path(prefix, number + 1, extension))
+
+    def archive_path(self, prefix, number, extension):
+        return os.path.join(self.directory, "{}_archive-{:04d}_logs.{}.gz".format(prefix, number, extension))
+
+    def _retain(self):
+        if self.max_bytes <= 0:
+            return
+        sizes = {name: os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)}
+        total = sum(sizes.values())
+        # the oldest archives first
+        archives = sorted((name for name in sizes if _archive.match(name)),
+                          key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        for name in archives:
+            if total <= self.max_bytes:
+                break
+            for filepath in (name, name + ".idx"):
+                total -= sizes.get(filepath, 0)
+                try:
+                    os.remove(os.path.join(self.directory, filepath))
+                except FileNotFoundError:
+                    pass
+            self.num_deleted += 1
+            ice_print("LogStore: deleted", name, "the logs take more than", self.max_bytes, "bytes", color=1)
+
+
+class Archive:
+    """ the sealed segments of a group, appended one after the other, and their index """
+
+    def __init__(self, filepath):
+        self.filepath   = filepath
+        self.entries    = read_index(filepath)
+        self.end        = self.entries[-1]["offset"] + self.entries[-1]["length"] if self.entries else 0
+
+    def full(self):
+        if not self.entries:
+            return False
+        return self.end >= LogStore.archive_size or time.time() - self.entries[0]["time"] >= LogStore.archive_age
+
+    def append(self, segment, match, sync):
+        """ append a compressed segment, then index and delete it """
+        with open(self.filepath, "ab") as out:
+            # the bytes of a merge which was interrupted before the index was written
+            out.truncate(self.end)
+            with open(segment, "rb") as src:
+                shutil.copyfileobj(src, out, 1 << 20)
+            length = out.tell() - self.end
+            sync(out)
+
+        entry = {"segment": os.path.basename(segment)[:-len(".gz")], "offset": self.end, "length": length,
+                 "seed": int(match.group("seed")), "id": int(match.group("id")),
+                 "time": time.mktime(time.strptime(match.group("time"), "%Y%m%d-%H%M%S"))}
+        with open(self.filepath + ".idx", "ab") as index:
+            index.write(Codec.stdlib_dumps(entry) + b"\n")
+            sync(index)
+        self.entries.append(entry)
+        self.end += length
+        os.remove(segment)
+
+
+def read_index(filepath):
+    """ the entries of the index of an archive, [] if it has none """
+    try:
+        with open(filepath + ".idx", "rb") as f:
+            return [Codec.stdlib_loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _members(data):
+    """ the decompressed members of gzip data, a truncated member ends it """
+    members = []
+    while data:
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            member = decompressor.decompress(data)
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        members.append(member)
+        data = decompressor.unused_data
+    return members
+
+
+def _decode(members, compact):
+    """ the records of the decompressed content of segments """
+    records = []
+    for data in members:
+        if compact:
+            records.extend(CompactLog.decode_records(data))
+        else:
+            records.extend(Codec.stdlib_loads(line) for line in data.splitlines() if line.strip())
+    return records
+
+
+def read_records(filepath):
+    """ all the records of a log: old single file, segment or archive, compressed or not """
+    compact = filepath.endswith((".bin", ".bin.gz"))
+    if not filepath.endswith(".gz"):
+        if compact:
+            with CompactLog.CompactLogReader(filepath) as reader:
+                return list(reader)
+        with open(filepath, "rb") as f:
+            return [Codec.stdlib_loads(line) for line in f if line.strip()]
+    with open(filepath, "rb") as f:
+        return _decode(_members(f.read()), compact)
+
+
+def read_session(filepath, random_id):
+    """ the records of one session, an archive is only decompressed where its index holds the session """
+    entries = [entry for entry in read_index(filepath) if entry["id"] == random_id]
+    if not entries:
+        return [data for data in read_records(filepath) if data["id"] == random_id]
+    records = []
+    for entry in entries:
+        records.extend(read_entry(filepath, entry))
+    return [data for data in records if data["id"] == random_id]
+
+
+def read_entry(filepath, entry):
+    """ the records of the segment of an archive held by an entry of its index """
+    with open(filepath, "rb") as f:
+        f.seek(entry["offset"])
+        data = f.read(entry["length"])
+    return _decode(_members(data), filepath.endswith(".bin.gz"))
+
+
+def is_archive(name):
+    return _archive.match(name) is not None
+
+
+def num_players(name):
+    """ the number of players of the sessions of a log file, from its name, None if it is not named like a log """
+    name = os.path.basename(name)
+    for pattern in (_segment, _archive, _single):
+        match = pattern.match(name)
+        if match is not None:
+            return int(match.group("prefix")[-1])
+    return None
+
+
+def is_log(name):
+    """ whether a file name is an evaluation log """
+    return name.endswith(("_logs.json", "_logs.bin", "_logs.json.gz", "_logs.bin.gz"))
+
+
+log_store = LogStore()  # the logs of this process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compact and read the evaluation logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("compact", help="seal the stale segments and merge the sealed ones into the archives")
+    p.add_argument("directory", nargs="?", default=LogStore.directory)
+    p.add_argument("--max-bytes", type=int, default=LogStore.max_bytes,
+                   help="delete the oldest archives while the logs take more, 0 for no limit")
+
+    p = sub.add_parser("list", help="print the segments and the sessions of the archives")
+    p.add_argument("directory", nargs="?", default=LogStore.directory)
+
+    p = sub.add_parser("show", help="print the records of a log as json lines")
+    p.add_argument("src")
+    p.add_argument("--session", type=int, help="only the records of this random_id")
+
+    args = parser.parse_args()
+    if args.command == "compact":
+        LogStore.directory  = args.directory
+        LogStore.max_bytes  = args.max_bytes
+        log_store.compact()
+        print(log_store.stat())
+    elif args.command == "list":
+        for name in sorted(os.listdir(args.directory)):
+            if not is_log(name):
+                continue
+            filepath = os.path.join(args.directory, name)
+            print("{} {} bytes".format(name, os.path.getsize(filepath)))
+            for entry in read_index(filepath):
+                print("    id={id} seed={seed} {segment} {length} bytes".format(**entry))
+    else:
+        if args.session is None:
+            records = read_records(args.src)
+        else:
+            records = read_session(args.src, args.session)
+        for data in records:
+            print(Codec.dumps_str(data))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,67 @@
-import json
+import asyncio
 import os
 import time
 import random as random
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
-import aiofiles as aiofiles
+import Codec
+import CompactLog
+from LogStore import log_store
+from Helper import ice_print_group_name
 
 
 class Logger:
     """
     class log team performance.
+    Records are queued in memory and appended to the log file in batches by a writer thread
+    shared by all the loggers, so the event loop never waits on the disk.
+    Every session has a segment of its own, which is compressed once the session is closed (LogStore.py).
     """
+    batch_size      = 64    # number of queued records which triggers a write
+    flush_interval  = 1.0   # max number of seconds a record waits in memory before being written
+    fsync_policy    = "close"   # "none": never fsync, "batch": fsync after every write, "close": fsync on close
+    log_format      = "json"    # "json": json lines, "compact": binary records of CompactLog
 
-    def __init__(self, group_name, num_players):
-        # create the folder for the logs
-        log_dir = os.path.join(os.path.dirname(__file__), 'evaluation_logs')
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+    # a single thread performs all the disk writes, hence the batches of a logger are written in order
+    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logger")
+    _open   = weakref.WeakSet()     # the loggers not closed yet, closed by close_all when the server stops
 
-        self.log_filepath_json = os.path.join(log_dir, '{}_{}_logs.json'.format(group_name, num_players))
+    def __init__(self, group_name, num_players, seed):
+        self.group_name     = group_name
+        self.num_players    = num_players
+        self.seed           = seed
+        if self.log_format == "compact":
+            self._extension     = 'bin'
+            self._file_header   = CompactLog.FILE_HEADER
+        else:
+            self._extension     = 'json'
+            self._file_header   = b''
+        # the segment of the session (LogStore.py), named by the writer thread on the first write
+        self.log_filepath   = None
+        self.resumed        = False     # the session resumes from a checkpoint, its segment is continued
+        self.resumable      = False     # the session can be resumed, its segment is not sealed on close
 
         # used to distinguish 2 different usages of eval_server for the same group
         # not foolproof, needs manual verification
         self.random_id = random.randint(1, 10 * 1000)
 
+        self._pending   = []    # encoded records waiting to be written
+        self._timer     = None  # flushes the pending records after flush_interval
+        self._file      = None  # opened by the writer thread on the first write
+        self._closed    = False
+        self._open.add(self)
+        self.num_dropped    = 0     # records written after close(), the segment may be sealed already
+
     async def write_state (self, response_time: float, player_id: int,
                            correct_action: str, predicted_action: str, action_matched: int,
-                           game_state_received: dict, game_state_expected: dict):
+                           game_state_received: dict, game_state_expected: dict,
+                           move: int, position_1: int, position_2: int, no_visualizer: bool, seed: int):
+        if self._closed:
+            if self.num_dropped == 0:
+                ice_print_group_name(self.group_name, 'Logger: record written after close, not logged')
+            self.num_dropped += 1
+            return
         data = dict()
         data['id']                  = self.random_id
         data['timestamp']           = time.time()
@@ -36,11 +72,107 @@ class Logger:
         data['action_matched']      = action_matched
         data['game_state_received'] = game_state_received
         data['game_state_expected'] = game_state_expected
+        # the context of the move, needed to replay the session (ReplayEngine.py)
+        data['move']                = move
+        data['position_1']          = position_1
+        data['position_2']          = position_2
+        data['no_visualizer']       = no_visualizer
+        data['seed']                = seed  # regenerates the moves of the session (SchedulePool.py)
+
+        # encode now, the dicts may be modified before the batch is written
+        if self.log_format == "compact":
+            self._pending.append(CompactLog.encode_record(data))
+        else:
+            # the grading record, always written by the stdlib json module
+            self._pending.append(Codec.stdlib_dumps(data) + b'\n')
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.flush_interval, self.flush)
+
+    def flush (self):
+        """
+        hand the pending records to the writer thread
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if len(self._pending) == 0:
+            return
+        chunk = b''.join(self._pending)
+        self._pending = []
+        self._submit(self._write, chunk)
+
+    def close (self):
+        """
+        flush the pending records and close the file, does not wait for the disk
+        the records written afterwards are dropped, the segment is sealed once
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._open.discard(self)
+        self.flush()
+        self._submit(self._close)
+
+    @classmethod
+    def close_all (cls):
+        """
+        close the loggers still open, e.g. the server is stopped during a session, and wait for the disk
+        """
+        for logger in list(cls._open):
+            logger.close()
+        cls._writer.submit(lambda: None).result()
+
+    def write_after (self, fn, *args):
+        """
+        run fn(*args) on the writer thread once the records queued so far are written
+        """
+        self.flush()
+        self._submit(fn, *args)
+
+    def _submit (self, fn, *args):
+        future = self._writer.submit(fn, *args)
+        future.add_done_callback(self._check_error)
+
+    def _check_error (self, future):
+        e = future.exception()
+        if e is not None:
+            ice_print_group_name(self.group_name, 'Logger: write failed', e)
+
+    def _write (self, chunk):
+        """ runs on the writer thread """
+        if self._file is None:
+            self._file = open(self.segment_path(), mode='ab')
+            if self._file.tell() == 0:
+                self._file.write(self._file_header)
+        self._file.write(chunk)
+        self._file.flush()
+        if self.fsync_policy == "batch":
+            os.fsync(self._file.fileno())
 
-        log_filepath = self.log_filepath_json
-        mode = 'a'
-        if not os.path.exists(log_filepath):  # first write
-            mode = 'w'
+    def segment_path (self):
+        """
+        runs on the writer thread, the segment of the session: the one of the interrupted session when it resumes
+        """
+        if self.log_filepath is None:
+            os.makedirs(log_store.directory, exist_ok=True)
+            if self.resumed:
+                self.log_filepath = log_store.find_segment(self.group_name, self.num_players, self.seed,
+                                                           self.random_id, self._extension)
+            if self.log_filepath is None:
+                self.log_filepath = os.path.join(log_store.directory, log_store.segment_name(
+                    self.group_name, self.num_players, self.seed, self.random_id, self._extension))
+        return self.log_filepath
 
-        async with aiofiles.open(log_filepath, mode=mode) as f:
-            await f.write(json.dumps(data) + '\n')
+    def _close (self):
+        """ runs on the writer thread, the segment is sealed unless the session can be resumed """
+        if self._file is None:
+            return
+        if self.fsync_policy != "none":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if not self.resumable:
+            log_store.seal(self.log_filepath)
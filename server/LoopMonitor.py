@@ -0,0 +1,30 @@
+import asyncio
+from time import perf_counter
+
+from Metrics import metrics
+
+
+class LoopMonitor:
+    """
+    Lag of the event loop: how late a timer of interval seconds fires, smoothed by a moving average.
+    Every probe is observed in metrics.loop_lag (eval_loop_lag_seconds).
+    """
+    interval    = 0.05      # seconds between two probes
+    smoothing   = 0.2       # weight of the last probe in the moving average
+
+    def __init__(self):
+        self.lag            = 0.0       # moving average, seconds
+        self.max_lag        = 0.0
+
+    async def run(self):
+        """ probe the event loop forever """
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, perf_counter() - start - self.interval)
+            metrics.loop_lag.observe(lag)
+            self.max_lag    = max(self.max_lag, lag)
+            self.lag        += self.smoothing * (lag - self.lag)
+
+
+loop_monitor = LoopMonitor()    # the event loop of this process
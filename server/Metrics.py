@@ -0,0 +1,145 @@
+import asyncio
+from bisect import bisect_left
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram in the Prometheus sense, observe() is a bisect and three additions.
+    """
+    buckets = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+               0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)    # the last one is +Inf
+        self.sum    = 0.0
+        self.count  = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum    += value
+        self.count  += 1
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.sum    += other.sum
+        self.count  += other.count
+
+    def render(self, name, labels):
+        """ the lines of the Prometheus text format """
+        lines = []
+        cumulative = 0
+        separator = "," if labels else ""
+        for bound, c in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += c
+            lines.append('{}_bucket{{{}{}le="{}"}} {}'.format(name, labels, separator, bound, cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+        return lines
+
+
+class Metrics:
+    """
+    Time spent in every stage of handling an eval_client packet, per group. The global histograms are
+    merged from the groups when rendered, so recording a stage only touches the histogram of its group.
+    A group is only kept while one of its Clients is running: the histograms of a released group are merged into
+    the global ones and its series are no longer exposed, hence the memory and the output stay bounded by the
+    sessions in progress.
+    """
+    stages = (
+        "network",      # start of the move -> packet received
+        "framing",      # decoding the <len>_ prefix and payload
+        "queue",        # packet received -> processing started
+        "decrypt",      # base64 + AES
+        "json",         # Codec.stdlib_loads of the packet
+        "game_step",    # GameSimulator.perform_action
+        "diff",         # GameSimulator.get_game_state_difference
+        "log",          # Logger.write_state
+        "reply",        # Client.send_game_state
+    )
+
+    def __init__(self):
+        self.groups     = dict()        # group_name -> {stage: Histogram}
+        self.references = dict()        # group_name -> number of Clients using the histograms of the group
+        self.released   = {stage: Histogram() for stage in self.stages}    # of the groups released
+        self.loop_lag   = Histogram()   # how late the timers of the event loop fire (LoopMonitor.py)
+
+    def group(self, group_name):
+        """
+        the histograms of a group, keep a reference to avoid the lookup for every packet
+        every call must be matched by a call of release()
+        """
+        histograms = self.groups.get(group_name)
+        if histograms is None:
+            histograms = {stage: Histogram() for stage in self.stages}
+            self.groups[group_name] = histograms
+        self.references[group_name] = self.references.get(group_name, 0) + 1
+        return histograms
+
+    def release(self, group_name):
+        """ a Client of the group stopped, the group is dropped with its last Client """
+        references = self.references.get(group_name, 0) - 1
+        if references > 0:
+            self.references[group_name] = references
+            return
+        self.references.pop(group_name, None)
+        histograms = self.groups.pop(group_name, None)
+        if histograms is not None:
+            for stage in self.stages:
+                self.released[stage].merge(histograms[stage])
+
+    def render(self):
+        """ all the histograms in the Prometheus text exposition format """
+        lines = ["# HELP eval_stage_seconds Time spent in every stage of handling an eval_client packet",
+                 "# TYPE eval_stage_seconds histogram"]
+        for stage in self.stages:
+            total = Histogram()
+            total.merge(self.released[stage])
+            for histograms in self.groups.values():
+                total.merge(histograms[stage])
+            lines.extend(total.render("eval_stage_seconds", 'stage="{}"'.format(stage)))
+
+        lines.append("# HELP eval_group_stage_seconds Time spent in every stage, per group")
+        lines.append("# TYPE eval_group_stage_seconds histogram")
+        for group_name in sorted(self.groups):
+            for stage in self.stages:
+                labels = 'group="{}",stage="{}"'.format(_escape(group_name), stage)
+                lines.extend(self.groups[group_name][stage].render("eval_group_stage_seconds", labels))
+
+        lines.append("# HELP eval_loop_lag_seconds Lag of the event loop, sampled by LoopMonitor")
+        lines.append("# TYPE eval_loop_lag_seconds histogram")
+        lines.extend(self.loop_lag.render("eval_loop_lag_seconds", ""))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(label_value):
+    """ escape a label value of the Prometheus text format """
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()  # the metrics of this process
+
+
+async def _handle_http(reader, writer):
+    """ answer a single HTTP request: GET /metrics """
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+        path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+        if path == b"/metrics":
+            status  = "200 OK"
+            body    = metrics.render().encode("utf-8")
+        else:
+            status  = "404 Not Found"
+            body    = b"not found\n"
+        writer.write("HTTP/1.1 {}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {}\r\n"
+                     "Connection: close\r\n\r\n".format(status, len(body)).encode("utf-8") + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host, port):
+    """ start the HTTP endpoint exposing the metrics, returns the asyncio server """
+    return await asyncio.start_server(_handle_http, host, port)
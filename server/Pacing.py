@@ -0,0 +1,29 @@
+import asyncio
+from time import perf_counter
+
+
+class Pacing:
+    """
+    When the next move of a session starts:
+        click   : the "next" button of the page is clicked (the default)
+        clock   : interval seconds after the beginning of the previous move
+        packets : as soon as the packets of the previous move are processed
+    In the automatic modes the page is only a display and the messages it sends are ignored, hence sessions can
+    also run without page (headless, see WebSocketServer.run_headless) back to back for soak tests.
+    """
+    modes       = ("click", "clock", "packets")
+    mode        = "click"
+    interval    = 2.0   # seconds between the beginnings of two moves in clock mode
+
+    @classmethod
+    def automatic(cls):
+        return cls.mode != "click"
+
+    @classmethod
+    async def wait(cls, move_start):
+        """ wait for the beginning of the next move in the automatic modes, move_start: perf_counter() """
+        if cls.mode == "clock":
+            await asyncio.sleep(max(0.0, move_start + cls.interval - perf_counter()))
+        else:
+            # let the other sessions run between two moves
+            await asyncio.sleep(0)
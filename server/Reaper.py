@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+from Helper import ice_print, ice_print_group_name
+
+
+class Reaper:
+    """
+    Deadlines of the waits which depend on a human or on a remote program, so that abandoned browser tabs and
+    eval_clients which never connect do not hold their sockets, GameSimulator and client_dict entry forever:
+        handshake   : websocket opened -> handshake message received
+        accept      : handshake done -> eval_client connected
+        idle        : waiting for the next click in the browser
+    A wait which misses its deadline raises asyncio.TimeoutError, the caller releases the session with
+    Client.stop() like any other failure. The number of reclaimed sessions, the open sessions, the file descriptors
+    and the memory of the process are reported periodically.
+    """
+    handshake_timeout   = 60        # seconds, 0 for no deadline
+    accept_timeout      = 900
+    idle_timeout        = 1800
+    report_interval     = 300       # seconds between two reports, 0 to disable
+
+    waits = {"handshake": "handshake from the web page", "accept": "connection from the eval_client",
+             "idle": "click on next"}
+
+    def __init__(self):
+        self.num_open   = 0     # websocket handlers running
+        self.reclaimed  = {"handshake": 0, "accept": 0, "idle": 0}
+
+    def timeout(self, kind):
+        timeout = getattr(self, kind + "_timeout")
+        return timeout if timeout > 0 else None
+
+    async def wait(self, kind, awaitable, group_name=None):
+        """ await with the deadline of kind, raises asyncio.TimeoutError when the session is reclaimed """
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout(kind))
+        except asyncio.TimeoutError:
+            self.reclaimed[kind] += 1
+            message = "Reaper: no {} within {}s, reclaiming the session".format(self.waits[kind], self.timeout(kind))
+            if group_name is None:
+                ice_print(message, color=1)
+            else:
+                ice_print_group_name(group_name, message)
+            raise
+
+    def stat(self):
+        return "Reaper: open={} reclaimed handshake={} accept={} idle={} fds={} rss={:.1f}MB".format(
+            self.num_open, self.reclaimed["handshake"], self.reclaimed["accept"], self.reclaimed["idle"],
+            self._num_fds(), self._rss() / 1e6)
+
+    async def report(self):
+        """ print stat() every report_interval, runs forever """
+        while self.report_interval > 0:
+            await asyncio.sleep(self.report_interval)
+            ice_print(self.stat(), color=2)
+
+    @staticmethod
+    def _num_fds():
+        try:
+            return len(os.listdir("/proc/self/fd"))
+        except OSError:
+            return -1
+
+    @staticmethod
+    def _rss():
+        """ resident memory of the process in bytes, read from /proc """
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+
+
+reaper = Reaper()   # the deadlines of this process
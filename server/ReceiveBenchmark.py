@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+"""
+Memory and time per message of the receive path of the eval_client packets, before and after the reusable buffers
+of Framing.py and SessionCrypto.py. Not used by the eval server.
+
+python3 ReceiveBenchmark.py
+"""
+
+import base64
+import os
+import socket
+import tracemalloc
+from time import perf_counter
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+
+from Framing import FrameDecoder, encode_frame
+from SessionCrypto import SessionCrypto
+
+
+def receive_before(conn, buffer, key):
+    """ the receive path before the reusable buffers: bytes chunks, bytes frames, b64decode, slices, unpad """
+    while True:
+        end = buffer.find(b'_')
+        if end >= 0:
+            length = int(buffer[:end])
+            if len(buffer) > end + length:
+                break
+        buffer += conn.recv(4096)
+    frame = bytes(buffer[end+1:end+1+length])
+    del buffer[:end+1+length]
+    decoded_message = base64.b64decode(frame)
+    cipher = AES.new(key, AES.MODE_CBC, decoded_message[:AES.block_size])
+    decrypted_message = cipher.decrypt(decoded_message[AES.block_size:])
+    return unpad(decrypted_message, AES.block_size).decode('utf8')
+
+
+def receive_after(conn, decoder, crypto):
+    """ the receive path of Client: recv_into the decoder, decode the memoryview, decrypt into the buffer """
+    while True:
+        frame = decoder.next_frame()
+        if frame is not None:
+            break
+        decoder.commit(conn.recv_into(decoder.writable(4096)))
+    return crypto.decrypt(SessionCrypto.decode(frame))
+
+
+def benchmark():
+    """ peak memory allocated and time per message of the receive path, before and after """
+    key = "0123456789abcdef"
+    player = {"hp": 100, "bullets": 6, "bombs": 2, "shield_hp": 0, "deaths": 0, "shields": 3}
+    packet = '{{"player_id": 1, "action": "gun", "game_state": {{"p1": {0}, "p2": {0}}}}}'.format(player)
+
+    def frame_of(text):
+        iv = os.urandom(AES.block_size)
+        cypher = AES.new(key.encode(), AES.MODE_CBC, iv).encrypt(pad(text.encode(), AES.block_size))
+        return encode_frame(base64.b64encode(iv + cypher))
+
+    number = 2000
+    print("{:24}{:>16}{:>16}{:>12}{:>12}".format("per message", "peak B before", "peak B after",
+                                                  "us before", "us after"))
+    for title, text in (("eval_client packet", packet), ("64 KB message", "x" * 65536)):
+        frame   = frame_of(text)
+        results = []
+        for receive, state in ((receive_before, (bytearray(), key.encode())),
+                               (receive_after, (FrameDecoder(max_frame_len=1 << 20), SessionCrypto(key)))):
+            sender, receiver = socket.socketpair()
+            sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+            receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            for _ in range(10):     # warm up: buffers reach their steady size
+                sender.sendall(frame)
+                assert receive(receiver, *state) == text
+            peak = elapsed = 0
+            tracemalloc.start()
+            for _ in range(number):
+                sender.sendall(frame)
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                receive(receiver, *state)
+                peak += tracemalloc.get_traced_memory()[1] - current
+            tracemalloc.stop()
+            for _ in range(number):     # timed without tracemalloc
+                sender.sendall(frame)
+                start_time = perf_counter()
+                receive(receiver, *state)
+                elapsed += perf_counter() - start_time
+            sender.close()
+            receiver.close()
+            results.append((peak / number, elapsed / number * 1e6))
+        print("{:24}{:16.0f}{:16.0f}{:12.2f}{:12.2f}".format(title, results[0][0], results[1][0],
+                                                               results[0][1], results[1][1]))
+    print("(the after path returns the same text, the peak includes the str returned)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+
+"""
+Offline re-grading of evaluation logs.
+
+Every session found in the logs (json lines or compact, segments or archives of LogStore.py) is replayed from
+the initial game state: the predicted_action of every record goes through the rules of GameState.perform_action
+and the recomputed game state is compared with the game_state_expected which was logged. Any divergence is reported.
+
+All the sessions are replayed together: the game states are numpy arrays with one row per session and
+step k applies the k-th record of every session at once.
+
+The records carry the context of their move (move, position_1, position_2, no_visualizer). For the logs written
+before, the context is rebuilt where possible (complete_context):
+    - a 1-player session: the positions do not depend on the moves, player 2 never leaves quadrant 1 and player 1
+      is in quadrant 1 or 0 (the disconnect move), which the rules do not tell apart
+    - a 2-player session with a seed: its moves are generated again, the records are matched to them as long as
+      every move has the records of both players
+A session without no_visualizer is replayed with and without a visualizer, the setting with fewer divergences is
+kept and reported. The other 2-player sessions cannot be replayed: their positions were drawn at random and never
+logged; they are listed with the reason.
+
+numpy is only needed by this tool, not by the eval server (pip install numpy).
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import CompactLog
+import LogStore
+from GameSimulator import GameSimulator
+from GameState import GameState, Player
+
+# columns of the game state of a player, in the order of Player.get_dict
+HP, BULLETS, BOMBS, SHIELD_HP, DEATHS, SHIELDS = range(6)
+
+# action codes of the replay, the index in CompactLog.ACTIONS, -1 for anything else
+_codes      = {a: i for i, a in enumerate(CompactLog.ACTIONS)}
+_GUN        = _codes["gun"]
+_SHIELD     = _codes["shield"]
+_BOMB       = _codes["bomb"]
+_RELOAD     = _codes["reload"]
+_AI         = [_codes[a] for a in ("ironMan", "hulk", "captAmerica", "shangChi")]
+
+
+class Session:
+    """ the records of one usage of the eval server by a group """
+
+    def __init__(self, filepath, random_id):
+        self.filepath   = filepath
+        self.random_id  = random_id
+        self.records    = []
+        self.num_players    = LogStore.num_players(filepath)
+        self.no_visualizer  = None  # None while unknown, see complete_context
+        self.rebuilt        = None  # how the context of the records was rebuilt: "seed", "1-player" or None
+
+    def __str__(self):
+        return "{} id={}".format(os.path.basename(self.filepath), self.random_id)
+
+    def with_visualizer(self, no_visualizer):
+        """ the same records replayed with the given no_visualizer """
+        session = Session(self.filepath, self.random_id)
+        session.records         = self.records
+        session.num_players     = self.num_players
+        session.no_visualizer   = no_visualizer
+        session.rebuilt         = self.rebuilt
+        return session
+
+
+def complete_context(session):
+    """
+    rebuild the move context of the records logged without it, see the module docstring
+    sets session.no_visualizer when it was logged
+    returns None if the session can be replayed, the reason why it cannot otherwise
+    """
+    records = session.records
+    if records and 'no_visualizer' in records[0]:
+        session.no_visualizer = records[0]['no_visualizer']
+    if all('move' in data for data in records):
+        return None
+    if any('move' in data for data in records):
+        return "some of its records have a move context, some do not"
+
+    if session.num_players is None:
+        # not named like a log, a record of player 2 tells a 2-player session
+        session.num_players = 2 if any(data['player_id'] == 2 for data in records) else 1
+
+    if session.num_players == 1:
+        for data in records:
+            data['position_1']  = 1
+            data['position_2']  = 1
+        session.rebuilt = "1-player"
+        return None
+
+    seed = records[0].get('seed') if records else None
+    if seed is not None:
+        # the k-th records of every player are the ones of move k, the players of a move in any order: a move
+        # missing the record of a player (timeout, error) could be matched to any later move with the same actions
+        moves = GameSimulator.generate_moves(session.num_players, random.Random(seed))
+        for i in range(0, len(records), session.num_players):
+            move    = i // session.num_players
+            group   = records[i:i + session.num_players]
+            if move >= len(moves) or len(group) < session.num_players \
+                    or len({data['player_id'] for data in group}) < session.num_players \
+                    or any(_action(moves[move], data['player_id']) != data['correct_action'] for data in group):
+                return "its records cannot be matched to the moves of its seed {}, from move {}".format(seed, move + 1)
+            for data in group:
+                data['move']        = move
+                data['position_1']  = moves[move].position_1
+                data['position_2']  = moves[move].position_2
+        session.rebuilt = "seed"
+        return None
+
+    return "2-player session without seed, the positions of the players were not logged"
+
+
+def _action(move, player_id):
+    return move.action_1 if player_id == 1 else move.action_2
+
+
+class Divergence:
+    """ a record whose game_state_expected differs from the replay """
+
+    def __init__(self, session, index, recomputed):
+        self.session    = session
+        self.index      = index         # index of the record in the session
+        self.recomputed = recomputed    # the game state dict computed by the replay
+
+    def __str__(self):
+        data = self.session.records[self.index]
+        return "{} record={} move={} player_id={} action={}: logged={} replayed={}".format(
+            self.session, self.index, data.get('move', '?'), data['player_id'], data['predicted_action'],
+            data['game_state_expected'], self.recomputed)
+
+
+def read_sessions(filepath):
+    """
+    the sessions of a log file, a session ends when the random_id changes or the move index goes backwards
+    """
+    records     = LogStore.read_records(filepath)
+    sessions    = []
+    current     = dict()    # random_id -> session being read
+    for data in records:
+        session = current.get(data['id'])
+        if session is not None and session.records and 'move' in data \
+                and data['move'] < session.records[-1].get('move', -1):
+            # the same random_id was drawn by a later session
+            session = None
+        if session is None:
+            session = Session(filepath, data['id'])
+            current[data['id']] = session
+            sessions.append(session)
+        session.records.append(data)
+    return sessions
+
+
+def find_logs(paths):
+    """ the log files of a list of files and directories """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(name for name in glob.glob(os.path.join(path, "*_logs.*")) if LogStore.is_log(name)))
+        else:
+            files.append(path)
+    return files
+
+
+class ReplayEngine:
+    """
+    Replays many sessions at once.
+    state[s, p, c]  : counter c (HP, BULLETS, ...) of player p (0 or 1) of session s
+    fires[s, p, q]  : number of fires started by player p of session s in quadrant q
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        num_sessions    = len(sessions)
+        num_steps       = max((len(s.records) for s in sessions), default=0)
+
+        # the records as arrays, one row per session and one column per step
+        self.valid      = np.zeros((num_sessions, num_steps), dtype=bool)
+        self.player     = np.zeros((num_sessions, num_steps), dtype=np.int64)   # 0 or 1
+        self.action     = np.full ((num_sessions, num_steps), -1, dtype=np.int64)
+        self.position   = np.zeros((num_sessions, num_steps, 2), dtype=np.int64)
+        self.expected   = np.zeros((num_sessions, num_steps, 2, 6), dtype=np.int64)
+        self.no_visualizer = np.zeros(num_sessions, dtype=bool)
+
+        # one row of ints per record, converted into an array at once
+        rows = []
+        for s, session in enumerate(sessions):
+            for k, data in enumerate(session.records):
+                action  = data['predicted_action']
+                p1      = data['game_state_expected']['p1']
+                p2      = data['game_state_expected']['p2']
+                rows.append((s, k, data['player_id'] - 1, _codes.get(action, -1) if type(action) is str else -1,
+                             data['position_1'], data['position_2'],
+                             p1['hp'], p1['bullets'], p1['bombs'], p1['shield_hp'], p1['deaths'], p1['shields'],
+                             p2['hp'], p2['bullets'], p2['bombs'], p2['shield_hp'], p2['deaths'], p2['shields']))
+            self.no_visualizer[s] = bool(session.no_visualizer)
+
+        if rows:
+            rows    = np.array(rows, dtype=np.int64)
+            index   = (rows[:, 0], rows[:, 1])
+            self.valid[index]       = True
+            self.player[index]      = rows[:, 2]
+            self.action[index]      = rows[:, 3]
+            self.position[index]    = rows[:, 4:6]
+            self.expected[index]    = rows[:, 6:].reshape(-1, 2, 6)
+
+        self.state = np.zeros((num_sessions, 2, 6), dtype=np.int64)
+        self.state[:, :, HP]        = Player.max_hp
+        self.state[:, :, BULLETS]   = Player.max_bullets
+        self.state[:, :, BOMBS]     = Player.max_bombs
+        self.state[:, :, SHIELDS]   = Player.max_shields
+        self.fires = np.zeros((num_sessions, 2, Player.num_quadrants), dtype=np.int64)
+
+    def run(self):
+        """ replay all the steps, returns the list of Divergence """
+        divergences = []
+        for k in range(self.valid.shape[1]):
+            self.step(k)
+            rows = np.nonzero(self.valid[:, k] & (self.state != self.expected[:, k]).any(axis=(1, 2)))[0]
+            for s in rows:
+                divergences.append(Divergence(self.sessions[s], k, self._state_dict(s)))
+        return divergences
+
+    def step(self, k):
+        """ GameState.perform_action for the k-th record of every session """
+        valid       = self.valid[:, k]
+        attacker    = self.player[:, k]
+        opponent    = 1 - attacker
+        action      = self.action[:, k]
+        position    = self.position[:, k]
+        rows        = np.arange(len(valid))
+        opponent_position = position[rows, opponent]
+
+        # fire started by the attacker in the quadrant of the opponent
+        fires = np.where(valid & ~self.no_visualizer, self.fires[rows, attacker, opponent_position], 0)
+        for i in range(int(fires.max(initial=0))):
+            self._reduce_health(fires > i, opponent, Player.hp_fire)
+
+        can_see = (position[:, 0] == 4) == (position[:, 1] == 4)
+        is_ai   = np.isin(action, _AI)
+        can_see |= self.no_visualizer & (is_ai | (action == _BOMB))
+
+        state = self.state
+        # gun
+        mask = valid & (action == _GUN) & (state[rows, attacker, BULLETS] > 0)
+        state[rows[mask], attacker[mask], BULLETS] -= 1
+        self._reduce_health(mask & can_see, opponent, Player.hp_bullet)
+
+        # shield
+        mask = valid & (action == _SHIELD) & (state[rows, attacker, SHIELDS] > 0) \
+            & (state[rows, attacker, SHIELD_HP] <= 0)
+        state[rows[mask], attacker[mask], SHIELD_HP] = Player.max_shield_health
+        state[rows[mask], attacker[mask], SHIELDS]  -= 1
+
+        # reload
+        mask = valid & (action == _RELOAD) & (state[rows, attacker, BULLETS] <= 0)
+        state[rows[mask], attacker[mask], BULLETS] = Player.max_bullets
+
+        # bomb
+        mask = valid & (action == _BOMB) & (state[rows, attacker, BOMBS] > 0)
+        state[rows[mask], attacker[mask], BOMBS] -= 1
+        mask &= can_see
+        self._reduce_health(mask, opponent, Player.hp_bomb)
+        self.fires[rows[mask], attacker[mask], opponent_position[mask]] += 1
+
+        # AI actions
+        self._reduce_health(valid & is_ai & can_see, opponent, Player.hp_AI)
+
+    def _reduce_health(self, mask, player, hp_reduction):
+        """ Player.reduce_health of player[s] for the sessions s in mask """
+        rows    = np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return
+        player  = player[rows]
+        state   = self.state
+
+        hp_shield   = state[rows, player, SHIELD_HP]
+        shielded    = hp_shield > 0
+        reduction   = np.where(shielded, np.maximum(0, hp_reduction - hp_shield), hp_reduction)
+        state[rows, player, SHIELD_HP] = np.where(shielded, np.maximum(0, hp_shield - hp_reduction), hp_shield)
+
+        hp = np.maximum(0, state[rows, player, HP] - reduction)
+        state[rows, player, HP] = hp
+
+        # the dead players spawn immediately
+        dead    = hp == 0
+        rows    = rows[dead]
+        player  = player[dead]
+        state[rows, player, DEATHS]    += 1
+        state[rows, player, HP]         = Player.max_hp
+        state[rows, player, BULLETS]    = Player.max_bullets
+        state[rows, player, BOMBS]      = Player.max_bombs
+        state[rows, player, SHIELD_HP]  = 0
+        state[rows, player, SHIELDS]    = Player.max_shields
+
+    def _state_dict(self, s):
+        return {p: dict(zip(Player.keys, self.state[s, i].tolist())) for i, p in enumerate(('p1', 'p2'))}
+
+
+def replay_reference(session):
+    """
+    replay one session with GameState, one record at a time, returns the list of Divergence
+    used to cross-check the vectorized replay
+    """
+    game_state  = GameState()
+    divergences = []
+    for k, data in enumerate(session.records):
+        try:
+            game_state.perform_action(data['predicted_action'], data['player_id'],
+                                      data['position_1'], data['position_2'], bool(session.no_visualizer))
+        except TypeError:
+            # unhashable action, the eval server could not have logged it
+            pass
+        if game_state.get_dict() != data['game_state_expected']:
+            divergences.append(Divergence(session, k, game_state.get_dict()))
+    return divergences
+
+
+def replay(sessions):
+    """
+    replay the sessions, returns the list of Divergence
+    a session whose no_visualizer is unknown is replayed both ways and replaced in sessions by the replay with fewer
+    divergences
+    """
+    variants = []
+    for session in sessions:
+        if session.no_visualizer is None:
+            variants.extend((session.with_visualizer(False), session.with_visualizer(True)))
+        else:
+            variants.append(session)
+
+    diverged = dict()   # variant -> list of Divergence
+    for d in ReplayEngine(variants).run():
+        diverged.setdefault(d.session, []).append(d)
+
+    divergences = []
+    i = 0
+    for s, session in enumerate(sessions):
+        if session.no_visualizer is None:
+            best = min(variants[i:i + 2], key=lambda v: len(diverged.get(v, [])))
+            i += 2
+        else:
+            best = variants[i]
+            i += 1
+        sessions[s] = best
+        divergences.extend(diverged.get(best, []))
+    return divergences
+
+
+def _note(session):
+    """ how the context of a session was rebuilt, for the report """
+    if session.rebuilt is None:
+        return ""
+    return " (context rebuilt from the {}, no_visualizer={})".format(
+        "seed" if session.rebuilt == "seed" else "rules of a 1-player game", session.no_visualizer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay evaluation logs and flag the game states which diverge")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(os.path.dirname(__file__), "evaluation_logs")],
+                        help="log files or directories (default: evaluation_logs)")
+    parser.add_argument("--verbose", action="store_true", help="print every divergent record")
+    parser.add_argument("--cross-check", action="store_true",
+                        help="replay every session with GameState as well and compare the results")
+    args = parser.parse_args()
+
+    if np is None:
+        print("ReplayEngine.py needs numpy: pip install numpy")
+        return 2
+
+    sessions = []
+    for filepath in find_logs(args.paths):
+        sessions.extend(read_sessions(filepath))
+    replayable  = []
+    skipped     = []    # (session, reason)
+    for session in sessions:
+        reason = complete_context(session)
+        if reason is None:
+            replayable.append(session)
+        else:
+            skipped.append((session, reason))
+    for session, reason in skipped:
+        print("CANNOT REPLAY {}: {}".format(session, reason))
+
+    divergences = replay(replayable)
+
+    diverged = dict()   # session -> list of Divergence
+    for d in divergences:
+        diverged.setdefault(d.session, []).append(d)
+    for session, ds in diverged.items():
+        print("DIVERGED {}{}: {} of {} records, first: {}".format(session, _note(session), len(ds),
+                                                                   len(session.records), ds[0]))
+        if args.verbose:
+            for d in ds[1:]:
+                print("    ", d)
+    if args.verbose:
+        for session in replayable:
+            if session not in diverged and _note(session):
+                print("REPLAYED {}{}".format(session, _note(session)))
+
+    print("{} sessions replayed ({} with a rebuilt context), {} records, {} sessions diverged, "
+          "{} cannot be replayed".format(len(replayable), sum(1 for s in replayable if s.rebuilt),
+                                         sum(len(s.records) for s in replayable), len(diverged), len(skipped)))
+
+    if args.cross_check:
+        order       = {session: i for i, session in enumerate(replayable)}
+        reference   = [(d.session, d.index, d.recomputed) for s in replayable for d in replay_reference(s)]
+        if reference != [(d.session, d.index, d.recomputed) for d in
+                         sorted(divergences, key=lambda d: order[d.session])]:
+            print("CROSS-CHECK FAILED: the replay differs from GameState")
+            return 2
+        print("cross-check with GameState: identical")
+
+    return 1 if diverged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
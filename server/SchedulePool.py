@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import random
+from collections import deque
+
+from CompactLog import ACTIONS, ACTION_CODES
+from GameSimulator import GameSimulator, _Move
+from Helper import ice_print
+
+
+class Schedule:
+    """
+    The moves of one session and the seed which generated them, stored as 4 bytes per move:
+    action_1, position_1, action_2, position_2
+    """
+    __slots__ = ('seed', 'num_players', 'data')
+
+    def __init__(self, seed, num_players, moves):
+        self.seed           = seed
+        self.num_players    = num_players
+        self.data           = bytes(v for move in moves for v in (ACTION_CODES[move.action_1], move.position_1,
+                                                                   ACTION_CODES[move.action_2], move.position_2))
+
+    def __len__(self):
+        return len(self.data) // 4
+
+    def moves(self):
+        """ the list of _Move of the session """
+        data = self.data
+        return [_Move(ACTIONS[data[i]], data[i+1], ACTIONS[data[i+2]], data[i+3]) for i in range(0, len(data), 4)]
+
+
+class SchedulePool:
+    """
+    Move schedules generated in advance, so that creating a session does not run the random walk of
+    GameSimulator during the handshake. Every schedule comes from an explicit seed which is logged with
+    the records of the session, GameSimulator.generate_moves(num_players, random.Random(seed)) regenerates it.
+    The session seeds are drawn from a generator seeded with base_seed (any seed of random.Random).
+    """
+    size = 16   # schedules kept ready for every number of players
+
+    def __init__(self, base_seed=None):
+        self.reseed(base_seed)
+
+    def reseed(self, base_seed):
+        """ restart the sequence of session seeds, the schedules generated from the previous one are dropped """
+        self.base_seed  = base_seed
+        self._seeds     = random.Random(base_seed)
+        self._pools     = {1: deque(), 2: deque()}
+        self._refill    = None  # pending call of fill
+
+    def generate(self, num_players):
+        """ a validated schedule from the next seed """
+        while True:
+            seed = self._seeds.getrandbits(32)
+            moves = GameSimulator.generate_moves(num_players, random.Random(seed))
+            try:
+                GameSimulator.validate_moves(moves, num_players)
+            except ValueError as e:
+                ice_print("SchedulePool: discarding seed", seed, e, color=1)
+                continue
+            return Schedule(seed, num_players, moves)
+
+    def fill(self):
+        """ generate the missing schedules """
+        self._refill = None
+        for num_players, pool in self._pools.items():
+            while len(pool) < self.size:
+                pool.append(self.generate(num_players))
+
+    def take(self, num_players):
+        """ the schedule of a new session, the pool is refilled after the current callback of the event loop """
+        pool = self._pools.get(num_players)
+        if pool:
+            schedule = pool.popleft()
+        else:
+            schedule = self.generate(num_players)
+        if self._refill is None:
+            try:
+                self._refill = asyncio.get_running_loop().call_soon(self.fill)
+            except RuntimeError:
+                # no event loop, the schedules are generated on demand
+                pass
+        return schedule
+
+
+schedule_pool = SchedulePool()  # the schedules of this process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="regenerate the moves of a session from the seed in its log")
+    parser.add_argument("seed", type=int)
+    parser.add_argument("--players", type=int, choices=[1, 2], default=2)
+    args = parser.parse_args()
+
+    moves = GameSimulator.generate_moves(args.players, random.Random(args.seed))
+    GameSimulator.validate_moves(moves, args.players)
+    for i, move in enumerate(moves):
+        print("{:2d}: {}".format(i, move))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import binascii
+from time import perf_counter
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+
+class SessionCrypto:
+    """
+    AES context of one team, created once at handshake.
+    The key is converted to bytes once; every message is decrypted by a CBC cipher created with its IV into an
+    output buffer reused for every message, the text is copied once, into the str returned. The instance keeps no
+    other state between messages, so it can be used from an executor thread as long as a session decrypts one
+    message at a time.
+    """
+
+    def __init__(self, secret_key):
+        self.key        = bytes(str(secret_key), encoding="utf8")  # Convert secret key to bytes
+        self.plain_text = bytearray(1024)   # output buffer of the decryption, grown for longer messages
+
+        # counters of the time spent in decryption
+        self.num_decrypted  = 0
+        self.time_total     = 0.0
+        self.time_max       = 0.0
+
+    @staticmethod
+    def decode(frame):
+        """
+        the IV + cypher of a base64 frame (bytes or a memoryview of the receive buffer), None if it is not base64
+        the frame can be released as soon as it is decoded
+        """
+        try:
+            return binascii.a2b_base64(frame)
+        except binascii.Error:
+            return None
+
+    def decrypt(self, message):
+        """
+        decrypt the IV + cypher returned by decode() and return the utf-8 text
+        raises ValueError (or a subclass) if the message cannot be decrypted, e.g. an invalid key length
+        """
+        start_time = perf_counter()
+        try:
+            if message is None:
+                raise ValueError("cypher text is not base64")
+
+            message = memoryview(message)
+            size    = len(message) - AES.block_size
+            if size < AES.block_size:
+                raise ValueError("cypher text too short")
+            if len(self.plain_text) < size:
+                self.plain_text = bytearray(size)
+            plain_text = memoryview(self.plain_text)[:size]
+
+            cipher = AES.new(self.key, AES.MODE_CBC, message[:AES.block_size])  # Create new AES cipher object
+            cipher.decrypt(message[AES.block_size:], output=plain_text)        # Perform decryption
+            return str(unpad(plain_text, AES.block_size), 'utf8')               # Decode bytes into utf-8
+        finally:
+            elapsed = perf_counter() - start_time
+            self.num_decrypted  += 1
+            self.time_total     += elapsed
+            self.time_max        = max(self.time_max, elapsed)
+
+    def stat(self):
+        """ text summary of the decryption counters """
+        mean = self.time_total / self.num_decrypted if self.num_decrypted else 0
+        return "decrypted {} messages: total={:.2f}ms mean={:.3f}ms max={:.3f}ms".format(
+            self.num_decrypted, self.time_total * 1000, mean * 1000, self.time_max * 1000)
@@ -0,0 +1,67 @@
+from Helper import Action
+from LatencySketch import LatencySketch
+
+
+class SessionStats:
+    """
+    Accuracy and response times of the matched actions of one session, split between the gun and the AI actions.
+    The response times of every session are also added to the sketches shared by all the groups of this process.
+    """
+    components = ("GUN", "AI ")
+
+    # all the groups, for the global view
+    all_groups = {component: LatencySketch() for component in components}
+
+    def __init__(self):
+        self.num_matched    = {component: 0 for component in self.components}
+        self.response_time  = {component: LatencySketch() for component in self.components}
+        self.new_matches    = []    # (component, response time) since the last checkpoint (Checkpoint.py)
+        self.num_timeouts   = 0     # players without a packet before the deadline of the move
+
+    @staticmethod
+    def component(action):
+        return "GUN" if action == Action.shoot else "AI "
+
+    def add_match(self, action, response_time):
+        """ an action matched by the eval_client """
+        component = self.component(action)
+        self.num_matched[component] += 1
+        self.response_time[component].add(response_time)
+        self.all_groups[component].add(response_time)
+        self.new_matches.append((component, response_time))
+
+    def take_new_matches(self):
+        """ the matches since the previous call """
+        matches, self.new_matches = self.new_matches, []
+        return matches
+
+    def restore(self, matches, num_timeouts, add_to_all_groups):
+        """
+        the matches and timeouts of a resumed session, add_to_all_groups unless they were counted by this process
+        already
+        """
+        self.num_timeouts = num_timeouts
+        for component, response_time in matches:
+            self.num_matched[component] += 1
+            self.response_time[component].add(response_time)
+            if add_to_all_groups:
+                self.all_groups[component].add(response_time)
+
+    @staticmethod
+    def format_sketch(sketch, default=float('nan')):
+        """ mean, median, p90 and p99 of a sketch, default if it is empty """
+        if len(sketch) == 0:
+            return "(mean):{d:.2f} (median):{d:.2f} (p90):{d:.2f} (p99):{d:.2f}".format(d=default)
+        mean, median, p90, p99 = sketch.summary()
+        return "(mean):{:.2f} (median):{:.2f} (p90):{:.2f} (p99):{:.2f}".format(mean, median, p90, p99)
+
+    def live_message(self):
+        """ the statistics displayed on the page after every move """
+        lines = []
+        for component in self.components:
+            lines.append("{}-- matched={} {}".format(component, self.num_matched[component],
+                                                     self.format_sketch(self.response_time[component])))
+        for component in self.components:
+            sketch = self.all_groups[component]
+            lines.append("{}-- all groups n={} {}".format(component, len(sketch), self.format_sketch(sketch)))
+        return "<br>".join(lines)
@@ -0,0 +1,125 @@
+import asyncio
+import socket
+
+from Framing import FrameDecoder
+from Helper import ice_print
+from SessionCrypto import SessionCrypto
+
+
+class SharedListener:
+    """
+    A single TCP listener on a well-known port accepting the eval_client of every group.
+    The first frame sent by an eval_client is its group name in plain text ("<len>_<group_name>"), the second one
+    the encrypted "hello". The connection is handed to the Client of that group waiting in accept() only once the
+    hello decrypts with the password of the session, hence a connection knowing the group name but not the
+    password cannot take the place of the real eval_client.
+    Connections for a group without a Client waiting, or with a wrong password, are closed.
+    """
+    identify_timeout    = 10    # seconds an eval_client has to send its group name and hello
+    max_group_name_len  = 64    # bytes of the group name frame, the frame is read before any password check
+
+    def __init__(self, host="", port=8003):
+        self.host   = host
+        self.port   = port
+        self.socket = None
+        self.pending = dict()   # group_name -> (future of (conn, addr, decoder), SessionCrypto) of the Client
+                                #   waiting in accept
+
+        self.num_accepted   = 0     # connections handed to a Client
+        self.num_rejected   = 0     # connections closed: unknown group, timeout, invalid frame, wrong password
+
+    async def start(self):
+        """ listen and accept the connections in a background task """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(128)
+        self.socket.setblocking(False)
+        asyncio.ensure_future(self._accept_loop())
+        ice_print("SharedListener: eval_clients connect to port", self.port, color=2)
+
+    async def _accept_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            conn, addr = await loop.sock_accept(self.socket)
+            conn.setblocking(False)
+            asyncio.ensure_future(self._identify(conn, addr))
+
+    def expect(self, group_name, crypto):
+        """
+        register the Client of a group, returns the future of (conn, addr, decoder holding the bytes received after
+        the hello) or None if the session is withdrawn
+        crypto: the SessionCrypto of the session, checks the hello of the connections
+        a newer session of the group (e.g. the page was refreshed) supersedes the one waiting
+        """
+        self.withdraw(group_name, self._future(group_name))
+        future = asyncio.get_event_loop().create_future()
+        self.pending[group_name] = (future, crypto)
+        return future
+
+    def withdraw(self, group_name, future):
+        """ the Client stops waiting for its eval_client """
+        if future is None:
+            return
+        if self._future(group_name) is future:
+            self.pending.pop(group_name)
+        if not future.done():
+            future.set_result(None)
+
+    def _future(self, group_name):
+        """ the future of the Client of a group waiting in accept, None if there is none """
+        return self.pending.get(group_name, (None, None))[0]
+
+    async def _identify(self, conn, addr):
+        """ read the group name and the hello, hand the connection to the Client of the group """
+        decoder = FrameDecoder(max_frame_len=self.max_group_name_len)
+        try:
+            deadline    = asyncio.get_event_loop().time() + self.identify_timeout
+            frame       = await asyncio.wait_for(self._read_frame(conn, decoder), timeout=self.identify_timeout)
+            group_name  = str(frame, "utf-8")
+        except (asyncio.TimeoutError, ValueError, ConnectionError) as e:
+            self._reject(conn, addr, "no group name: " + (str(e) or type(e).__name__))
+            return
+
+        future, crypto = self.pending.get(group_name, (None, None))
+        if future is None or future.done():
+            self._reject(conn, addr, "no session waiting for group " + repr(group_name))
+            return
+
+        # the frames after the group name are the ones of the session
+        decoder.max_frame_len = FrameDecoder.max_frame_len
+        try:
+            timeout = deadline - asyncio.get_event_loop().time()
+            frame   = await asyncio.wait_for(self._read_frame(conn, decoder), timeout=timeout)
+            text    = crypto.decrypt(SessionCrypto.decode(frame))
+        except (asyncio.TimeoutError, ValueError, ConnectionError) as e:
+            self._reject(conn, addr, "no hello from group " + repr(group_name) + ": " + (str(e) or type(e).__name__))
+            return
+        if text != "hello":
+            self._reject(conn, addr, "wrong password for group " + repr(group_name))
+            return
+
+        if self._future(group_name) is not future or future.done():
+            # withdrawn, or another connection of the group was verified meanwhile
+            self._reject(conn, addr, "no session waiting for group " + repr(group_name))
+            return
+        self.pending.pop(group_name)
+        self.num_accepted += 1
+        future.set_result((conn, addr, decoder))
+
+    @staticmethod
+    async def _read_frame(conn, decoder):
+        loop = asyncio.get_event_loop()
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                return frame
+            size = await loop.sock_recv_into(conn, decoder.writable(4096))
+            if not size:
+                raise ConnectionResetError("closed before sending the frame")
+            decoder.commit(size)
+
+    def _reject(self, conn, addr, reason):
+        self.num_rejected += 1
+        ice_print("SharedListener: closing connection from", addr, reason, color=1)
+        conn.close()
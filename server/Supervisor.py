@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+
+import websockets
+
+import Codec
+from Helper import ice_print
+
+
+class Supervisor:
+    """
+    Runs the eval server as N worker processes behind a coordinator.
+    Every worker runs its own WebSocketServer (handler, TCP listeners, decryption, logging) on a local port.
+    The coordinator accepts the web clients on the public port, reads the handshake and proxies the
+    websocket to the worker owning the group (crc32 of the group name), hence all the connections of a
+    group land on the same worker and the client_dict of that worker keeps rejecting duplicate connections.
+    The eval_client connects directly to the TCP port announced by the worker.
+    """
+
+    def __init__(self, num_workers, worker_main, port=8001, worker_base_port=8101, report_interval=30):
+        self.num_workers        = num_workers
+        self.worker_main        = worker_main       # function(index, port) running a WebSocketServer on 127.0.0.1:port
+        self.port               = port
+        self.worker_ports       = [worker_base_port + i for i in range(num_workers)]
+        self.report_interval    = report_interval   # seconds between two load reports
+
+        self.processes  = [None] * num_workers
+        # registry of the sessions proxied to every worker: group_name -> number of open websockets
+        self.sessions   = [dict() for _ in range(num_workers)]
+
+    def route(self, group_name):
+        """ the worker owning a group """
+        return zlib.crc32(group_name.encode("utf-8")) % self.num_workers
+
+    def start_worker(self, index):
+        process = multiprocessing.Process(target=_worker_entry,
+                                          args=(self.worker_main, index, self.worker_ports[index], os.getpid()),
+                                          name="eval_worker_{}".format(index), daemon=True)
+        process.start()
+        self.processes[index] = process
+        ice_print("Supervisor: worker", index, "pid", process.pid, "port", self.worker_ports[index], color=2)
+
+    async def run(self):
+        for i in range(self.num_workers):
+            self.start_worker(i)
+
+        # SIGTERM stops the workers as well
+        stop = asyncio.get_event_loop().create_future()
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, stop.set_result, None)
+
+        print ("Waiting for new websocket client")
+        try:
+            async with websockets.serve(self.proxy, "", self.port):
+                while not stop.done():
+                    await asyncio.wait([stop], timeout=self.report_interval)
+                    self.check_workers()
+                    self.report()
+        finally:
+            for process in self.processes:
+                process.terminate()
+
+    def check_workers(self):
+        """ restart the workers which died, their sessions are lost """
+        for i, process in enumerate(self.processes):
+            if not process.is_alive() and process.exitcode != -signal.SIGTERM:
+                ice_print("Supervisor: worker", i, "exited with code", process.exitcode, "restarting", color=1)
+                self.start_worker(i)
+
+    def load(self):
+        """ list of (worker index, pid, number of sessions, cpu seconds, groups) """
+        ret = []
+        for i, process in enumerate(self.processes):
+            groups = sorted(self.sessions[i].keys())
+            ret.append((i, process.pid, sum(self.sessions[i].values()), self._cpu_time(process.pid), groups))
+        return ret
+
+    def report(self):
+        for i, pid, num_sessions, cpu_time, groups in self.load():
+            ice_print("Supervisor: worker {} pid={} sessions={} cpu={:.1f}s groups={}".format(
+                i, pid, num_sessions, cpu_time, ",".join(groups)), color=2)
+
+    @staticmethod
+    def _cpu_time(pid):
+        """ user + system cpu seconds of a process, read from /proc """
+        try:
+            with open("/proc/{}/stat".format(pid)) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return 0.0
+
+    async def proxy(self, websocket):
+        """ forward a web client to the worker owning its group """
+        message = await websocket.recv()
+        try:
+            group_name = str(Codec.stdlib_loads(message)["group_name"])
+        except (ValueError, TypeError, KeyError):
+            # the worker reports the invalid handshake to the page
+            group_name = ""
+        index = self.route(group_name)
+
+        sessions = self.sessions[index]
+        sessions[group_name] = sessions.get(group_name, 0) + 1
+        try:
+            async with websockets.connect("ws://127.0.0.1:{}/".format(self.worker_ports[index])) as upstream:
+                await upstream.send(message)
+                relays = [asyncio.ensure_future(self._relay(websocket, upstream)),
+                          asyncio.ensure_future(self._relay(upstream, websocket))]
+                _, pending = await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+                for task in pending:
+                    task.cancel()
+        except OSError as e:
+            ice_print("Supervisor: worker", index, "unreachable", e, color=1)
+        finally:
+            sessions[group_name] -= 1
+            if sessions[group_name] == 0:
+                sessions.pop(group_name)
+
+    @staticmethod
+    async def _relay(source, destination):
+        try:
+            async for message in source:
+                await destination.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+
+def _worker_entry(worker_main, index, port, supervisor_pid):
+    """
+    body of a worker process, exits when the supervisor is gone (e.g. killed with SIGKILL)
+    """
+    def watchdog():
+        while os.getppid() == supervisor_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watchdog, name="supervisor_watchdog", daemon=True).start()
+    worker_main(index, port)
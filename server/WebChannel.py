@@ -0,0 +1,273 @@
+import asyncio
+import hmac
+from collections import deque
+
+import websockets
+
+import Codec
+from Helper import ice_print, ice_print_group_name
+
+
+class WebChannel:
+    """
+    The websocket connected to the web client of one team.
+    Pages which announce the "batch" feature in the handshake receive the UI events of a move as a single
+    "batch" frame holding the list of events; older pages receive one frame per event.
+    In batch mode the events are held until flush(), which must be called before waiting on the web client
+    or on the eval client, so that the page is up-to-date while the server waits.
+    Pages which announce the "stat" feature display the running statistics sent after every move.
+    Every frame is serialized once and also published to the spectators of the session (Subscriber), who know its
+    password, the last history_size frames are kept for the spectators who join during the session.
+    """
+    history_size = 2000     # frames
+
+    def __init__(self, websocket):
+        self.websocket      = websocket
+        self.batch          = False
+        self.stat           = False
+        self._events        = []    # events waiting for the next flush
+        self._drain         = None  # task discarding the messages of the page
+        self.subscribers    = []    # the spectators of the session
+        self.password       = None  # the password of the session, set by Spectators.attach
+        self.history        = deque(maxlen=self.history_size)
+
+    def enable_features(self, features):
+        """ the features announced by the page in the handshake """
+        self.batch  = "batch" in features
+        self.stat   = "stat" in features
+
+    async def send(self, event):
+        """ send an event (dict) to the page """
+        if self.batch:
+            self._events.append(event)
+        else:
+            await self._publish(event)
+
+    async def flush(self):
+        """ send the events held in batch mode """
+        if len(self._events) == 0:
+            return
+        events          = self._events
+        self._events    = []
+        if len(events) == 1:
+            frame = events[0]
+        else:
+            frame = {"type": "batch", "events": events}
+        await self._publish(frame)
+
+    async def _publish(self, frame):
+        """ send a frame to the page and queue it for the spectators, who never slow down the session """
+        text = Codec.dumps_str(frame)
+        self.history.append(text)
+        for subscriber in self.subscribers:
+            subscriber.push(text)
+        if self.websocket is not None:
+            await self.websocket.send(text)
+
+    async def ping(self):
+        """ raises websockets.ConnectionClosed if the page is closed """
+        await self.websocket.ping()
+
+    def is_open(self):
+        return self.websocket.open
+
+    def ignore_messages(self):
+        """
+        discard the messages of the page in the background, when the server does not wait for the clicks
+        (Pacing.py), so that they do not fill the receive queue of the websocket
+        """
+        if self._drain is None:
+            self._drain = asyncio.ensure_future(self._discard())
+
+    async def _discard(self):
+        try:
+            while True:
+                await self.websocket.recv()
+        except websockets.ConnectionClosed:
+            pass
+
+    def close(self):
+        """ the session is over """
+        if self._drain is not None:
+            self._drain.cancel()
+            self._drain = None
+
+
+class HeadlessChannel(WebChannel):
+    """
+    The channel of a session without page: the messages and errors are printed on the console,
+    all the events are published to the spectators.
+    """
+    printed = ("info", "info_y", "error")
+
+    def __init__(self, group_name):
+        super().__init__(None)
+        self.group_name = group_name
+
+    async def send(self, event):
+        if event["type"] in self.printed and event["message"] != "------------":
+            ice_print_group_name(self.group_name, event["message"])
+        await super().send(event)
+
+    async def ping(self):
+        pass
+
+    def is_open(self):
+        return True
+
+    def ignore_messages(self):
+        pass
+
+
+class Subscriber:
+    """
+    A read-only page watching the sessions of a group (watch.html) or the admin dashboard (Dashboard.py).
+    The frames are queued by the session and sent by a task of the subscriber, a subscriber which falls more than
+    max_lag frames behind is disconnected instead of holding the frames of the session.
+    """
+    max_lag = 4000  # frames
+
+    def __init__(self, websocket, group_name, password=None):
+        self.websocket  = websocket
+        self.group_name = group_name
+        self.password   = password      # the password of the group, None for the admin dashboard
+        self.queue      = asyncio.Queue(maxsize=self.max_lag)
+        self.lagging    = False
+        self.task       = None  # the task sending the frames
+
+    def push(self, text):
+        """ queue a frame, never blocks """
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.lagging = True
+            if self.task is not None:
+                self.task.cancel()
+
+    async def serve(self):
+        """ send the queued frames until the page is closed or lags behind, the messages of the page are dropped """
+        self.task   = asyncio.ensure_future(self._send())
+        reader      = asyncio.ensure_future(self._discard())
+        try:
+            await asyncio.wait((self.task, reader), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.task.cancel()
+            reader.cancel()
+
+    async def _send(self):
+        try:
+            while True:
+                await self.websocket.send(await self.queue.get())
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _discard(self):
+        try:
+            async for _ in self.websocket:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+
+
+class Spectators:
+    """
+    The spectators of every group of this process. A spectator watches the group and not one session: it waits
+    for the next session of the group when there is none, and goes on with the next one when a session ends.
+    A spectator gives the password of the group and only receives the frames of the sessions with that password,
+    it is refused while a session of the group with another password is running.
+    """
+
+    def __init__(self):
+        self.channels       = dict()    # group_name -> WebChannel of the session of the group
+        self.waiting        = dict()    # group_name -> [Subscriber] of the groups without session
+        self.num_lagging    = 0         # subscribers disconnected for lagging behind
+        self.num_refused    = 0         # spectators refused for a wrong password
+
+    @staticmethod
+    def _knows(subscriber, channel):
+        """ whether the spectator gave the password of the session """
+        return isinstance(subscriber.password, str) and isinstance(channel.password, str) and \
+            hmac.compare_digest(subscriber.password.encode(), channel.password.encode())
+
+    def attach(self, group_name, channel, password):
+        """
+        a session of the group starts, it supersedes the previous one, e.g. the page was refreshed
+        the spectators without the password of the session wait for the next one
+        """
+        channel.password = password
+        subscribers = self.waiting.pop(group_name, [])
+        previous    = self.channels.get(group_name)
+        if previous is not None:
+            subscribers.extend(previous.subscribers)
+            previous.subscribers = []
+        waiting = []
+        for subscriber in subscribers:
+            (channel.subscribers if self._knows(subscriber, channel) else waiting).append(subscriber)
+        if waiting:
+            self.waiting[group_name] = waiting
+        self.channels[group_name] = channel
+
+    def detach(self, group_name, channel):
+        """ the session is over, its spectators wait for the next one """
+        if group_name is None or self.channels.get(group_name) is not channel:
+            return
+        self.channels.pop(group_name)
+        if channel.subscribers:
+            self.waiting.setdefault(group_name, []).extend(channel.subscribers)
+            channel.subscribers = []
+
+    def _add(self, subscriber):
+        channel = self.channels.get(subscriber.group_name)
+        if channel is None:
+            self.waiting.setdefault(subscriber.group_name, []).append(subscriber)
+            return
+        # the frames of the session so far, at most half of the lag allowed, then the new ones
+        for text in list(channel.history)[-(subscriber.max_lag // 2):]:
+            subscriber.push(text)
+        channel.subscribers.append(subscriber)
+
+    def _remove(self, subscriber):
+        channel = self.channels.get(subscriber.group_name)
+        if channel is not None and subscriber in channel.subscribers:
+            channel.subscribers.remove(subscriber)
+        subscribers = self.waiting.get(subscriber.group_name, [])
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+            if not subscribers:
+                self.waiting.pop(subscriber.group_name)
+
+    async def watch(self, websocket, group_name, password):
+        """ serve a spectator until its page is closed """
+        subscriber  = Subscriber(websocket, group_name, password)
+        channel     = self.channels.get(group_name)
+        if channel is not None and not self._knows(subscriber, channel):
+            self.num_refused += 1
+            ice_print(group_name + ": spectator refused, wrong password", color=1)
+            try:
+                await websocket.send(Codec.dumps_str({"type": "error", "message": "Watch denied: wrong password"}))
+            except websockets.ConnectionClosed:
+                pass
+            return
+        subscriber.push(Codec.dumps_str({"type": "num_move", "message": "Watching " + group_name}))
+        if group_name not in self.channels:
+            subscriber.push(Codec.dumps_str({"type": "info", "message": "Waiting for a session of " + group_name}))
+        self._add(subscriber)
+        try:
+            await subscriber.serve()
+        finally:
+            self._remove(subscriber)
+        if subscriber.lagging:
+            self.num_lagging += 1
+            ice_print(group_name + ": spectator disconnected, more than", Subscriber.max_lag, "frames behind",
+                      color=1)
+
+    def stat(self):
+        watching = sum(len(channel.subscribers) for channel in self.channels.values())
+        waiting  = sum(len(subscribers) for subscribers in self.waiting.values())
+        return "Spectators: watching={} waiting={} lagging={} refused={}".format(watching, waiting, self.num_lagging,
+                                                                                self.num_refused)
+
+
+spectators = Spectators()   # the spectators of this process
@@ -1,13 +1,30 @@
 #!/usr/bin/env python
 
+import argparse
 import asyncio
-import json
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 
 import websockets
-import statistics
 
+import Codec
+from Checkpoint import checkpoints, CheckpointStore
 from Client import Client
-from Helper import ice_print_group_name, Action
+from Dashboard import dashboard, Dashboard
+from Logger import Logger
+from LogIndex import log_index, LogIndex
+from LogStore import log_store, LogStore
+from LoopMonitor import loop_monitor
+from Metrics import serve_metrics
+from Pacing import Pacing
+from Reaper import reaper, Reaper
+from SchedulePool import schedule_pool
+from SessionStats import SessionStats
+from SharedListener import SharedListener
+from Supervisor import Supervisor
+from WebChannel import HeadlessChannel, spectators, Subscriber, WebChannel
+from Helper import ice_print_group_name
 
 client_dict = dict()  # dictionary containing all the clients
 
@@ -21,12 +38,20 @@ class _MessageType:
     info_wobr    = "info_wobr"
     num_move     = "num_move"
     position     = "position"
+    stat         = "stat"
 
 
 def get_json_ws(m_type, message="", pos_1=-1, pos_2=-1, action_match=-2, player_id=-1):
     """
     The json corresponding to the web client
     """
+    return Codec.dumps_str(get_event_ws(m_type, message, pos_1, pos_2, action_match, player_id))
+
+
+def get_event_ws(m_type, message="", pos_1=-1, pos_2=-1, action_match=-2, player_id=-1):
+    """
+    The event (dict) corresponding to the web client
+    """
     data = {
         "type":         m_type,
         "message":      message,
@@ -35,67 +60,86 @@ def get_json_ws(m_type, message="", pos_1=-1, pos_2=-1, action_match=-2, player_
         "action_match": action_match,
         "player_id":    player_id
     }
-    return json.dumps(data)
+    return data
 
 
-async def ws_send_error(websocket, message):
+async def ws_send_error(channel, message):
     """
     Send the error message to the web client
     """
-    await websocket.send (get_json_ws(m_type=_MessageType.error, message=message))
+    await channel.send (get_event_ws(m_type=_MessageType.error, message=message))
 
 
-async def ws_send_info(websocket, message):
+async def ws_send_error_safe(channel, message):
+    """
+    Send the error message to the web client, if it is still connected
+    """
+    try:
+        await ws_send_error(channel, message)
+        await channel.flush()
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def ws_send_info(channel, message):
     """
     Send the info message to the web client
     """
-    await websocket.send (get_json_ws(m_type=_MessageType.info, message=message))
+    await channel.send (get_event_ws(m_type=_MessageType.info, message=message))
 
 
-async def ws_send_info_y(websocket, message):
+async def ws_send_info_y(channel, message):
     """
     Send the info message to the web client in yellow font colour
     """
-    await websocket.send (get_json_ws(m_type=_MessageType.info_y, message=message))
+    await channel.send (get_event_ws(m_type=_MessageType.info_y, message=message))
 
 
-async def ws_send_info_wobr(websocket, message):
+async def ws_send_info_wobr(channel, message):
     """
     Send the info message to the web client without a newline
     """
-    await websocket.send (get_json_ws(m_type=_MessageType.info_wobr, message=message))
+    await channel.send (get_event_ws(m_type=_MessageType.info_wobr, message=message))
 
 
-async def ws_send_num_move(websocket, message):
+async def ws_send_num_move(channel, message):
     """
     Send the number of steps to the web client
     """
-    await websocket.send (get_json_ws(m_type=_MessageType.num_move, message=message))
+    await channel.send (get_event_ws(m_type=_MessageType.num_move, message=message))
 
 
-async def ws_send_positions(websocket, pos_1, pos_2):
+async def ws_send_positions(channel, pos_1, pos_2):
     """
     Send the player positions to the web client
     """
-    await websocket.send (get_json_ws (m_type=_MessageType.position, pos_1=pos_1, pos_2=pos_2))
+    await channel.send (get_event_ws (m_type=_MessageType.position, pos_1=pos_1, pos_2=pos_2))
 
 
-async def ws_send_actions(websocket, action_1, action_2):
+async def ws_send_actions(channel, action_1, action_2):
     """
     Send the player actions to the web client
     """
-    await websocket.send (get_json_ws (m_type=_MessageType.action, pos_1=action_1, pos_2=action_2))
+    await channel.send (get_event_ws (m_type=_MessageType.action, pos_1=action_1, pos_2=action_2))
 
 
-async def ws_send_action_update(websocket, action_match, player_id, message):
+async def ws_send_action_update(channel, action_match, player_id, message):
     """
     Send the update of player actions to the web client
     """
-    await websocket.send (get_json_ws (m_type=_MessageType.action_match, action_match=action_match, player_id=player_id,
-                                       message=message))
+    await channel.send (get_event_ws (m_type=_MessageType.action_match, action_match=action_match, player_id=player_id,
+                                        message=message))
 
 
-async def perform_handshake(message, websocket):
+async def ws_send_stat(channel, message):
+    """
+    Send the running statistics to the web client, only to the pages which display them
+    """
+    if channel.stat:
+        await channel.send (get_event_ws(m_type=_MessageType.stat, message=message))
+
+
+async def perform_handshake(message, channel):
     """
     perform a handshake with the web client to fetch credentials,
     Which are used to host a TCP server accepting one connection
@@ -106,12 +150,13 @@ async def perform_handshake(message, websocket):
     client      = None
 
     try:
-        data = json.loads(message)
+        data = Codec.stdlib_loads(message)
         print(data)
         group_name      = data["group_name"]
         password        = data["password"]
         num_player      = int(data["num_player"])
         no_visualizer   = int(data["no_visualizer"])
+        channel.enable_features(data.get("features", []))
         if no_visualizer != 0:
             does_not_have_visualizer = True
         else:
@@ -120,40 +165,72 @@ async def perform_handshake(message, websocket):
         # check if the group is already connected to the server
         if group_name in client_dict.keys():
             # we do not allow more than one connection
-            await ws_send_error (websocket, "Connection denied: Duplicate connection to eval_server")
+            await ws_send_error (channel, "Connection denied: Duplicate connection to eval_server")
+            await channel.flush()
         else:
+            # resume the session of the group which was interrupted, if any
+            checkpoint = checkpoints.load(group_name)
+            if checkpoint is not None and \
+                    not checkpoint.matches_session(password, num_player, int(does_not_have_visualizer)):
+                ice_print_group_name(group_name, "Checkpoint not resumed: different password or settings")
+                checkpoint = None
+
             # create a Client object
-            client = Client(group_name, password, num_player, does_not_have_visualizer)
-            await ws_send_info(websocket, "Welcome: "+group_name)
-            await ws_send_info(websocket, "------------")
-            await ws_send_info(websocket, "TCP server waiting for connection from eval_client on port number "
+            client = Client(group_name, password, num_player, does_not_have_visualizer, checkpoint)
+            spectators.attach(group_name, channel, password)
+            await ws_send_info(channel, "Welcome: "+group_name)
+            if checkpoint is not None:
+                await ws_send_info_y(channel, "Resuming the interrupted session at move " + client.current_move())
+            await ws_send_info(channel, "------------")
+            if Client.shared_listener is not None:
+                await ws_send_info(channel, "eval_client sends the group name as its first frame: "
+                                   + "<length>_" + group_name)
+            await ws_send_info(channel, "TCP server waiting for connection from eval_client on port number "
                                + str(client.port_number) + " ")
-            await ws_send_num_move(websocket, client.group_name + " Port:" + str(client.port_number))
-            await client.accept()
+            await ws_send_num_move(channel, client.group_name + " Port:" + str(client.port_number))
+            await channel.flush()
+            try:
+                accepted = await reaper.wait("accept", client.accept(), group_name)
+            except asyncio.TimeoutError:
+                accepted = None
+            if not accepted:
+                if accepted is None:
+                    await ws_send_error_safe(channel, "Connection closed: eval_client did not connect within "
+                                             + str(reaper.timeout("accept")) + "s")
+                else:
+                    # a newer connection of the same group took over, e.g. the page was refreshed
+                    ice_print_group_name (group_name, "Handshake superseded by a newer connection")
+                client.stop()
+                return success, group_name, num_player, client
 
             try:
                 # check if the web socket is still open
                 # this happens when the user refreshes the webpage before establishing a TCP connection
-                await websocket.ping()
+                await channel.ping()
 
                 # check if some other connection established by the same group
                 if group_name in client_dict:
-                    await ws_send_error(websocket, "Connection denied: Duplicate connection to eval_server")
+                    await ws_send_error(channel, "Connection denied: Duplicate connection to eval_server")
                 else:
-                    await ws_send_info_y(websocket, "eval_client connected")
-                    await ws_send_info  (websocket, "Verifying Password")
+                    await ws_send_info_y(channel, "eval_client connected")
+                    await ws_send_info  (channel, "Verifying Password")
+                    await channel.flush()
                     verified, timeout = await client.verify_password()
                     if verified:
-                        await ws_send_info_y(websocket, "Successful")
-                        await ws_send_info  (websocket, "------------")
+                        await ws_send_info_y(channel, "Successful")
+                        await ws_send_info  (channel, "------------")
                         client_dict[group_name] = client
+                        if not checkpoints.begin(client, checkpoint):
+                            await ws_send_info_y(channel, "Not checkpointed: an interrupted session of "
+                                                 + group_name + " with another password can still be resumed")
                         success = True
                     elif timeout <= 0:
-                        await ws_send_error (websocket, "Failed: Timeout")
-                        await ws_send_info  (websocket, "------------")
+                        await ws_send_error (channel, "Failed: Timeout")
+                        await ws_send_info  (channel, "------------")
                     else:
-                        await ws_send_error (websocket, "Failed")
-                        await ws_send_info  (websocket, "------------")
+                        await ws_send_error (channel, "Failed")
+                        await ws_send_info  (channel, "------------")
+                await channel.flush()
             except (websockets.ConnectionClosed, websockets.ConnectionClosedOK):
                 # this is a duplicate connection and can be discarded
                 ice_print_group_name (group_name, "Terminated Dangling TCP server : port_num=", client.port_number)
@@ -161,21 +238,24 @@ async def perform_handshake(message, websocket):
             if not success:
                 client.stop()
 
-    except json.JSONDecodeError:
+    except Codec.DecodeError:
         print ("Handshake data loading failed: JSONDecodeError - ", message)
 
     return success, group_name, num_player, client
 
 
-async def ws_recv_next_click(websocket, group_name):
+async def ws_recv_next_click(channel, group_name):
     """
     Wait for the next button to be clicked in the browser
     """
     success = False
     try:
-        message = await websocket.recv()
+        await channel.flush()
+        message = await reaper.wait("idle", channel.websocket.recv(), group_name)
         if message == "next":
             success = True
+    except asyncio.TimeoutError:
+        await ws_send_error_safe(channel, "Session closed: no click for " + str(reaper.timeout("idle")) + "s")
     except websockets.ConnectionClosedOK:
         ice_print_group_name(group_name, "ws_recv_next_click: Connection closed")
     except websockets.ConnectionClosedError:
@@ -186,116 +266,339 @@ async def ws_recv_next_click(websocket, group_name):
     return success
 
 
+async def wait_next_move(channel, group_name, move_start):
+    """
+    Wait for the beginning of the next move, a click or the automatic pacing
+    returns False if the page is closed
+    """
+    if not Pacing.automatic():
+        return await ws_recv_next_click(channel, group_name)
+    try:
+        await channel.flush()
+    except websockets.ConnectionClosed:
+        ice_print_group_name(group_name, "wait_next_move: Connection closed")
+        return False
+    await Pacing.wait(move_start)
+    return channel.is_open()
+
+
 async def handler(websocket):
     """ All incoming websockets are handled by this function """
-    print ("Waiting for Handshake")
-    message = await websocket.recv()
-    success, group_name, num_players, client = await perform_handshake(message, websocket)
+    reaper.num_open += 1
+    try:
+        await handle_session(websocket)
+    finally:
+        reaper.num_open -= 1
 
-    if not success:
+
+async def handle_session(websocket):
+    print ("Waiting for Handshake")
+    try:
+        message = await reaper.wait("handshake", websocket.recv())
+    except asyncio.TimeoutError:
+        return
+    watched = spectator_group(message)
+    if watched is not None:
+        await spectators.watch(websocket, *watched)
         return
+    channel = WebChannel(websocket)
+    success, group_name, num_players, client = await perform_handshake(message, channel)
+
+    if success:
+        await play_session(channel, client, group_name)
+    spectators.detach(group_name, channel)
 
+
+def spectator_group(message):
+    """
+    the group watched by a read-only page and its password ({"watch": true, "group_name": ..., "password": ...}),
+    None for a handshake
+    """
+    try:
+        data = Codec.stdlib_loads(message)
+    except Codec.DecodeError:
+        return None
+    if isinstance(data, dict) and data.get("watch"):
+        return str(data.get("group_name")), str(data.get("password", ""))
+    return None
+
+
+async def play_session(channel, client, group_name):
+    """
+    play the moves of a verified session until the last one, the page is closed or the eval_client is lost
+    """
+    if Pacing.automatic():
+        channel.ignore_messages()
     try:
-        response_time_gun   = []    # response times of correct match for gun
-        response_time_ai    = []    # response times of correct match for AI actions
-        num_actions_matched_gun = 0
-        num_actions_matched_ai  = 0
+        stats = client.stats
+        if client.simulator.move_index > 0:
+            # a resumed session, the statistics of the moves played before
+            await ws_send_stat(channel, stats.live_message())
 
+        move_start = perf_counter()
         while client.is_running:
             # display the player location if 2-player game
             pos_1, pos_2 = client.current_positions()
-            await ws_send_positions(websocket, pos_1, pos_2)
+            await ws_send_positions(channel, pos_1, pos_2)
 
-            # wait for the user the click next
-            success = await ws_recv_next_click(websocket, group_name)
+            # wait for the user the click next, or the pacing
+            success = await wait_next_move(channel, group_name, move_start)
+            move_start = perf_counter()
 
             # display the number of moves
-            await ws_send_num_move (websocket, client.current_move())
+            await ws_send_num_move (channel, client.current_move())
 
             # send action
             action_1, action_2 = client.current_actions()
-            await ws_send_actions(websocket, action_1, action_2)
+            await ws_send_actions(channel, action_1, action_2)
 
             if not success:
                 # The websocket is disconnected
                 break
             # wait to receive 2 jsons with timeout from eval_client
-            await ws_send_info(websocket, "------------")
-            player_processed = -1   # variable to ensure we do not process a player twice
-
-            timeout_remaining = client.timeout
-            for _ in range (num_players):
-                action_match, player_id, message, action_recv, response_time, timeout_remaining = \
-                    await client.handle_a_player(player_processed, timeout_remaining)
-
-                player_processed = player_id
-
+            await ws_send_info(channel, "------------")
+            # display the updates before waiting for the eval_client
+            await channel.flush()
+            async for action_match, player_id, message, action_recv, response_time in \
+                    client.handle_players(client.timeout):
                 # update display based on received action
                 if action_match == 1:
                     # action mismatch
-                    await ws_send_info_y(websocket, message="Action received: " + action_recv)
+                    await ws_send_info_y(channel, message="Action received: " + action_recv)
 
                 if action_match == -1:
                     # error during processing
-                    await ws_send_error(websocket, message)
+                    await ws_send_error(channel, message)
                 else:
                     if action_match == 0:
                         # action matched
                         # process response time
-                        if action_recv == Action.shoot:
-                            num_actions_matched_gun += 1
-                            response_time_gun.append(response_time)
-                        else:
-                            num_actions_matched_ai += 1
-                            response_time_ai.append(response_time)
+                        stats.add_match(action_recv, response_time)
 
                     # display the difference in game states for both match amd mismatch
-                    await ws_send_action_update (websocket, action_match, player_id, message)
+                    await ws_send_action_update (channel, action_match, player_id, message)
 
                     # send the correct json back only if there is no error
                     await client.send_game_state()
+                await channel.flush()
+            await ws_send_stat(channel, stats.live_message())
             # move one step forward
             client.move_forward ()
+            checkpoints.save(client)
 
-        await ws_send_num_move(websocket, "Eval Terminated")
-        await ws_send_info_y(websocket, "------------------- Stat -------------------")
+        await ws_send_num_move(channel, "Eval Terminated")
+        await ws_send_info_y(channel, "------------------- Stat -------------------")
 
-        accuracy = str(num_actions_matched_gun)+"/"+str(client.num_actions_gun())
-        await send_stat(accuracy, "GUN", response_time_gun, websocket, client.timeout)
+        accuracy = str(stats.num_matched["GUN"])+"/"+str(client.num_actions_gun())
+        await send_stat(accuracy, "GUN", stats.response_time["GUN"], channel, client.timeout)
 
-        accuracy = str(num_actions_matched_ai)+"/"+str(client.num_actions_ai())
-        await send_stat(accuracy, "AI ", response_time_ai, websocket, client.timeout)
+        accuracy = str(stats.num_matched["AI "])+"/"+str(client.num_actions_ai())
+        await send_stat(accuracy, "AI ", stats.response_time["AI "], channel, client.timeout)
+        await channel.flush()
 
     except Exception as e:
         ice_print_group_name(group_name, "handler:", e)
 
-    # the client is disconnected
-    client = client_dict.pop(group_name)
-    client.stop()
+    finally:
+        # the client is disconnected, or the session is cancelled because the server is stopped
+        channel.close()
+        client_dict.pop(group_name, None)
+        checkpoints.end(client)
+        client.stop()
 
 
-async def send_stat(accuracy, component, response_times, websocket, timeout):
-    if len(response_times) == 0:
-        mean    = timeout
-        median  = timeout
-    else:
-        mean    = statistics.mean(response_times)
-        median  = statistics.median(response_times)
-
-    message = "{comp}-- accuracy={acc}; Response time (mean):{mean:.2f} (median):{median:.2f}" \
-        .format(comp=component, acc=accuracy, mean=mean, median=median)
-    await ws_send_info(websocket, message)
+async def run_headless(group_name, num_players, password, no_visualizer, runs):
+    """
+    sessions of a group without page, back to back, paced automatically
+    runs: number of sessions, 0 for no limit
+    """
+    message = Codec.dumps_str({"group_name": group_name, "password": password, "num_player": num_players,
+                               "no_visualizer": no_visualizer, "features": ["batch", "stat"]})
+    run = 0
+    while runs == 0 or run < runs:
+        run += 1
+        ice_print_group_name(group_name, "headless session", run)
+        channel = HeadlessChannel(group_name)
+        success, _, _, client = await perform_handshake(message, channel)
+        if success:
+            await play_session(channel, client, group_name)
+        spectators.detach(group_name, channel)
+        if not success:
+            # e.g. the group is connected from a page
+            await asyncio.sleep(1)
+
+
+async def send_stat(accuracy, component, response_times, channel, timeout):
+    """
+    response_times: LatencySketch of the matched actions
+    """
+    message = "{comp}-- accuracy={acc}; Response time {times}" \
+        .format(comp=component, acc=accuracy, times=SessionStats.format_sketch(response_times, default=timeout))
+    await ws_send_info(channel, message)
 
 
-async def main():
+async def main(host="", port=8001, metrics_port_para=0, headless=(), headless_runs=1, admin_port_para=0):
+    """
+    headless: (group_name, num_players, password, no_visualizer) of the sessions without page
+    """
+    # generate the move schedules before the first handshake
+    schedule_pool.fill()
+    if Client.shared_listener is not None:
+        await Client.shared_listener.start()
+    for group in headless:
+        asyncio.ensure_future(run_headless(*group, headless_runs))
+    asyncio.ensure_future(reaper.report())
+    asyncio.ensure_future(log_store.run())
+    if LogIndex.interval > 0:
+        asyncio.ensure_future(log_index.run())
+    if metrics_port_para > 0:
+        asyncio.ensure_future(loop_monitor.run())
+        await serve_metrics("127.0.0.1", metrics_port_para)
+        print ("Metrics on http://127.0.0.1:{}/metrics".format(metrics_port_para))
+    if admin_port_para > 0:
+        await dashboard.serve("127.0.0.1", admin_port_para, client_dict)
     print ("Waiting for new websocket client")
-    async with websockets.serve(handler, "", 8001):
+    async with websockets.serve(handler, host, port):
         await asyncio.Future()  # run forever
 
 
+def run_worker(index, port, metrics_port=0, admin_port=0):
+    """
+    entry point of a worker process of the Supervisor, only reachable through the coordinator
+    metrics_port, admin_port: the ports of the coordinator, 0 to disable
+    """
+    # every worker exposes its own metrics
+    worker_metrics_port = metrics_port + 1 + index if metrics_port > 0 else 0
+    worker_admin_port   = admin_port + 1 + index if admin_port > 0 else 0
+    # the workers are forked with the same sequence of session seeds
+    if schedule_pool.base_seed is None:
+        schedule_pool.reseed(None)
+    else:
+        schedule_pool.reseed("{}-{}".format(schedule_pool.base_seed, index))
+    try:
+        asyncio.run(main("127.0.0.1", port, worker_metrics_port, admin_port_para=worker_admin_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        Logger.close_all()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CG4002 evaluation server")
+    parser.add_argument("--decrypt-threads", type=int, default=0,
+                        help="decrypt the eval_client messages on a pool of N threads instead of the event loop")
+    parser.add_argument("--log-fsync", choices=["none", "batch", "close"], default=Logger.fsync_policy,
+                        help="when the evaluation logs are fsync-ed to the disk")
+    parser.add_argument("--log-format", choices=["json", "compact"], default=Logger.log_format,
+                        help="json lines or the compact binary records of CompactLog.py")
+    parser.add_argument("--log-compact-interval", type=float, default=LogStore.compact_interval,
+                        help="seconds between two compactions of the evaluation logs into the archives of the "
+                             "groups (LogStore.py), 0 to disable")
+    parser.add_argument("--log-archive-size", type=int, default=LogStore.archive_size,
+                        help="bytes of an archive of the evaluation logs beyond which a new one is started")
+    parser.add_argument("--log-max-bytes", type=int, default=LogStore.max_bytes,
+                        help="delete the oldest archives while the evaluation logs take more bytes, 0 for no limit")
+    parser.add_argument("--log-index-interval", type=float, default=LogIndex.interval,
+                        help="index the new evaluation log records in evaluation_logs.sqlite every S seconds "
+                             "(LogIndex.py), 0 to disable")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run N worker processes behind a coordinator, each group is served by one worker")
+    parser.add_argument("--worker-base-port", type=int, default=8101,
+                        help="the workers listen on 127.0.0.1 from this port onwards")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="expose the per-stage latency histograms on http://127.0.0.1:PORT/metrics "
+                             "(worker i of --workers uses PORT+1+i)")
+    parser.add_argument("--admin-port", type=int, default=0,
+                        help="admin websocket on ws://127.0.0.1:PORT/ with the live state of every session "
+                             "(html/admin.html), worker i of --workers uses PORT+1+i")
+    parser.add_argument("--admin-interval", type=float, default=Dashboard.interval,
+                        help="seconds between two updates of the admin websocket")
+    parser.add_argument("--schedule-seed", type=int, default=None,
+                        help="seed of the sequence of session seeds, random if not set")
+    parser.add_argument("--tcp-port", type=int, default=0,
+                        help="accept the eval_clients of all the groups on this port, identified by the group name "
+                             "sent as the first frame; 0: one ephemeral port per group")
+    parser.add_argument("--handshake-timeout", type=float, default=Reaper.handshake_timeout,
+                        help="seconds for the web page to send the handshake, 0 for no limit")
+    parser.add_argument("--accept-timeout", type=float, default=Reaper.accept_timeout,
+                        help="seconds for the eval_client to connect after the handshake, 0 for no limit")
+    parser.add_argument("--idle-timeout", type=float, default=Reaper.idle_timeout,
+                        help="seconds to wait for the next click before closing the session, 0 for no limit")
+    parser.add_argument("--pacing", choices=Pacing.modes, default=Pacing.mode,
+                        help="the next move starts when next is clicked, every --pacing-interval seconds (clock) "
+                             "or as soon as the packets of the previous move are processed (packets)")
+    parser.add_argument("--pacing-interval", type=float, default=Pacing.interval,
+                        help="seconds between the beginnings of two moves with --pacing clock")
+    parser.add_argument("--headless", action="append", default=[], metavar="GROUP:PLAYERS:PASSWORD",
+                        help="run the sessions of this group without page (repeat for several groups), "
+                             "needs --pacing clock or packets")
+    parser.add_argument("--headless-runs", type=int, default=1,
+                        help="number of sessions of every headless group, back to back, 0 for no limit")
+    parser.add_argument("--headless-no-visualizer", action="store_true",
+                        help="the headless groups do not have a visualizer")
+    parser.add_argument("--spectator-max-lag", type=int, default=Subscriber.max_lag,
+                        help="frames a spectator page (watch.html) may fall behind before it is disconnected")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="checkpoint every session in this directory after every move, an interrupted session "
+                             "resumes when the group connects again")
+    parser.add_argument("--json-backend", choices=Codec.available(), default=Codec.backend,
+                        help="library encoding the messages of the web pages, the eval_client packets and the logs "
+                             "always go through json")
+    args = parser.parse_args()
+
+    Dashboard.interval = args.admin_interval
+    schedule_pool.reseed(args.schedule_seed)
+    Codec.use(args.json_backend)
+
+    Logger.fsync_policy = args.log_fsync
+    Logger.log_format   = args.log_format
+    LogStore.fsync              = args.log_fsync != "none"
+    LogStore.compact_interval   = args.log_compact_interval
+    LogStore.archive_size       = args.log_archive_size
+    LogStore.max_bytes          = args.log_max_bytes
+    LogIndex.interval           = args.log_index_interval
+
+    Reaper.handshake_timeout    = args.handshake_timeout
+    Reaper.accept_timeout       = args.accept_timeout
+    Reaper.idle_timeout         = args.idle_timeout
+
+    CheckpointStore.directory   = args.checkpoint_dir
+
+    Subscriber.max_lag          = args.spectator_max_lag
+
+    Pacing.mode     = args.pacing
+    Pacing.interval = args.pacing_interval
+
+    headless = []
+    for spec in args.headless:
+        try:
+            group_name, num_players, password = spec.split(":", 2)
+            headless.append((group_name, int(num_players), password, int(args.headless_no_visualizer)))
+        except ValueError:
+            parser.error("--headless " + spec + ": expected GROUP:PLAYERS:PASSWORD")
+    if headless and not Pacing.automatic():
+        parser.error("--headless needs --pacing clock or packets, there is no page to click next")
+    if headless and args.workers > 0:
+        parser.error("--headless cannot be used with --workers")
+
+    if args.tcp_port > 0:
+        if args.workers > 0:
+            parser.error("--tcp-port cannot be used with --workers, every worker would need the port")
+        Client.shared_listener = SharedListener(port=args.tcp_port)
+
+    if args.decrypt_threads > 0:
+        Client.decrypt_executor = ThreadPoolExecutor(max_workers=args.decrypt_threads,
+                                                     thread_name_prefix="decrypt")
+
     print ("running main")
     try:
-        asyncio.run(main())
+        if args.workers > 0:
+            worker_main = functools.partial(run_worker, metrics_port=args.metrics_port, admin_port=args.admin_port)
+            asyncio.run(Supervisor(args.workers, worker_main, worker_base_port=args.worker_base_port).run())
+        else:
+            asyncio.run(main(metrics_port_para=args.metrics_port, headless=headless,
+                             headless_runs=args.headless_runs, admin_port_para=args.admin_port))
     except KeyboardInterrupt:
         pass
+    finally:
+        Logger.close_all()
@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+import Checkpoint as Checkpoint_module
+from Checkpoint import Checkpoint, CheckpointStore, key_digest
+from Client import Client
+from Helper import Action
+from LatencySketch import LatencySketch
+from Logger import Logger
+from LogStore import LogStore
+from SessionStats import SessionStats
+
+KEY = "0123456789abcdef"
+
+
+@pytest.fixture(autouse=True)
+def directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStore, "directory", str(tmp_path / "logs"))
+    monkeypatch.setattr(CheckpointStore, "directory", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(SessionStats, "all_groups", {c: LatencySketch() for c in SessionStats.components})
+
+
+def wait_for_writer():
+    Logger._writer.submit(lambda: None).result()
+
+
+def play(client, store, num_moves):
+    """ play num_moves moves matching every action of the first player """
+    for _ in range(num_moves):
+        client.stats.add_match(Action.shoot, 0.5)
+        client.stats.num_timeouts += 1   # the other player did not send a packet
+        client.simulator.move_forward()
+        store.save(client)
+    client.logger.flush()
+    wait_for_writer()
+
+
+def test_write_read_restore():
+    store   = CheckpointStore()
+    client  = Client("T01", KEY, 2, False)
+    assert store.begin(client)
+    play(client, store, 3)
+
+    checkpoint = Checkpoint.read(store.filepath("T01"), "T01")
+    assert checkpoint.seed == client.simulator.seed
+    assert checkpoint.random_id == client.logger.random_id
+    assert checkpoint.move_index == 3
+    assert checkpoint.digest == key_digest("T01", KEY)
+    assert [component for component, _ in checkpoint.matches] == ["GUN"] * 3
+    assert checkpoint.num_timeouts == 3
+
+    resumed = Client("T01", KEY, 2, False, checkpoint)
+    assert resumed.simulator.move_index == 3
+    assert resumed.simulator.get_game_state_dict() == client.simulator.get_game_state_dict()
+    assert CheckpointStore().begin(resumed, checkpoint)
+    assert resumed.logger.random_id == client.logger.random_id
+    assert resumed.logger.resumed
+    assert resumed.stats.num_timeouts == 3
+    assert resumed.stats.num_matched["GUN"] == 3
+
+
+def test_wrong_password_does_not_replace_the_checkpoint():
+    store   = CheckpointStore()
+    client  = Client("T01", KEY, 2, False)
+    store.begin(client)
+    play(client, store, 2)
+    with open(store.filepath("T01"), 'rb') as f:
+        data = f.read()
+
+    # the eval server restarted, someone else logs in as the group
+    store   = CheckpointStore()
+    other   = Client("T01", "fedcba9876543210", 2, False)
+    assert not store.begin(other)
+    play(other, store, 1)
+    with open(store.filepath("T01"), 'rb') as f:
+        assert f.read() == data
+    assert store.load("T01").matches_session(KEY, 2, 0)
+
+
+def test_restore_before_verification_keeps_the_statistics():
+    store       = CheckpointStore()
+    client      = Client("T01", KEY, 2, False)
+    store.begin(client)
+    play(client, store, 2)
+    checkpoint  = CheckpointStore().load("T01")
+
+    resumed = Client("T01", KEY, 2, False, checkpoint)
+    assert not resumed.logger.resumed
+    assert resumed.stats.num_matched["GUN"] == 0
+    assert resumed.stats.num_timeouts == 0
+    assert not checkpoint.in_all_groups
+    assert len(SessionStats.all_groups["GUN"]) == 2
+
+
+def test_truncated_frame_ends_the_file():
+    store   = CheckpointStore()
+    client  = Client("T01", KEY, 2, False)
+    store.begin(client)
+    play(client, store, 2)
+    filepath = store.filepath("T01")
+    os.truncate(filepath, os.path.getsize(filepath) - 3)
+    assert Checkpoint.read(filepath, "T01").move_index == 1
+
+
+def test_checkpoint_without_timeouts(tmp_path):
+    """ a checkpoint written before the number of timeouts was recorded """
+    client      = Client("T01", KEY, 2, False)
+    checkpoint  = Checkpoint("T01", client.simulator.seed, 1, 2, 0, 0, key_digest("T01", KEY))
+    client.stats.add_match(Action.shoot, 0.5)
+    client.simulator.move_forward()
+    body = checkpoint.update(client)[:-Checkpoint_module._timeouts.size]
+    filepath = str(tmp_path / "T01.ckpt")
+    with open(filepath, 'wb') as f:
+        f.write(Checkpoint_module.FILE_HEADER + checkpoint.session_record() +
+                Checkpoint_module._frame_of(body + Checkpoint_module._log_size.pack(0)))
+    read = Checkpoint.read(filepath, "T01")
+    assert read.move_index == 1 and len(read.matches) == 1
+    assert read.num_timeouts == 0
+
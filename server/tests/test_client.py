@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import json
+import os
+import socket
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from Client import Client
+from Framing import encode_frame
+from LogStore import LogStore
+
+KEY = "0123456789abcdef"
+
+
+def frame(data):
+    """ the frame of a packet of the eval_client """
+    text = data if isinstance(data, str) else json.dumps(data)
+    iv = os.urandom(AES.block_size)
+    cypher = AES.new(KEY.encode(), AES.MODE_CBC, iv).encrypt(pad(text.encode(), AES.block_size))
+    return encode_frame(base64.b64encode(iv + cypher))
+
+
+@pytest.fixture(autouse=True)
+def log_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStore, "directory", str(tmp_path))
+
+
+def connected_client(num_players):
+    """ a Client whose eval_client is the other end of a socketpair """
+    client = Client("T01", KEY, num_players, False)
+    client.conn, eval_client = socket.socketpair()
+    client.conn.setblocking(False)
+    return client, eval_client
+
+
+async def play_move(client, timeout=0.5):
+    return [result async for result in client.handle_players(timeout)]
+
+
+def packet(client, player_id):
+    return {"player_id": player_id, "action": client.simulator.current_action(player_id),
+            "game_state": client.simulator.get_game_state_dict()}
+
+
+def test_frame_split_across_moves_is_not_lost():
+    async def scenario():
+        client, eval_client = connected_client(1)
+        data = frame(packet(client, 1))
+        eval_client.sendall(data[:10])
+        first = await play_move(client, timeout=0.2)
+        eval_client.sendall(data[10:])
+        second = await play_move(client)
+        client.stop()
+        eval_client.close()
+        return first, second
+    first, second = asyncio.run(scenario())
+    assert [r[2] for r in first] == ["Timeout"]
+    assert len(second) == 1 and second[0][0] == 0
+
+
+def test_one_result_per_player():
+    async def scenario():
+        client, eval_client = connected_client(1)
+        eval_client.sendall(frame("not json"))
+        results = await play_move(client)
+        client.stop()
+        eval_client.close()
+        return client, results
+    client, results = asyncio.run(scenario())
+    assert [(r[0], r[2]) for r in results] == [(-1, "Decoding JSON has failed")]
+    assert client.stats.num_timeouts == 0
+
+
+def test_packets_of_both_players():
+    async def scenario():
+        client, eval_client = connected_client(2)
+        eval_client.sendall(frame(packet(client, 2)) + frame(packet(client, 1)))
+        results = await play_move(client)
+        client.stop()
+        eval_client.close()
+        return results
+    results = asyncio.run(scenario())
+    assert [(r[0], r[1]) for r in results] == [(0, 2), (0, 1)]
+
+
+def test_disconnect_ends_the_move():
+    async def scenario():
+        client, eval_client = connected_client(2)
+        eval_client.close()
+        results = await play_move(client, timeout=5)
+        return client, results
+    client, results = asyncio.run(scenario())
+    assert [r[2] for r in results] == ["Timeout", "Timeout"]
+    assert not client.is_running
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+import Codec
+import CompactLog
+from GameSimulator import GameSimulator
+from Logger import Logger
+import LogStore as LogStore_module
+from LogStore import LogStore
+
+
+def game_state():
+    """ the game state after a few moves of a real game """
+    simulator = GameSimulator(2, False, 1234)
+    for _ in range(10):
+        simulator.perform_action(simulator.current_action(1), 1)
+        simulator.perform_action(simulator.current_action(2), 2)
+        simulator.move_forward()
+    return simulator.get_game_state_dict()
+
+
+def record():
+    state = game_state()
+    return {'id': 1234, 'timestamp': 1700000000.123456, 'response_time': 0.5234, 'player_id': 1,
+            'correct_action': 'gun', 'predicted_action': 'gun', 'action_matched': 0,
+            'game_state_received': {'p1': dict(state['p1'], hp="ninety"), 'p2': state['p2'], 'é': 2 ** 70},
+            'game_state_expected': state, 'move': 10, 'position_1': 1, 'position_2': 3, 'no_visualizer': False,
+            'seed': 123456789}
+
+
+@pytest.fixture
+def backend():
+    """ restores the default backend after the test """
+    default = Codec.backend
+    yield
+    Codec.use(default)
+
+
+def test_default_backend_is_the_fastest_installed():
+    assert Codec.backend == ("orjson" if Codec.orjson is not None else "json")
+
+
+@pytest.mark.parametrize("name", Codec.available())
+def test_round_trip(name, backend):
+    Codec.use(name)
+    packet = {"player_id": 1, "action": "gun", "game_state": game_state()}
+    assert Codec.loads(Codec.dumps(packet)) == packet
+    assert Codec.loads(Codec.dumps_str(packet)) == packet
+    assert Codec.loads(json.dumps(packet)) == json.loads(json.dumps(packet))
+    with pytest.raises(Codec.DecodeError):
+        Codec.loads(b"{not json")
+
+
+@pytest.mark.parametrize("name", Codec.available())
+def test_stdlib_whatever_the_backend(name, backend):
+    Codec.use(name)
+    data = record()
+    line = json.dumps(data).encode("utf-8")
+    assert Codec.stdlib_dumps(data) == line
+    assert Codec.stdlib_loads(line) == data
+
+
+@pytest.mark.parametrize("name", Codec.available())
+def test_logger_writes_the_bytes_of_json(name, backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStore, "directory", str(tmp_path))
+    Codec.use(name)
+    data    = record()
+    logger  = Logger("T01", 2, data['seed'])
+    logger.resumable = True     # not sealed, read back as written
+    logger.random_id = data['id']
+
+    async def write():
+        fields = {k: v for k, v in data.items() if k not in ('id', 'timestamp')}
+        await logger.write_state(**fields)
+        logger.close()
+    asyncio.run(write())
+    Logger._writer.submit(lambda: None).result()
+
+    with open(logger.log_filepath, "rb") as f:
+        line = f.read()
+    written = json.loads(line)
+    # the spaces and the escapes of the stdlib json module
+    assert line == json.dumps(written).encode("utf-8") + b"\n"
+    written.pop('timestamp')
+    data.pop('timestamp')
+    assert written == data
+
+
+def test_compact_round_trip():
+    data = record()
+    assert Codec.stdlib_dumps(CompactLog.decode_record(CompactLog.encode_record(data))) == Codec.stdlib_dumps(data)
+
+
+@pytest.mark.parametrize("name", Codec.available())
+def test_logs_read_by_json_whatever_the_backend(name, backend, tmp_path):
+    Codec.use(name)
+    data = record()
+    filepath = str(tmp_path / "T01_2_logs.json")
+    with open(filepath, "wb") as f:
+        f.write(Codec.stdlib_dumps(data) + b"\n")
+    records = LogStore_module.read_records(filepath)
+    assert Codec.stdlib_dumps(records[0]) == Codec.stdlib_dumps(data)
+    # orjson would read the integer wider than 64 bits as a float
+    assert type(records[0]['game_state_received']['é']) is int
+
@@ -0,0 +1,82 @@
+import pytest
+
+from Framing import FrameDecoder, encode_frame
+
+
+def frames_of(decoder):
+    ret = []
+    while True:
+        frame = decoder.next_frame()
+        if frame is None:
+            return ret
+        ret.append(bytes(frame))
+
+
+def test_encode_frame():
+    assert encode_frame(b"hello") == b"5_hello"
+    assert encode_frame(b"") == b"0_"
+
+
+def test_split_frame():
+    data    = encode_frame(b"x" * 300)
+    decoder = FrameDecoder()
+    for i in range(len(data) - 1):
+        decoder.feed(data[i:i + 1])
+        assert decoder.next_frame() is None
+    decoder.feed(data[-1:])
+    assert frames_of(decoder) == [b"x" * 300]
+
+
+def test_coalesced_frames():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(b"first") + encode_frame(b"") + encode_frame(b"third") + b"7_par")
+    assert frames_of(decoder) == [b"first", b"", b"third"]
+    decoder.feed(b"tial")
+    assert frames_of(decoder) == [b"partial"]
+
+
+def test_receive_into_writable():
+    decoder = FrameDecoder()
+    data    = encode_frame(b"a" * 5000) + encode_frame(b"b" * 5000)
+    frames  = []
+    for i in range(0, len(data), 4096):
+        chunk = data[i:i + 4096]
+        view  = decoder.writable(4096)
+        assert len(view) >= 4096
+        view[:len(chunk)] = chunk
+        decoder.commit(len(chunk))
+        frames += frames_of(decoder)
+    assert frames == [b"a" * 5000, b"b" * 5000]
+
+
+def test_oversized_frame_rejected_before_allocation():
+    decoder = FrameDecoder()
+    decoder.feed(b"9999999999_")
+    with pytest.raises(ValueError):
+        decoder.next_frame()
+    assert len(decoder.buffer) == FrameDecoder.initial_size
+
+
+def test_max_frame_len():
+    decoder = FrameDecoder(max_frame_len=4)
+    decoder.feed(encode_frame(b"four"))
+    assert frames_of(decoder) == [b"four"]
+    decoder.feed(encode_frame(b"fives"))
+    with pytest.raises(ValueError):
+        decoder.next_frame()
+
+
+def test_buffer_grows_by_receive_size():
+    decoder = FrameDecoder()
+    decoder.feed(b"8000_")
+    decoder.next_frame()
+    decoder.writable(4096)
+    assert len(decoder.buffer) == FrameDecoder.initial_size
+
+
+@pytest.mark.parametrize("data", [b"12345678901234", b"abc_", b"-1_"])
+def test_malformed_prefix(data):
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    with pytest.raises(ValueError):
+        decoder.next_frame()
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+import LogStore
+from Logger import Logger
+
+STATE = {"p1": {"hp": 100, "bullets": 6, "bombs": 2, "shield_hp": 0, "deaths": 0, "shields": 3},
+         "p2": {"hp": 90, "bullets": 5, "bombs": 2, "shield_hp": 0, "deaths": 0, "shields": 3}}
+
+
+@pytest.fixture(autouse=True)
+def directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStore.LogStore, "directory", str(tmp_path))
+    return tmp_path
+
+
+def wait():
+    """ the records are written and the segments sealed """
+    Logger._writer.submit(lambda: None).result()
+    LogStore.log_store._executor.submit(lambda: None).result()
+
+
+def log_session(seed, num_moves):
+    """ the segment of a sealed session, returns its Logger """
+    async def write():
+        logger = Logger("T01", 2, seed)
+        for move in range(num_moves):
+            await logger.write_state(response_time=1.5, player_id=1, correct_action="gun", predicted_action="gun",
+                                     action_matched=0, game_state_received=STATE, game_state_expected=STATE,
+                                     move=move, position_1=1, position_2=2, no_visualizer=False, seed=seed)
+        logger.close()
+        return logger
+    logger = asyncio.run(write())
+    wait()
+    return logger
+
+
+def names(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_seal(directory):
+    logger = log_session(7, 3)
+    assert names(directory) == [os.path.basename(logger.log_filepath) + ".gz"]
+    records = LogStore.read_records(logger.log_filepath + ".gz")
+    assert [data["move"] for data in records] == [0, 1, 2]
+    assert {data["id"] for data in records} == {logger.random_id}
+
+
+def test_merge_and_read_session(directory):
+    first   = log_session(7, 3)
+    second  = log_session(8, 2)
+    LogStore.log_store.compact()
+    archive = LogStore.log_store.archive_path("T01_2", 1, "json")
+    assert [name for name in names(directory) if not name.startswith(".")] == \
+        [os.path.basename(archive), os.path.basename(archive) + ".idx"]
+
+    entries = LogStore.read_index(archive)
+    assert [entry["seed"] for entry in entries] == [7, 8]
+    assert [data["move"] for data in LogStore.read_session(archive, second.random_id)] == [0, 1]
+    assert len(LogStore.read_session(archive, first.random_id)) == 3
+    assert len(LogStore.read_records(archive)) == 5
+
+
+def test_interrupted_merge_is_not_merged_twice(directory):
+    logger  = log_session(7, 3)
+    sealed  = logger.log_filepath + ".gz"
+    shutil.copy(sealed, str(directory / "copy"))
+    LogStore.log_store.compact()
+    # the merge was interrupted after the index was written, before the segment was deleted
+    shutil.move(str(directory / "copy"), sealed)
+    LogStore.log_store.compact()
+    archive = LogStore.log_store.archive_path("T01_2", 1, "json")
+    assert len(LogStore.read_index(archive)) == 1
+    assert not os.path.exists(sealed)
+    assert len(LogStore.read_records(archive)) == 3
+
+
+def test_records_after_close_are_dropped(directory):
+    logger = log_session(7, 2)
+
+    async def write_late():
+        await logger.write_state(response_time=1.5, player_id=2, correct_action="gun", predicted_action="gun",
+                                 action_matched=0, game_state_received=STATE, game_state_expected=STATE,
+                                 move=2, position_1=1, position_2=2, no_visualizer=False, seed=7)
+        logger.flush()
+    asyncio.run(write_late())
+    wait()
+    assert logger.num_dropped == 1
+    assert names(directory) == [os.path.basename(logger.log_filepath) + ".gz"]
+    with open(logger.log_filepath + ".gz", "rb") as f:
+        assert len(LogStore._members(f.read())) == 1
+
+
+def test_close_all_writes_the_pending_records(directory):
+    async def write():
+        logger = Logger("T01", 2, 7)
+        await logger.write_state(response_time=1.5, player_id=1, correct_action="gun", predicted_action="gun",
+                                 action_matched=0, game_state_received=STATE, game_state_expected=STATE,
+                                 move=0, position_1=1, position_2=2, no_visualizer=False, seed=7)
+        return logger
+    # the event loop ends with the record still pending, as when the server is stopped
+    logger = asyncio.run(write())
+    Logger.close_all()
+    wait()
+    assert len(LogStore.read_records(logger.log_filepath + ".gz")) == 1
+
@@ -0,0 +1,25 @@
+from Metrics import Metrics
+
+
+def test_group_released_with_its_last_client():
+    metrics = Metrics()
+    first   = metrics.group("B01")
+    second  = metrics.group("B01")
+    assert first is second
+    first["decrypt"].observe(0.001)
+
+    metrics.release("B01")
+    assert "B01" in metrics.groups
+    metrics.release("B01")
+    assert metrics.groups == {} and metrics.references == {}
+
+    text = metrics.render()
+    assert 'group="B01"' not in text
+    # the observations of the released group stay in the global histograms
+    assert 'eval_stage_seconds_count{stage="decrypt"} 1' in text
+
+
+def test_release_unknown_group():
+    metrics = Metrics()
+    metrics.release("never seen")
+    assert metrics.groups == {} and metrics.references == {}
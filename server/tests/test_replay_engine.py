@@ -0,0 +1,92 @@
+import json
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import ReplayEngine  # noqa: E402
+from GameSimulator import GameSimulator  # noqa: E402
+
+
+def play(num_players, seed, no_visualizer=False, context=True, with_seed=True, timeouts=0.1):
+    """ the records Logger writes for a session, some packets time out and some actions are wrong """
+    rng         = random.Random(seed)
+    simulator   = GameSimulator(num_players, no_visualizer, seed)
+    records     = []
+    while True:
+        for player_id in range(1, num_players + 1):
+            if rng.random() < timeouts:
+                continue    # timeout, nothing logged
+            correct = simulator.current_action(player_id)
+            action  = correct if rng.random() < 0.8 else rng.choice(["gun", "bomb", "shield", "reload", "hulk"])
+            simulator.perform_action(action, player_id)
+            data = {'id': seed, 'timestamp': 0.0, 'response_time': 1.0, 'player_id': player_id,
+                    'correct_action': correct, 'predicted_action': action, 'action_matched': int(action != correct),
+                    'game_state_received': {}, 'game_state_expected': simulator.get_game_state_dict()}
+            if context:
+                position_1, position_2 = simulator.current_positions()
+                data.update(move=simulator.move_index, position_1=position_1, position_2=position_2,
+                            no_visualizer=no_visualizer)
+            if with_seed:
+                data['seed'] = seed
+            records.append(data)
+        if not simulator.move_forward():
+            return records
+
+
+def replay_file(tmp_path, name, records):
+    filepath = tmp_path / name
+    filepath.write_text("".join(json.dumps(data) + "\n" for data in records))
+    sessions = ReplayEngine.read_sessions(str(filepath))
+    assert len(sessions) == 1
+    session = sessions[0]
+    reason  = ReplayEngine.complete_context(session)
+    if reason is not None:
+        return session, reason, None
+    replayed = [session]
+    divergences = ReplayEngine.replay(replayed)
+    return replayed[0], None, divergences
+
+
+@pytest.mark.parametrize("num_players", [1, 2])
+@pytest.mark.parametrize("no_visualizer", [False, True])
+def test_logs_with_context(tmp_path, num_players, no_visualizer):
+    records = play(num_players, 7, no_visualizer)
+    session, reason, divergences = replay_file(tmp_path, "B01_{}_logs.json".format(num_players), records)
+    assert reason is None and divergences == [] and session.rebuilt is None
+
+
+def test_context_rebuilt_from_seed(tmp_path):
+    records = play(2, 11, context=False, timeouts=0)
+    session, reason, divergences = replay_file(tmp_path, "B01_2_logs.json", records)
+    assert reason is None and divergences == []
+    assert session.rebuilt == "seed" and session.no_visualizer is False
+
+
+def test_seed_with_missing_records_cannot_be_replayed(tmp_path):
+    records = play(2, 11, context=False, timeouts=0)
+    del records[7]
+    _, reason, _ = replay_file(tmp_path, "B01_2_logs.json", records)
+    assert "cannot be matched to the moves of its seed 11, from move 4" in reason
+
+
+@pytest.mark.parametrize("no_visualizer", [False, True])
+def test_old_1_player_log(tmp_path, no_visualizer):
+    records = play(1, 3, no_visualizer, context=False, with_seed=False)
+    session, reason, divergences = replay_file(tmp_path, "B01_1_logs.json", records)
+    assert reason is None and divergences == []
+    assert session.rebuilt == "1-player" and session.no_visualizer is no_visualizer
+
+
+def test_old_2_player_log_cannot_be_replayed(tmp_path):
+    records = play(2, 5, context=False, with_seed=False)
+    _, reason, _ = replay_file(tmp_path, "B01_2_logs.json", records)
+    assert "without seed" in reason
+
+
+def test_divergence_reported(tmp_path):
+    records = play(1, 3, context=False, with_seed=False)
+    records[4]['game_state_expected']['p2']['hp'] -= 5
+    _, reason, divergences = replay_file(tmp_path, "B01_1_logs.json", records)
+    assert reason is None and [d.index for d in divergences][:1] == [4]
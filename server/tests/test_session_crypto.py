@@ -0,0 +1,61 @@
+import base64
+import os
+
+import pytest
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from SessionCrypto import SessionCrypto
+
+KEY = "0123456789abcdef"
+
+
+def encrypt(text, key=KEY, iv=None):
+    """ IV + cypher of the text, as sent by the eval_client """
+    iv = iv if iv is not None else os.urandom(AES.block_size)
+    return iv + AES.new(key.encode(), AES.MODE_CBC, iv).encrypt(pad(text.encode(), AES.block_size))
+
+
+def test_known_answer():
+    # openssl enc -aes-128-cbc -K 30313233343536373839616263646566 -iv 000102030405060708090a0b0c0d0e0f
+    iv      = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+    cypher  = bytes.fromhex("ab868dd9264bb3336ee5e683207ee402"
+                            "223398a16e7540be42dcd4681489ff0d"
+                            "4a18de5a17481edcf8588a2d6f47bff6")
+    assert SessionCrypto(KEY).decrypt(iv + cypher) == '{"player_id": 1, "action": "gun"}'
+
+
+@pytest.mark.parametrize("text", ["hello", "", "x" * 15, "x" * 16, "x" * 5000, "café ✓"])
+def test_matches_cbc(text):
+    crypto = SessionCrypto(KEY)
+    assert crypto.decrypt(encrypt(text)) == text
+
+
+def test_buffer_reused_across_messages():
+    crypto = SessionCrypto(KEY)
+    assert crypto.decrypt(encrypt("x" * 3000)) == "x" * 3000
+    assert crypto.decrypt(encrypt("short")) == "short"
+    assert crypto.num_decrypted == 2
+
+
+def test_decode_base64_frame():
+    message = encrypt("hello")
+    frame   = memoryview(b"_" + base64.b64encode(message))[1:]
+    assert SessionCrypto.decode(frame) == message
+    assert SessionCrypto.decode(b"not base64!") is None
+
+
+@pytest.mark.parametrize("message", [
+    None,                                   # not base64
+    bytes(AES.block_size),                  # IV only
+    encrypt("hello")[:-1],                  # not a whole number of blocks
+    encrypt("hello", key="fedcba9876543210", iv=bytes(16)),    # wrong key, the padding is garbage
+])
+def test_invalid_messages(message):
+    with pytest.raises(ValueError):
+        SessionCrypto(KEY).decrypt(message)
+
+
+def test_invalid_key_length():
+    with pytest.raises(ValueError):
+        SessionCrypto("short").decrypt(encrypt("hello"))
@@ -0,0 +1,87 @@
+import asyncio
+import base64
+import os
+import socket
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+
+from Framing import encode_frame
+from SessionCrypto import SessionCrypto
+from SharedListener import SharedListener
+
+KEY = "0123456789abcdef"
+
+
+def hello(key):
+    iv = os.urandom(AES.block_size)
+    cypher = AES.new(key.encode(), AES.MODE_CBC, iv).encrypt(pad(b"hello", AES.block_size))
+    return encode_frame(base64.b64encode(iv + cypher))
+
+
+def connect(port, data):
+    """ a blocking eval_client sending data, returns the socket """
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(data)
+    return sock
+
+
+def closed_by_server(sock):
+    sock.settimeout(2)
+    try:
+        return sock.recv(1) == b""
+    except ConnectionResetError:
+        return True
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+async def started_listener():
+    listener = SharedListener(host="127.0.0.1", port=0)
+    await listener.start()
+    listener.port = listener.socket.getsockname()[1]
+    return listener
+
+
+def test_verified_connection_is_handed_over():
+    async def scenario():
+        listener = await started_listener()
+        future   = listener.expect("B01", SessionCrypto(KEY))
+        sock     = connect(listener.port, encode_frame(b"B01") + hello(KEY) + b"5_first")
+        conn, _, decoder = await future
+        assert bytes(decoder.next_frame()) == b"first"
+        conn.close()
+        sock.close()
+        return listener
+    listener = run(scenario())
+    assert listener.num_accepted == 1 and listener.pending == {}
+
+
+def test_wrong_password_does_not_take_over():
+    async def scenario():
+        listener = await started_listener()
+        future   = listener.expect("B01", SessionCrypto(KEY))
+        impostor = connect(listener.port, encode_frame(b"B01") + hello("fedcba9876543210"))
+        await asyncio.sleep(0.2)
+        assert not future.done()
+        client   = connect(listener.port, encode_frame(b"B01") + hello(KEY))
+        conn, _, _ = await future
+        conn.close()
+        client.close()
+        return listener, impostor
+    listener, impostor = run(scenario())
+    assert closed_by_server(impostor)
+    assert listener.num_rejected == 1 and listener.num_accepted == 1
+
+
+def test_oversized_group_name_rejected():
+    async def scenario():
+        listener = await started_listener()
+        sock     = connect(listener.port, b"9999999999_")
+        await asyncio.sleep(0.2)
+        return listener, sock
+    listener, sock = run(scenario())
+    assert closed_by_server(sock)
+    assert listener.num_rejected == 1
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from WebChannel import HeadlessChannel, Spectators
+
+KEY = "0123456789abcdef"
+
+
+class Page:
+    """ the websocket of a spectator page, open until close() """
+
+    def __init__(self):
+        self.frames = []
+        self.closed = asyncio.Event()
+
+    async def send(self, text):
+        self.frames.append(json.loads(text))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.closed.wait()
+        raise StopAsyncIteration
+
+    def close(self):
+        self.closed.set()
+
+    def messages(self):
+        return [frame["message"] for frame in self.frames]
+
+
+async def session(spectators, password, message):
+    channel = HeadlessChannel("T01")
+    spectators.attach("T01", channel, password)
+    await channel.send({"type": "info", "message": message})
+    await asyncio.sleep(0)
+    return channel
+
+
+def test_wrong_password_is_refused():
+    async def scenario():
+        spectators  = Spectators()
+        await session(spectators, KEY, "move 1")
+        page = Page()
+        await spectators.watch(page, "T01", "fedcba9876543210")
+        return spectators, page
+    spectators, page = asyncio.run(scenario())
+    assert page.messages() == ["Watch denied: wrong password"]
+    assert spectators.num_refused == 1
+
+
+def test_only_the_sessions_with_the_password():
+    async def scenario():
+        spectators  = Spectators()
+        page        = Page()
+        watcher     = asyncio.ensure_future(spectators.watch(page, "T01", KEY))
+        await asyncio.sleep(0)
+        channel = await session(spectators, "fedcba9876543210", "other session")
+        spectators.detach("T01", channel)
+        channel = await session(spectators, KEY, "group session")
+        await asyncio.sleep(0)
+        page.close()
+        await watcher
+        return page
+    page = asyncio.run(scenario())
+    assert "other session" not in page.messages()
+    assert "group session" in page.messages()
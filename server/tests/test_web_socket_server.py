@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import json
+import pickle
+import socket
+
+import pytest
+
+import LogStore as LogStore_module
+import WebSocketServer
+from Client import Client
+from Logger import Logger
+from LogStore import LogStore
+from Metrics import metrics
+from WebChannel import HeadlessChannel, spectators
+
+
+@pytest.fixture(autouse=True)
+def log_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(LogStore, "directory", str(tmp_path))
+
+
+def test_run_worker_ports(monkeypatch):
+    calls = []
+
+    async def main(host, port, metrics_port_para=0, admin_port_para=0):
+        calls.append((host, port, metrics_port_para, admin_port_para))
+
+    monkeypatch.setattr(WebSocketServer, "main", main)
+    monkeypatch.setattr(WebSocketServer.schedule_pool, "reseed", lambda seed: None)
+    worker_main = functools.partial(WebSocketServer.run_worker, metrics_port=9000, admin_port=9100)
+    # the Supervisor may start the workers with spawn
+    pickle.loads(pickle.dumps(worker_main))(2, 8103)
+    WebSocketServer.run_worker(0, 8101)
+    assert calls == [("127.0.0.1", 8103, 9003, 9103), ("127.0.0.1", 8101, 0, 0)]
+
+
+async def handshake_with_hello(hello):
+    """ a handshake whose eval_client sends hello as its first bytes, returns the Client """
+    message = json.dumps({"group_name": "T01", "password": "0123456789abcdef", "num_player": 2,
+                          "no_visualizer": 0})
+    channel = HeadlessChannel("T01")
+    task    = asyncio.ensure_future(WebSocketServer.perform_handshake(message, channel))
+    while not any("Port:" in text for text in channel.history):
+        await asyncio.sleep(0.01)
+    port = int([text for text in channel.history if "Port:" in text][-1].split("Port:")[1].split('"')[0])
+    eval_client = socket.create_connection(("127.0.0.1", port))
+    eval_client.sendall(hello)
+    success, group_name, _, client = await asyncio.wait_for(task, 5)
+    spectators.detach(group_name, channel)
+    eval_client.close()
+    return success, client
+
+
+@pytest.mark.parametrize("hello", [b"99999999_", b"12x_", b"-5_"])
+def test_invalid_hello_frame_cleans_up(hello):
+    references = metrics.references.get("T01", 0)
+    success, client = asyncio.run(handshake_with_hello(hello))
+    assert not success
+    assert client.is_stopped
+    assert metrics.references.get("T01", 0) == references
+    assert "T01" not in spectators.channels
+    assert "T01" not in WebSocketServer.client_dict
+
+
+def test_cancelled_session_writes_its_log(monkeypatch):
+    """ the server is stopped during a session, e.g. Ctrl-C, while a record waits to be written """
+    async def wait_forever(channel, group_name, move_start):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(WebSocketServer, "wait_next_move", wait_forever)
+
+    async def scenario():
+        client = Client("T01", "0123456789abcdef", 2, False)
+        WebSocketServer.client_dict["T01"] = client
+        state = client.simulator.get_game_state_dict()
+        await client.logger.write_state(response_time=1.0, player_id=1, correct_action="gun", predicted_action="gun",
+                                        action_matched=0, game_state_received=state, game_state_expected=state,
+                                        move=0, position_1=1, position_2=2, no_visualizer=False, seed=1)
+        session = asyncio.ensure_future(WebSocketServer.play_session(HeadlessChannel("T01"), client, "T01"))
+        await asyncio.sleep(0.01)
+        session.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await session
+        return client
+    client = asyncio.run(scenario())
+    Logger._writer.submit(lambda: None).result()
+    LogStore_module.log_store._executor.submit(lambda: None).result()
+    assert client.is_stopped
+    assert "T01" not in WebSocketServer.client_dict
+    assert len(LogStore_module.read_records(client.logger.log_filepath + ".gz")) == 1
+